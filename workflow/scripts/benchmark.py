@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+""" this script benchmarks the workflow stages on synthetic corpora.
+
+input: output directory, (optional) numbers of papers (default: 10k, 1M, and
+10M), e.g. `python scripts/benchmark.py ../benchmark 10000 1000000`
+
+output:
+    - {out_dir}/{n_papers}/: the synthetic corpus (raw/), the derived
+    datasets (data/), and the regression results (results/).
+    - {out_dir}/benchmark.csv: one row per (size, stage) with the wall time,
+    the user and system CPU time, and the peak memory (max. RSS) of the stage.
+
+each stage runs in its own process, which calls the `main` function of the
+script directly, so that the stage cache (stage_cache.py) is bypassed. the
+sizes are run from scratch; existing size directories are removed.
+
+"""
+import os
+import sys
+import glob
+import time
+import shutil
+import logging
+import subprocess
+
+import pandas as pd
+
+import generate_synthetic_data
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_SIZES = [10 ** 4, 10 ** 6, 10 ** 7]
+REG_WORKERS = 1
+REPORT_COLUMNS = ['N_PAPERS', 'STAGE', 'WALL_S', 'USER_S', 'SYS_S',
+                  'MAX_RSS_MB', 'RETURNCODE']
+STAGE_CALL = ('import sys; sys.path.insert(0, {script_dir!r}); '
+              'import {module}; {module}.main(*{args!r}, **{kwargs!r})')
+
+
+def pipeline_stages(raw_dir, data_dir, n_workers=REG_WORKERS):
+    """ (name, module, args, kwargs) of the stages, in the order of the
+    workflow. the names are those of the Snakefile rules. """
+    def raw(name):
+        return os.path.join(raw_dir, name)
+
+    def data(name):
+        return os.path.join(data_dir, name)
+
+    return [
+        ('main_data_cleaning', 'main_data_cleaning',
+         [raw('genderXgender.txt'), raw('country_continent.csv'),
+          raw('country_continent_added.csv'), data('single_author.parquet'),
+          data('multi_author.parquet')], {'expected_n_rows': None}),
+        ('mesh_index', 'build_mesh_index',
+         [sorted(glob.glob(raw('mesh/mtrees*.bin'))), data('mesh_index')],
+         {}),
+        ('disease_mesh', 'generate_disease_mesh_terms',
+         [data('mesh_index'), data('disease_mesh.txt')], {}),
+        ('cal_female_frac_per_mesh', 'cal_female_frac_per_mesh',
+         [data('disease_mesh.txt'), data('multi_author.parquet'),
+          raw('MESH.txt'), data('female_frac_per_mesh.csv')], {}),
+        ('cal_mesh_female_frac_per_paper', 'cal_mesh_female_frac_per_paper',
+         [data('disease_mesh.txt'), data('female_frac_per_mesh.csv'),
+          raw('MESH.txt'), data('paper_mesh_feature.csv')], {}),
+        ('multi_author_with_cov', 'multi_author_data_with_cov',
+         [data('multi_author.parquet'), data('paper_mesh_feature.csv'),
+          data('multi_author_final.parquet')], {}),
+        ('prepare_reg_table', 'prepare_reg_table',
+         [data('multi_author_final.parquet'), data('reg_table.parquet')], {}),
+        ('regression', 'run_regression',
+         [data('reg_table.parquet'), n_workers], {}),
+    ]
+
+
+def run_stage(module, args, kwargs, cwd):
+    """ run `module.main(*args, **kwargs)` in a new process.
+
+    returns (return code, wall time, user time, system time, max. RSS in
+    MB); the resource usage includes the subprocesses of the stage.
+    """
+    code = STAGE_CALL.format(script_dir=SCRIPT_DIR, module=module,
+                             args=list(args), kwargs=kwargs)
+    start = time.time()
+    proc = subprocess.Popen([sys.executable, '-c', code], cwd=cwd)
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall_time = time.time() - start
+    proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    # ru_maxrss is in kilobytes on linux
+    return (proc.returncode, wall_time, usage.ru_utime, usage.ru_stime,
+            usage.ru_maxrss / 1024)
+
+
+def benchmark_size(out_dir, n_papers, n_workers=REG_WORKERS):
+    """ generate a corpus of `n_papers` and run the stages on it; returns
+    the measurements as a dataframe """
+    size_dir = os.path.join(out_dir, str(n_papers))
+    if os.path.exists(size_dir):
+        shutil.rmtree(size_dir)
+    raw_dir = os.path.join(size_dir, 'raw')
+    data_dir = os.path.join(size_dir, 'data')
+    work_dir = os.path.join(size_dir, 'work')
+    for path in [data_dir, work_dir, os.path.join(size_dir, 'results')]:
+        os.makedirs(path)
+
+    start = time.time()
+    generate_synthetic_data.main(raw_dir, n_papers)
+    logging.info('corpus generated (%d papers, %.1fs).', n_papers,
+                 time.time() - start)
+
+    rows = []
+    for name, module, args, kwargs in pipeline_stages(
+            os.path.abspath(raw_dir), os.path.abspath(data_dir), n_workers):
+        returncode, wall, user, system, max_rss = run_stage(
+            module, args, kwargs, work_dir)
+        rows.append({'N_PAPERS': n_papers, 'STAGE': name,
+                     'WALL_S': round(wall, 3), 'USER_S': round(user, 3),
+                     'SYS_S': round(system, 3),
+                     'MAX_RSS_MB': round(max_rss, 1),
+                     'RETURNCODE': returncode})
+        logging.info('%s: %.1fs, %.0f MB', name, wall, max_rss)
+        if returncode != 0:
+            logging.error('%s failed; the later stages are skipped.', name)
+            break
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS)
+
+
+def main(out_dir, sizes=BENCHMARK_SIZES, n_workers=REG_WORKERS):
+    """ benchmark each size and append the measurements to benchmark.csv """
+    os.makedirs(out_dir, exist_ok=True)
+    report_f = os.path.join(out_dir, 'benchmark.csv')
+    for n_papers in sizes:
+        result = benchmark_size(out_dir, n_papers, n_workers)
+        result.insert(0, 'DATE', time.strftime('%Y-%m-%d %H:%M:%S'))
+        result.to_csv(report_f, mode='a', index=False,
+                      header=not os.path.exists(report_f))
+        print(result.drop(columns='DATE').to_string(index=False))
+
+
+if __name__ == "__main__":
+    OUT_DIR = sys.argv[1]
+    SIZES = [int(n) for n in sys.argv[2:]] or BENCHMARK_SIZES
+    main(OUT_DIR, SIZES)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+""" this script compiles the MeSH tree files of all years into an index (see
+mesh_index.py).
+
+input:
+    - ../data/mesh/mtrees{year}.bin files
+
+output:
+    - ../data/mesh_index/: the index arrays (.npy) and the years (json).
+
+"""
+import os
+import sys
+import logging
+from functools import partial
+
+import telemetry
+from stage_cache import run_stage
+from mesh_index import INDEX_FILES, build_mesh_index, save_mesh_index
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+
+def main(mesh_files, index_dir):
+    """ build and save the index """
+    index = build_mesh_index(mesh_files)
+    telemetry.checkpoint('mesh trees parsed.', rows=len(index.node_tree))
+    save_mesh_index(index, index_dir)
+    telemetry.checkpoint('mesh index saved ({} terms, {} tree numbers).'
+                         .format(len(index.terms), len(index.trees)))
+
+
+if __name__ == "__main__":
+    IN_FILES = sys.argv[1:-1]
+    INDEX_DIR = sys.argv[-1]
+    telemetry.start('build_mesh_index', INDEX_DIR)
+    run_stage(partial(main, IN_FILES, INDEX_DIR), inputs=IN_FILES,
+              outputs=[os.path.join(INDEX_DIR, name) for name in INDEX_FILES])
@@ -7,6 +7,7 @@ uses:
     - disease mesh term set
     - multi-author data
     - paper-mesh data
+    - (optional) mesh index: hierarchical mode
 
 output:
     - female frac per mesh file that contains female first author fraction and
@@ -14,14 +15,24 @@ output:
 
     MeSH term (string) | avg f_first | avg f_last
 
+    in the hierarchical mode, the fractions of every disease tree number,
+    including the papers of its subtree, with the numbers of distinct papers
+    (see `female_frac_per_tree` in paper_mesh.py):
+
+    tree number | depth | n_first | n_last | avg f_first | avg f_last
+
 """
+import os
 import sys
 import logging
-from itertools import islice
-from collections import defaultdict
+from functools import partial
 
-import numpy as np
-import pandas as pd
+import telemetry
+from stage_cache import run_stage
+from mesh_index import INDEX_FILES, load_mesh_index
+from paper_attributes import load_paper_attributes
+from paper_mesh import (load_paper_mesh, female_frac_per_mesh,
+                        female_frac_per_tree)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
 
@@ -31,57 +42,31 @@ def load_disease_mesh(disease_mesh_f):
     return set(open(disease_mesh_f).read().strip().split('\n'))
 
 
-def get_pid_to_gender(multi_author_data_f):
-    """ generate two dictionaries (first author & last author) for paper id
-    to female first or last author """
-    author_data_df = pd.read_csv(multi_author_data_f,
-                                 usecols=['PID', 'YEAR', 'GENDER_FIRST',
-                                          'GENDER_LAST'])
-    gender_replace_dic = {'M': 0, 'F': 1}
-    author_data_df.replace({'GENDER_FIRST': gender_replace_dic,
-                            'GENDER_LAST': gender_replace_dic},
-                           inplace=True)
-    author_data_dict = author_data_df.set_index('PID').to_dict()
-    return author_data_dict['GENDER_FIRST'], author_data_dict['GENDER_LAST']
-
-
-def get_mesh_to_paperid(raw_paper_mesh_data_f, disease_mesh_terms):
-    """ returns a dictionary: mesh term -> [paper id, paper id, ...] """
-    mesh2pid = defaultdict(set)
-    for line in islice(open(raw_paper_mesh_data_f), 1, None):
-        pid, mesh = line.strip().split('\t')
-        if mesh in disease_mesh_terms:
-            mesh2pid[mesh].add(int(pid))
-    return mesh2pid
-
-
-def main(disease_mesh_f, multi_author_data_f, raw_paper_mesh_data_f, out_path):
+def main(disease_mesh_f, multi_author_data_f, raw_paper_mesh_data_f, out_path,
+         mesh_index_dir=None):
     """ calculate the female fraction at the first and last author position
-    given a mesh term. """
+    given a mesh term (a disease tree number if `mesh_index_dir` is given).
+    """
     disease_mesh_terms = load_disease_mesh(disease_mesh_f)
-    logging.info('disease mesh terms loaded.')
-
-    f_first_dict, f_last_dict = get_pid_to_gender(multi_author_data_f)
-    logging.info('paper id -> author gender dictionary loaded.')
+    telemetry.checkpoint('disease mesh terms loaded.',
+                         rows=len(disease_mesh_terms))
 
-    mesh2pid = get_mesh_to_paperid(raw_paper_mesh_data_f, disease_mesh_terms)
-    logging.info('mesh -> paper id loaded.')
+    papers = load_paper_attributes(multi_author_data_f)
+    telemetry.checkpoint('paper attribute table loaded.',
+                         rows=len(papers.pids))
 
-    mesh2ffirst = {}
-    mesh2flast = {}
-    for mesh, pids in mesh2pid.items():
-        ff_list = [f_first_dict[pid] for pid in pids if pid in f_first_dict]
-        fl_list = [f_last_dict[pid] for pid in pids if pid in f_last_dict]
-        if ff_list and fl_list:
-            mesh2ffirst[mesh] = np.mean(ff_list)
-            mesh2flast[mesh] = np.mean(fl_list)
+    paper_mesh = load_paper_mesh(raw_paper_mesh_data_f, disease_mesh_terms)
+    telemetry.checkpoint('mesh -> paper id loaded.',
+                         rows=len(paper_mesh.pid_idx))
 
-    with open(out_path, 'w') as fout:
-        fout.write('{}\t{}\t{}\n'.format('MESH', 'F_FIRST_MESH',
-                                         'F_LAST_MESH'))
-        for mesh in mesh2ffirst:
-            fout.write('{}\t{}\t{}\n'.format(mesh, mesh2ffirst[mesh],
-                                             mesh2flast[mesh]))
+    if mesh_index_dir is None:
+        mesh_frac_df = female_frac_per_mesh(paper_mesh, papers)
+    else:
+        mesh_frac_df = female_frac_per_tree(paper_mesh, papers,
+                                            load_mesh_index(mesh_index_dir))
+    mesh_frac_df.to_csv(out_path, sep='\t', index=False)
+    telemetry.checkpoint('female fraction per mesh saved.',
+                         rows=len(mesh_frac_df))
 
 
 if __name__ == "__main__":
@@ -89,4 +74,12 @@ if __name__ == "__main__":
     MULTI_AUTHOR_DATA = sys.argv[2]
     RAW_PAPER_MESH_DATA = sys.argv[3]
     OUT_PATH = sys.argv[4]
-    main(DISEASE_MESH, MULTI_AUTHOR_DATA, RAW_PAPER_MESH_DATA, OUT_PATH)
+    MESH_INDEX = sys.argv[5] if len(sys.argv) > 5 else None
+    INDEX_INPUTS = [] if MESH_INDEX is None else [
+        os.path.join(MESH_INDEX, name) for name in INDEX_FILES]
+    telemetry.start('cal_female_frac_per_mesh', OUT_PATH)
+    run_stage(partial(main, DISEASE_MESH, MULTI_AUTHOR_DATA,
+                      RAW_PAPER_MESH_DATA, OUT_PATH, MESH_INDEX),
+              inputs=[DISEASE_MESH, MULTI_AUTHOR_DATA,
+                      RAW_PAPER_MESH_DATA] + INDEX_INPUTS,
+              outputs=[OUT_PATH])
@@ -7,6 +7,10 @@ input:
     - female frac per mesh file
     - multi-author data
     - raw paper mesh data
+    - (optional) mesh index and depth: hierarchical mode. the female frac per
+    mesh file has the fractions per tree number; each paper gets the average
+    of the fractions of the ancestors at the depth (e.g. 1: 'C04', 2:
+    'C04.557') of its disease tree numbers.
 
 output:
     paper mesh feature
@@ -14,39 +18,20 @@ output:
     paper id | avg_f_first_mesh | avg_f_last_mesh
 
 """
+import os
 import sys
 import logging
-from itertools import islice
-from collections import defaultdict
+from functools import partial
 
-import numpy as np
 import pandas as pd
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
-
-
-def get_pid_to_gender(multi_author_data_f):
-    """ generate two dictionaries (first author & last author) for paper id
-    to female first or last author """
-    author_data_df = pd.read_csv(multi_author_data_f,
-                                 usecols=['PID', 'YEAR', 'GENDER_FIRST',
-                                          'GENDER_LAST'])
-    gender_replace_dic = {'M': 0, 'F': 1}
-    author_data_df.replace({'GENDER_FIRST': gender_replace_dic,
-                            'GENDER_LAST': gender_replace_dic}, inplace=True)
-    author_data_dict = author_data_df.set_index('PID').to_dict()
-    return author_data_dict['GENDER_FIRST'], author_data_dict['GENDER_LAST']
+from mesh_index import INDEX_FILES, load_mesh_index
+from paper_mesh import (load_paper_mesh, mesh_female_frac_per_paper,
+                        tree_female_frac_per_paper)
+import telemetry
+from stage_cache import run_stage
 
-
-def get_pid_to_mesh(raw_paper_mesh_data_f, disease_mesh_terms):
-    """ returns a dictionary: paper id -> {mesh term, mesh term, ...} """
-    pid2meshes = defaultdict(set)
-    for line in islice(open(raw_paper_mesh_data_f), 1, None):
-        pid, mesh = line.strip().split('\t')
-        pid = int(pid)
-        if mesh in disease_mesh_terms:
-            pid2meshes[pid].add(mesh)
-    return pid2meshes
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
 
 
 def load_disease_mesh(disease_mesh_f):
@@ -56,40 +41,36 @@ def load_disease_mesh(disease_mesh_f):
 
 def load_female_frac_per_mesh(female_frac_per_mesh_f: str):
     """ loads and returns the female fraction per mesh data. """
-    df = pd.read_csv(female_frac_per_mesh_f, sep='\t')
-    mesh2fracs = df.set_index('MESH').to_dict()
-    return mesh2fracs['F_FIRST_MESH'], mesh2fracs['F_LAST_MESH'] 
+    return pd.read_csv(female_frac_per_mesh_f, sep='\t')
 
 
 def main(disease_mesh_f, female_frac_per_mesh_f, raw_paper_mesh_data_f,
-         out_path):
+         out_path, mesh_index_dir=None, depth=None):
     """ for each paper, we look at their disease mesh terms and calculate
-    the average f_first_mesh and f_last_mesh """
+    the average f_first_mesh and f_last_mesh (of their ancestors at `depth`
+    if `mesh_index_dir` is given) """
 
     disease_mesh_terms = load_disease_mesh(disease_mesh_f)
-    logging.info('disease mesh terms loaded.')
-
-    mesh2ffirst, mesh2flast = load_female_frac_per_mesh(female_frac_per_mesh_f)
-    logging.info('f frac per mesh data loaded.')
+    telemetry.checkpoint('disease mesh terms loaded.',
+                         rows=len(disease_mesh_terms))
 
-    pid2meshes = get_pid_to_mesh(raw_paper_mesh_data_f, disease_mesh_terms)
-    logging.info('pid2mesh data loaded.')
+    mesh_frac_df = load_female_frac_per_mesh(female_frac_per_mesh_f)
+    telemetry.checkpoint('f frac per mesh data loaded.',
+                         rows=len(mesh_frac_df))
 
-    pid2ffirst = {}
-    pid2flast = {}
-    null_cnt = 0
-    for pid, meshes in pid2meshes.items():
-        ff_list = [mesh2ffirst[mesh] for mesh in meshes if mesh in mesh2ffirst]
-        fl_list = [mesh2flast[mesh] for mesh in meshes if mesh in mesh2flast]
-        if ff_list and fl_list:
-            pid2ffirst[pid] = np.mean(ff_list)
-            pid2flast[pid] = np.mean(fl_list)
+    paper_mesh = load_paper_mesh(raw_paper_mesh_data_f, disease_mesh_terms)
+    telemetry.checkpoint('pid2mesh data loaded.',
+                         rows=len(paper_mesh.pid_idx))
 
-    with open(out_path, 'w') as fout:
-        fout.write('{}\t{}\t{}\n'.format('PID', 'F_FIRST_MESH', 'F_LAST_MESH'))
-        for pid in pid2ffirst:
-            fout.write('{}\t{}\t{}\n'.format(pid, pid2ffirst[pid],
-                                             pid2flast[pid]))
+    if mesh_index_dir is None:
+        paper_feature_df = mesh_female_frac_per_paper(paper_mesh,
+                                                      mesh_frac_df)
+    else:
+        paper_feature_df = tree_female_frac_per_paper(
+            paper_mesh, mesh_frac_df, load_mesh_index(mesh_index_dir), depth)
+    paper_feature_df.to_csv(out_path, sep='\t', index=False)
+    telemetry.checkpoint('paper mesh feature saved.',
+                         rows=len(paper_feature_df))
 
 
 if __name__ == "__main__":
@@ -97,4 +78,13 @@ if __name__ == "__main__":
     FEMALE_FRAC_PER_MESH = sys.argv[2]
     RAW_PAPER_MESH_DATA = sys.argv[3]
     OUT_PATH = sys.argv[4]
-    main(DISEASE_MESH, FEMALE_FRAC_PER_MESH, RAW_PAPER_MESH_DATA, OUT_PATH)
+    MESH_INDEX = sys.argv[5] if len(sys.argv) > 5 else None
+    DEPTH = int(sys.argv[6]) if len(sys.argv) > 6 else None
+    INDEX_INPUTS = [] if MESH_INDEX is None else [
+        os.path.join(MESH_INDEX, name) for name in INDEX_FILES]
+    telemetry.start('cal_mesh_female_frac_per_paper', OUT_PATH)
+    run_stage(partial(main, DISEASE_MESH, FEMALE_FRAC_PER_MESH,
+                      RAW_PAPER_MESH_DATA, OUT_PATH, MESH_INDEX, DEPTH),
+              inputs=[DISEASE_MESH, FEMALE_FRAC_PER_MESH,
+                      RAW_PAPER_MESH_DATA] + INDEX_INPUTS,
+              outputs=[OUT_PATH], params=DEPTH)
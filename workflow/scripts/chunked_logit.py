@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+""" out-of-core logistic regression.
+
+the data is streamed in chunks (e.g. the row groups of the regression table,
+see `storage.iter_table`) and never held in memory as a whole. each Newton
+(IRLS) iteration is one pass over the chunks, which accumulates the
+log-likelihood, the score X'(y - p), and the information matrix X'WX. the
+memory use is bounded by the chunk size and the number of columns.
+
+the design is built with patsy's incremental builders, so the columns (and
+the reference levels) are the same as with `smf.logit` on the whole data. the
+result has the attributes used by the statsmodels summary tables, so the
+summary csv has the same layout as the one of `Logit.fit()`.
+
+"""
+import logging
+
+import numpy as np
+import patsy
+from scipy import stats
+from scipy.special import expit
+from statsmodels.iolib.summary import Summary
+
+logger = logging.getLogger(__name__)
+
+
+def _plain_chunks(data_iter_maker):
+    """ chunks with categorical columns converted to objects. the levels of a
+    categorical chunk are not those of the data, and patsy would take them as
+    the levels of the whole data. """
+    for df in data_iter_maker():
+        if len(df) == 0:
+            continue
+        categories = df.select_dtypes(include='category').columns
+        yield df.astype({col: object for col in categories})
+
+
+class ChunkedLogit(object):
+    """ logit model of the patsy `formula`. `data_iter_maker()` should return
+    a new iterator over the data chunks (dataframes) on every call. """
+
+    def __init__(self, formula, data_iter_maker):
+        self.formula = formula
+        self.data_iter_maker = data_iter_maker
+        self.y_info, self.X_info = patsy.incr_dbuilders(
+            formula, lambda: _plain_chunks(data_iter_maker))
+        self.endog_names = self.y_info.column_names[0]
+        self.exog_names = self.X_info.column_names
+
+    def design_chunks(self):
+        """ iterate over the (y, X) arrays of the chunks; rows with missing
+        values are dropped """
+        for df in _plain_chunks(self.data_iter_maker):
+            y, X = patsy.build_design_matrices([self.y_info, self.X_info], df)
+            yield np.asarray(y)[:, 0], np.asarray(X)
+
+    def accumulate(self, params):
+        """ one pass over the data: log-likelihood, score, information
+        matrix, number of rows, and sum of y at `params` """
+        k = len(self.exog_names)
+        llf, score, info = 0., np.zeros(k), np.zeros((k, k))
+        nobs, y_sum = 0, 0.
+        for y, X in self.design_chunks():
+            eta = X @ params
+            p = expit(eta)
+            llf += np.sum(y * eta - np.logaddexp(0, eta))
+            score += X.T @ (y - p)
+            info += (X * (p * (1 - p))[:, None]).T @ X
+            nobs += len(y)
+            y_sum += y.sum()
+        return llf, score, info, nobs, y_sum
+
+    def fit(self, maxiter=35, tol=1e-8):
+        """ maximum likelihood by Newton's method, starting from zeros.
+        converged once no parameter changes by more than `tol`. """
+        params = np.zeros(len(self.exog_names))
+        converged = False
+        for iteration in range(maxiter + 1):
+            llf, score, info, nobs, y_sum = self.accumulate(params)
+            logger.info('iteration %d: log-likelihood %.4f', iteration, llf)
+            if converged or iteration == maxiter:
+                break
+            step = np.linalg.solve(info, score)
+            params = params + step
+            converged = np.abs(step).max() < tol
+        return ChunkedLogitResults(self, params, np.linalg.inv(info), llf,
+                                   nobs, y_sum, converged, iteration)
+
+
+class ChunkedLogitResults(object):
+    """ results of `ChunkedLogit.fit`, with the statistics shown by the
+    statsmodels summary of a logit model (z tests; nonrobust covariance).
+    `df_absorbed` is the number of fixed effects absorbed by the model (see
+    fixed_effects.py), which are not in `params`. """
+
+    use_t = False
+    cov_type = 'nonrobust'
+
+    def __init__(self, model, params, cov_params, llf, nobs, y_sum,
+                 converged, iterations, df_absorbed=0):
+        self.model = model
+        self.params = params
+        self.normalized_cov_params = cov_params
+        self.bse = np.sqrt(np.diag(cov_params))
+        self.tvalues = params / self.bse
+        self.pvalues = 2 * stats.norm.sf(np.abs(self.tvalues))
+        self.llf = llf
+        self.nobs = nobs
+        self.df_model = len(params) - 1 + df_absorbed
+        self.df_resid = nobs - len(params) - df_absorbed
+        # the null model (intercept only) has a closed form
+        y_mean = y_sum / nobs
+        self.llnull = nobs * (y_mean * np.log(y_mean) +
+                              (1 - y_mean) * np.log(1 - y_mean))
+        self.llr = 2 * (llf - self.llnull)
+        self.llr_pvalue = stats.chi2.sf(self.llr, self.df_model)
+        self.prsquared = 1 - llf / self.llnull
+        self.mle_retvals = {'converged': converged, 'iterations': iterations}
+
+    def cov_params(self):
+        return self.normalized_cov_params
+
+    def conf_int(self, alpha=.05):
+        q = stats.norm.ppf(1 - alpha / 2)
+        return np.column_stack([self.params - q * self.bse,
+                                self.params + q * self.bse])
+
+    def summary(self, alpha=.05):
+        """ summary tables in the layout of `LogitResults.summary` """
+        top_left = [('Dep. Variable:', None),
+                    ('Model:', ['Logit']),
+                    ('Method:', ['MLE']),
+                    ('Date:', None),
+                    ('Time:', None),
+                    ('converged:', [str(self.mle_retvals['converged'])])]
+        top_right = [('No. Observations:', None),
+                     ('Df Residuals:', None),
+                     ('Df Model:', None),
+                     ('Pseudo R-squ.:', ['%#6.4g' % self.prsquared]),
+                     ('Log-Likelihood:', None),
+                     ('LL-Null:', ['%#8.5g' % self.llnull]),
+                     ('LLR p-value:', ['%#6.4g' % self.llr_pvalue])]
+        smry = Summary()
+        smry.add_table_2cols(self, gleft=top_left, gright=top_right,
+                             yname=self.model.endog_names,
+                             xname=self.model.exog_names,
+                             title='Logit Regression Results')
+        smry.add_table_params(self, yname=self.model.endog_names,
+                              xname=self.model.exog_names, alpha=alpha,
+                              use_t=self.use_t)
+        return smry
@@ -16,32 +16,32 @@ output: cleaned table path
 import sys
 import logging
 
-import numpy as np
+from labels import DV_LABELS, VARIABLE_LABELS, relabel
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
 
 
+def clean_lines(lines):
+    """ the cleaned lines of a result table """
+    for line in lines:
+        if line.startswith('Dep.'):
+            line = relabel(line, DV_LABELS)
+        if line.startswith('Date:'):
+            line = line.replace(',', '.', 2).replace('.', ',', 1)
+        if line.startswith('GENDER'):
+            line = relabel(line, VARIABLE_LABELS)
+        if line.startswith('Warnings'):
+            break
+
+        if line.startswith('Omnibus'):
+            line = '\n' + line
+
+        yield line
+
+
 def main(in_f, out_f):
-    with open(out_f, 'w') as fout:
-        for line in open(in_f):
-            if line.startswith('Dep.'):
-                line = line.replace('IF', 'Impact Factor')
-            if line.startswith('Date:'):
-                line = line.replace(',', '.', 2).replace('.', ',', 1)
-            if line.startswith('GENDER'):
-                for a, b in {'GENDER_TOPIC[T.B]': 'Sex reported (M & F)',
-                             'GENDER_TOPIC[T.F]': 'Sex reported (F)',
-                             'GENDER_TOPIC[T.M]': 'Sex reported (M)',
-                             'GENDER_FIRST[T.F]': 'Female first author',
-                             'GENDER_LAST[T.F]': 'Female last author'}.items():
-                    line = line.replace(a, b)
-            if line.startswith('Warnings'):
-                break
-
-            if line.startswith('Omnibus'):
-                line = '\n' + line
-
-            fout.write(line)
+    with open(in_f) as fin, open(out_f, 'w') as fout:
+        fout.writelines(clean_lines(fin))
 
 
 if __name__ == "__main__":
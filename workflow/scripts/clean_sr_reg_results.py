@@ -18,36 +18,38 @@ import logging
 
 import numpy as np
 
+from labels import DV_LABELS, VARIABLE_LABELS, relabel
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
 
 
+def clean_lines(lines):
+    """ the cleaned lines of a result table """
+    result_flag = False
+    for line in lines:
+        if line.startswith('Dep.'):
+            line = relabel(line, DV_LABELS)
+        if line.startswith('Date:'):
+            line = line.replace(',', '.', 2).replace('.', ',', 1)
+        if line.startswith('GENDER'):
+            line = relabel(line, VARIABLE_LABELS)
+        if result_flag:
+            temp = line.split(',')
+            OR, ci_low, ci_high = np.exp([float(temp[1]),
+                                          float(temp[5]),
+                                          float(temp[6])])
+            line = line.strip('\n') +\
+                f', {OR:.2f}, {ci_low:.2f}, {ci_high:.2f}\n'
+        if ' coef ' in line:
+            result_flag = True
+            line = line.strip('\n') + ', Odds Ratio , [0.025 , 0.975]\n'
+
+        yield line
+
+
 def main(in_f, out_f):
-    with open(out_f, 'w') as fout:
-        result_flag = False
-        for line in open(in_f):
-            if line.startswith('Dep.'):
-                for a, b in {'SRA': 'SR', 'SRF': 'SR_F', 'SRM': 'SR_M',
-                             'SRB': 'SR_B'}.items():
-                    line = line.replace(a, b)
-            if line.startswith('Date:'):
-                line = line.replace(',', '.', 2).replace('.', ',', 1)
-            if line.startswith('GENDER'):
-                for a, b in {'GENDER_FL[T.AF]': 'Male-Female',
-                             'GENDER_FL[T.FA]': 'Female-Male',
-                             'GENDER_FL[T.FF]': 'Female-Female'}.items():
-                    line = line.replace(a, b)
-            if result_flag:
-                temp = line.split(',')
-                OR, ci_low, ci_high = np.exp([float(temp[1]),
-                                              float(temp[5]),
-                                              float(temp[6])])
-                line = line.strip('\n') +\
-                    f', {OR:.2f}, {ci_low:.2f}, {ci_high:.2f}\n'
-            if ' coef ' in line:
-                result_flag = True
-                line = line.strip('\n') + ', Odds Ratio , [0.025 , 0.975]\n'
-
-            fout.write(line)
+    with open(in_f) as fin, open(out_f, 'w') as fout:
+        fout.writelines(clean_lines(fin))
 
 
 if __name__ == "__main__":
@@ -8,11 +8,15 @@ output: a csv file with country and continent columns.
 
 """
 import sys
+from functools import partial
 
 import pandas as pd
 
+import telemetry
+from stage_cache import run_stage
 
-def clean_data(in_file, out_file):
+
+def load_continent_data(in_file):
     """ this function select two columns (country and continent), remove
     missing values
     """
@@ -25,11 +29,20 @@ def clean_data(in_file, out_file):
     geo_df.dropna(inplace=True)
     geo_df.drop_duplicates(inplace=True)
     geo_df.iloc[0].CONTINENT = 'Asia'
+    return geo_df
+
+
+def clean_data(in_file, out_file):
+    """ clean the country-continent data and save it """
+    geo_df = load_continent_data(in_file)
     geo_df.to_csv(out_file, index=False)
+    telemetry.checkpoint('country data saved.', rows=len(geo_df))
 
 
 if __name__ == "__main__":
     IN_FILE = sys.argv[1]
     OUT_FILE = sys.argv[2]
 
-    clean_data(IN_FILE, OUT_FILE)
+    telemetry.start('continent_data_cleaning', OUT_FILE)
+    run_stage(partial(clean_data, IN_FILE, OUT_FILE), inputs=[IN_FILE],
+              outputs=[OUT_FILE])
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+""" lazy access to the datasets of the workflow, for the notebooks.
+
+a `Dataset` is a derived dataset (see storage.py) with a projection (the
+selected columns) and predicates (row filters), which are only applied when
+the data is read:
+
+    >>> import sys; sys.path.insert(0, '../workflow/scripts')
+    >>> from datasets import open_dataset
+    >>> reg = open_dataset('reg_table')
+    >>> df = (reg.filter(DISCIPLINE='Health', YEAR=[2008, 2010])
+    ...          .filter(('N_AUTHORS', '>=', 3))
+    ...          .select('GENDER_FL', 'SRA')
+    ...          .load())
+
+only the selected and filtered columns are read, chunk by chunk, and each
+chunk is filtered before the next one is read, so the whole table is never in
+memory. parquet row groups whose column statistics (min/max) cannot satisfy
+the predicates are skipped without being read.
+
+the paper-mesh edges are read from the arrays cached by the workflow (see
+paper_mesh.py) with `paper_mesh_edges`, selected by paper and mesh before the
+edge table is built.
+
+"""
+import os
+import operator
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from storage import iter_table, table_columns, parquet_categories
+from paper_mesh import EDGE_CACHE_DIR, load_paper_mesh, select_meshes
+
+DATA_DIR = '../data'
+# file name, or (file name, reader options) for the tab separated files
+DATASETS = {'single_author': 'single_author.parquet',
+            'multi_author': 'multi_author.parquet',
+            'multi_author_final': 'multi_author_final.parquet',
+            'reg_table': 'reg_table.parquet',
+            'country_continent': 'country_continent.csv',
+            'female_frac_per_mesh': ('female_frac_per_mesh.csv',
+                                     {'sep': '\t'}),
+            'paper_mesh_feature': ('paper_mesh_feature.csv', {'sep': '\t'})}
+RAW_PAPER_MESH_DATA = 'MESH_v20180726.txt'
+
+OPERATORS = {'==': operator.eq,
+             '!=': operator.ne,
+             '<': operator.lt,
+             '<=': operator.le,
+             '>': operator.gt,
+             '>=': operator.ge,
+             'in': lambda values, value: values.isin(value),
+             'not in': lambda values, value: ~values.isin(value)}
+
+
+def _may_match(stats, op, value):
+    """ whether a row group with the column statistics `stats` may have rows
+    that satisfy the predicate """
+    if stats is None or not stats.has_min_max:
+        return True
+    low, high = stats.min, stats.max
+    try:
+        if isinstance(low, bytes):
+            # the statistics of string columns
+            low, high = low.decode(), high.decode()
+        if op == '==':
+            return low <= value <= high
+        if op == 'in':
+            return any(low <= v <= high for v in value)
+        if op in ['<', '<=']:
+            return OPERATORS[op](low, value)
+        if op in ['>', '>=']:
+            return OPERATORS[op](high, value)
+    except (TypeError, UnicodeDecodeError):
+        pass
+    return True
+
+
+class Dataset(object):
+    """ a derived dataset with a projection and row filters. `select` and
+    `filter` return new datasets; nothing is read until `iter_chunks`,
+    `load`, or `count`. `options` are passed to the reader of the file
+    (e.g. {'sep': '\\t'}). """
+
+    def __init__(self, path, columns=None, filters=(), options=None):
+        self.path = path
+        self.selected = None if columns is None else list(columns)
+        self.filters = list(filters)
+        self.options = dict(options or {})
+
+    def __repr__(self):
+        return (f'Dataset({self.path!r}, columns={self.selected!r}, '
+                f'filters={self.filters!r}, options={self.options!r})')
+
+    @property
+    def columns(self):
+        """ the columns of the dataset (read from the file's header) """
+        if self.selected is not None:
+            return self.selected
+        return table_columns(self.path, **self.options)
+
+    def select(self, *columns):
+        """ the dataset with only `columns` """
+        unknown = set(columns) - set(self.columns)
+        if unknown:
+            raise KeyError(f'unknown columns: {sorted(unknown)}')
+        return Dataset(self.path, columns, self.filters, self.options)
+
+    def filter(self, *predicates, **values):
+        """ the rows that satisfy all the predicates: (column, operator,
+        value) tuples (see `OPERATORS`), and column=value keywords (a list,
+        tuple, or set of values for 'in') """
+        predicates = list(predicates)
+        for col, value in sorted(values.items()):
+            op = 'in' if isinstance(value, (list, tuple, set)) else '=='
+            predicates.append((col, op, value))
+        all_columns = table_columns(self.path, **self.options)
+        for col, op, _ in predicates:
+            if op not in OPERATORS:
+                raise ValueError(f'unknown operator: {op}')
+            if col not in all_columns:
+                raise KeyError(f'unknown column: {col}')
+        return Dataset(self.path, self.selected, self.filters + predicates,
+                       self.options)
+
+    def _read_columns(self):
+        """ the columns to read: the selected and the filtered ones """
+        columns = self.columns
+        return columns + [col for col, _, _ in self.filters
+                          if col not in columns]
+
+    def _row_groups(self, parquet_file):
+        """ the row groups of a parquet file that may satisfy the filters """
+        metadata = parquet_file.metadata
+        positions = {metadata.schema.column(i).path: i
+                     for i in range(metadata.num_columns)}
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            if all(col not in positions or _may_match(
+                    row_group.column(positions[col]).statistics, op, value)
+                    for col, op, value in self.filters):
+                yield i
+
+    def _iter_raw_chunks(self, columns):
+        if os.path.splitext(self.path)[1].lower() != '.parquet':
+            yield from iter_table(self.path, columns=columns, **self.options)
+            return
+        parquet_file = pq.ParquetFile(self.path)
+        for i in self._row_groups(parquet_file):
+            yield parquet_file.read_row_group(i, columns=columns).to_pandas()
+
+    def _mask(self, df):
+        mask = np.ones(len(df), dtype=bool)
+        for col, op, value in self.filters:
+            mask &= np.asarray(OPERATORS[op](df[col], value), dtype=bool)
+        return mask
+
+    def iter_chunks(self):
+        """ iterate over the filtered rows in chunks (dataframes with a
+        default index) """
+        columns = self.columns
+        for df in self._iter_raw_chunks(self._read_columns()):
+            yield df[self._mask(df)][columns].reset_index(drop=True)
+
+    def load(self):
+        """ the filtered rows of the selected columns as a dataframe; the
+        categorical columns of parquet files stay categorical """
+        chunks = list(self.iter_chunks())
+        if not chunks:
+            return pd.DataFrame(columns=self.columns)
+        df = pd.concat(chunks, ignore_index=True)
+        if os.path.splitext(self.path)[1].lower() == '.parquet':
+            for col in parquet_categories(self.path):
+                if col in df and df[col].dtype.name != 'category':
+                    df[col] = df[col].astype('category')
+        return df
+
+    def count(self):
+        """ the number of filtered rows; only the filtered columns are
+        read """
+        if not self.filters and \
+                os.path.splitext(self.path)[1].lower() == '.parquet':
+            return pq.ParquetFile(self.path).metadata.num_rows
+        columns = [col for col, _, _ in self.filters] or self.columns[:1]
+        return sum(int(self._mask(df).sum())
+                   for df in self._iter_raw_chunks(sorted(set(columns))))
+
+
+def open_dataset(name, data_dir=DATA_DIR):
+    """ a derived dataset of the workflow by name (see `DATASETS`) """
+    try:
+        entry = DATASETS[name]
+    except KeyError:
+        raise KeyError(f'unknown dataset: {name} (one of {sorted(DATASETS)})')
+    fname, options = (entry, None) if isinstance(entry, str) else entry
+    return Dataset(os.path.join(data_dir, fname), options=options)
+
+
+def paper_mesh_edges(pids=None, mesh_terms=None, data_dir=DATA_DIR,
+                     cache_dir=EDGE_CACHE_DIR):
+    """ the paper-mesh edges (PID, MESH) of the papers `pids` and the meshes
+    `mesh_terms` (all if None). the cached edge arrays are memory-mapped;
+    only the selected edges are materialized. """
+    paper_mesh = load_paper_mesh(os.path.join(data_dir, RAW_PAPER_MESH_DATA),
+                                 cache_dir=cache_dir)
+    if mesh_terms is not None:
+        paper_mesh = select_meshes(paper_mesh, mesh_terms)
+    keep = slice(None)
+    if pids is not None:
+        has_pid = np.isin(paper_mesh.pids, np.asarray(list(pids)))
+        keep = has_pid[paper_mesh.pid_idx]
+    return pd.DataFrame({
+        'PID': paper_mesh.pids[paper_mesh.pid_idx[keep]],
+        'MESH': pd.Categorical.from_codes(paper_mesh.mesh_idx[keep],
+                                          paper_mesh.meshes)})
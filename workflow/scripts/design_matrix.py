@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+""" design matrices shared by the models with the same covariates.
+
+the right-hand side of a formula is encoded once for the whole regression
+table and cached on disk, keyed by the formula and a hash of the input file.
+the design matrix of a sample (discipline, year, ...) is then derived with a
+row mask, so each model only pays for the optimizer.
+
+deriving a sample matrix gives the same columns that patsy would build from
+the sample itself: dummy columns of levels that do not appear in the sample
+are dropped, and if the reference level does not appear, the first remaining
+level becomes the reference.
+
+"""
+import os
+import json
+import hashlib
+import logging
+from collections import namedtuple
+
+import numpy as np
+import patsy
+
+from stage_cache import save_array, save_json
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+# X: encoded rows (rows with missing values are dropped), columns: column
+# names, rows: positions of the encoded rows in the table, factors: (start,
+# stop, reduced) column ranges of the categorical terms; `reduced` is True if
+# the term has a reference level without a column (e.g. with an intercept).
+DesignMatrix = namedtuple('DesignMatrix', ['X', 'columns', 'rows', 'factors'])
+# X: design matrix of a sample, columns: column names, rows: positions in the
+# table, keep: boolean mask of the full design matrix's columns that are kept.
+SampleDesign = namedtuple('SampleDesign', ['X', 'columns', 'rows', 'keep'])
+
+
+def build_design_matrix(df, rhs):
+    """ encode the right-hand side formula `rhs` for all rows of `df` """
+    design_df = patsy.dmatrix(rhs, df, return_type='dataframe')
+    design_info = design_df.design_info
+    factors = []
+    for term in design_info.terms:
+        if len(term.factors) != 1:
+            continue
+        factor_info = design_info.factor_infos[term.factors[0]]
+        if factor_info.type == 'categorical':
+            term_slice = design_info.term_slices[term]
+            n_columns = term_slice.stop - term_slice.start
+            factors.append((term_slice.start, term_slice.stop,
+                            n_columns < len(factor_info.categories)))
+    return DesignMatrix(X=np.ascontiguousarray(design_df.values),
+                        columns=list(design_df.columns),
+                        rows=df.index.get_indexer(design_df.index).astype(
+                            np.int64),
+                        factors=factors)
+
+
+def _cache_key(rhs, input_digest):
+    key = json.dumps([CACHE_VERSION, rhs, input_digest])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def save_design_matrix(design, path_prefix):
+    """ save as `{path_prefix}.X.npy`, `.rows.npy`, and `.json` """
+    save_array(design.X, f'{path_prefix}.X.npy')
+    save_array(design.rows, f'{path_prefix}.rows.npy')
+    # the metadata is moved in place last; it marks the entry as complete
+    save_json({'columns': design.columns, 'factors': design.factors},
+              f'{path_prefix}.json')
+
+
+def load_design_matrix(path_prefix, mmap_mode='r'):
+    """ load a saved design matrix; the arrays are memory-mapped """
+    with open(f'{path_prefix}.json') as fin:
+        meta = json.load(fin)
+    X = np.load(f'{path_prefix}.X.npy', mmap_mode=mmap_mode)
+    return DesignMatrix(X=X, columns=meta['columns'],
+                        rows=np.load(f'{path_prefix}.rows.npy'),
+                        factors=[tuple(f) for f in meta['factors']])
+
+
+def get_design_matrix(df, rhs, input_digest=None, cache_dir=None):
+    """ the design matrix of `rhs` for `df`, from the cache if possible.
+
+    `input_digest` identifies the content of `df` (e.g. the digest of the
+    file it was loaded from, see stage_cache.py); nothing is cached without
+    it or `cache_dir`.
+    """
+    if input_digest is None or cache_dir is None:
+        return build_design_matrix(df, rhs)
+
+    path_prefix = os.path.join(cache_dir, _cache_key(rhs, input_digest))
+    if os.path.exists(f'{path_prefix}.json'):
+        logger.info('design matrix loaded from the cache: %s', rhs)
+        return load_design_matrix(path_prefix)
+
+    design = build_design_matrix(df, rhs)
+    os.makedirs(cache_dir, exist_ok=True)
+    save_design_matrix(design, path_prefix)
+    logger.info('design matrix cached: %s', rhs)
+    return load_design_matrix(path_prefix)
+
+
+def sample_design(design, mask):
+    """ the design matrix of the table rows selected by the boolean `mask` """
+    sub_rows = mask[design.rows]
+    X = design.X[sub_rows]
+    keep = np.ones(X.shape[1], dtype=bool)
+    for start, stop, reduced in design.factors:
+        counts = X[:, start:stop].sum(axis=0)
+        present = np.flatnonzero(counts > 0)
+        keep[start:stop] = counts > 0
+        # the reference level is missing from the sample
+        if reduced and counts.sum() == len(X) and len(present) > 0:
+            keep[start + present[0]] = False
+    return SampleDesign(X=X[:, keep],
+                        columns=[col for col, k in zip(design.columns, keep)
+                                 if k],
+                        rows=design.rows[sub_rows], keep=keep)
@@ -1,53 +1,326 @@
 # -*- coding: utf-8 -*-
 
-""" this script download the MeSH tree files from NIH ftp and saves them in 
-the data folder under 'mesh/'. 
+""" this script download the MeSH tree files from NIH ftp and saves them in
+the data folder under 'mesh/'.
+
+input: (optional) output directory (default: ../data/mesh), source (default:
+the NIH ftp server; an ftp:// or http(s):// url, or a local directory, with
+the layout of the server), number of connections (default: 4), manifest
+(default: manifest.json in the output directory; '' for the default),
+connection timeout in seconds (default: 60)
 
 output:
-    - data/mesh/'mtrees{year}.bin' files 
-        (note that there are no files for 1999 and 2000).  
+    - data/mesh/'mtrees{year}.bin' files
+        (note that there are no files for 1999 and 2000).
+    - data/mesh/manifest.json: the size and sha256 of each file.
+
+the files are downloaded concurrently, over a small pool of connections. a
+file is first written to 'mtrees{year}.bin.part', which is resumed by the
+next attempt (or run) if the download is interrupted, and moved in place
+once its size matches the source and its hash the manifest. a connection that
+stalls for longer than the timeout fails the attempt, which is retried. files
+that already match the manifest (or, without a manifest entry, the size at
+the source) are skipped. an http(s) source has to send the size of the files
+(Content-Length).
 
 """
 import sys
 import os
+import json
+import time
+import ftplib
+import hashlib
 import logging
-
+import shutil
+import socket
+import threading
+import urllib.request
 from itertools import chain
-from ftplib import FTP
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
 
+FTP_URL = 'ftp://nlmpubs.nlm.nih.gov'
+MESH_DIR = 'online/mesh'
+MTREE_FNAME = 'meshtrees/mtrees{year}.bin'
+MESH_YEARS = list(chain(range(1997, 1999), range(2001, 2019)))
+MANIFEST_FNAME = 'manifest.json'
+N_CONNECTIONS = 4
+RETRIES = 3
+RETRY_WAIT = 2  # seconds, doubled after every failed attempt
+TIMEOUT = 60  # seconds without an answer before an attempt fails
+BLOCKSIZE = 1 << 16
+DOWNLOAD_ERRORS = ftplib.all_errors + (socket.timeout,)
+
 
 def mk_outdir(out_path):
-    if not os.path.exists(out_path):
-        try:
-            os.makedirs(out_path)
-        except OSError as exc:
-            if exc.errno != errno.EEXIST:
-                raise
+    os.makedirs(out_path, exist_ok=True)
     logging.info('output directory is created.')
 
+
 def fpath_generator():
-    mesh_dir = 'online/mesh'
-    mtree_fname = 'meshtrees/mtrees{year}.bin'
-    for year in chain(range(1997, 1999), range(2001, 2019)):
+    for year in MESH_YEARS:
         year_folder = '1999-2010' if year < 2011 else f'{year}'
-        yield os.path.join(mesh_dir, 
-                           year_folder, 
-                           mtree_fname.format(year=year))
+        yield os.path.join(MESH_DIR,
+                           year_folder,
+                           MTREE_FNAME.format(year=year))
 
 
-if __name__ == "__main__":
-    FTP_URL = 'nlmpubs.nlm.nih.gov'
-    OUT_PATH = '../data/mesh'
+class Source(object):
+    """ base class of the download sources: `size(path)` is the size of a
+    file and `fetch(path, offset, fout)` appends its bytes from `offset` to
+    the binary file `fout` """
+
+    def size(self, path):
+        raise NotImplementedError
+
+    def fetch(self, path, offset, fout):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LocalSource(Source):
+    """ a local directory (e.g. a mirror of the server) """
+
+    def __init__(self, url, timeout=TIMEOUT):
+        self.root = url.path
+
+    def size(self, path):
+        return os.path.getsize(os.path.join(self.root, path))
+
+    def fetch(self, path, offset, fout):
+        with open(os.path.join(self.root, path), 'rb') as fin:
+            fin.seek(offset)
+            shutil.copyfileobj(fin, fout, BLOCKSIZE)
+
+
+class FTPSource(Source):
+    """ an ftp server; each thread keeps its own connection """
+
+    def __init__(self, url, timeout=TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def _connection(self):
+        ftp = getattr(self.local, 'ftp', None)
+        if ftp is None:
+            ftp = ftplib.FTP(timeout=self.timeout)
+            try:
+                ftp.connect(self.url.hostname, self.url.port or 21)
+                ftp.login(self.url.username or 'anonymous',
+                          self.url.password or '')
+                ftp.voidcmd('TYPE I')
+            except DOWNLOAD_ERRORS:
+                ftp.close()
+                raise
+            self.local.ftp = ftp
+            with self.lock:
+                self.connections.append(ftp)
+        return ftp
+
+    def _path(self, path):
+        return '/'.join([self.url.path.rstrip('/'), path]).lstrip('/')
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return getattr(self._connection(), method)(*args, **kwargs)
+        except DOWNLOAD_ERRORS:
+            # the connection may be broken; the next call reconnects
+            self.local.ftp = None
+            raise
+
+    def size(self, path):
+        return self._call('size', self._path(path))
+
+    def fetch(self, path, offset, fout):
+        self._call('retrbinary', f'RETR {self._path(path)}', fout.write,
+                   BLOCKSIZE, offset or None)
+
+    def close(self):
+        for ftp in self.connections:
+            try:
+                ftp.quit()
+            except DOWNLOAD_ERRORS:
+                ftp.close()
 
-    mk_outdir(OUT_PATH)
-    ftp = FTP(FTP_URL)
-    ftp.login()
 
-    for fname in fpath_generator():
-        out_fname = os.path.join(OUT_PATH, os.path.basename(fname))
-        ftp.retrbinary(f'RETR {fname}', open(out_fname, 'wb').write)
-        logging.info(f'{fname} downloaded.') 
+class HTTPSource(Source):
+    """ an http(s) server; partial files are resumed with range requests """
 
+    def __init__(self, url, timeout=TIMEOUT):
+        self.root = url.geturl().rstrip('/')
+        self.timeout = timeout
 
+    def size(self, path):
+        request = urllib.request.Request(f'{self.root}/{path}',
+                                         method='HEAD')
+        with urllib.request.urlopen(request,
+                                    timeout=self.timeout) as response:
+            size = response.headers['Content-Length']
+        if size is None:
+            # e.g. a chunked response; the download could not be verified
+            raise ValueError(f'{path}: the server sends no Content-Length')
+        return int(size)
+
+    def fetch(self, path, offset, fout):
+        request = urllib.request.Request(f'{self.root}/{path}')
+        if offset:
+            request.add_header('Range', f'bytes={offset}-')
+        with urllib.request.urlopen(request,
+                                    timeout=self.timeout) as response:
+            if offset and response.status != 206:
+                # the server sends the whole file
+                fout.truncate(0)
+            shutil.copyfileobj(response, fout, BLOCKSIZE)
+
+
+SOURCES = {'': LocalSource,
+           'file': LocalSource,
+           'ftp': FTPSource,
+           'http': HTTPSource,
+           'https': HTTPSource}
+
+
+def open_source(url, timeout=TIMEOUT):
+    """ the source of a url (or a local directory); its connections fail
+    after `timeout` seconds without an answer """
+    parsed = urlparse(url)
+    try:
+        source = SOURCES[parsed.scheme]
+    except KeyError:
+        raise ValueError(f'unknown source: {url}')
+    return source(parsed, timeout)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fin:
+        for block in iter(lambda: fin.read(BLOCKSIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_f):
+    """ file name -> {'size', 'sha256'} """
+    if not os.path.exists(manifest_f):
+        return {}
+    with open(manifest_f) as fin:
+        return json.load(fin)
+
+
+def save_manifest(manifest, manifest_f):
+    with open(f'{manifest_f}.tmp', 'w') as fout:
+        json.dump(manifest, fout, indent=2, sort_keys=True)
+    os.replace(f'{manifest_f}.tmp', manifest_f)
+
+
+def matches(path, entry):
+    """ whether the file has the size and hash of the manifest entry """
+    return entry is not None and os.path.exists(path) and \
+        os.path.getsize(path) == entry['size'] and \
+        file_sha256(path) == entry['sha256']
+
+
+def _wait(attempt):
+    time.sleep(RETRY_WAIT * 2 ** (attempt - 1))
+
+
+def remote_size(source, path):
+    """ the size of a file at the source, retried on errors """
+    for attempt in range(1, RETRIES + 1):
+        try:
+            return source.size(path)
+        except DOWNLOAD_ERRORS as exc:
+            logging.warning(f'{path}: attempt {attempt} failed ({exc}).')
+            if attempt < RETRIES:
+                _wait(attempt)
+    raise RuntimeError(f'{path}: size unknown after {RETRIES} attempts')
+
+
+def download_file(source, path, out_f, entry=None):
+    """ download `path` of the source to `out_f`, unless it matches the
+    manifest `entry`. returns the manifest entry of the file. """
+    if matches(out_f, entry):
+        logging.info(f'{path} is up to date.')
+        return entry
+    size = remote_size(source, path)
+    if entry is not None and entry['size'] != size:
+        raise ValueError(f'{path}: {size} bytes at the source, '
+                         f'{entry["size"]} in the manifest')
+    if entry is None and os.path.exists(out_f) and \
+            os.path.getsize(out_f) == size:
+        logging.info(f'{path} is up to date.')
+        return {'size': size, 'sha256': file_sha256(out_f)}
+
+    part_f = f'{out_f}.part'
+    for attempt in range(1, RETRIES + 1):
+        offset = os.path.getsize(part_f) if os.path.exists(part_f) else 0
+        if offset > size:
+            offset = 0
+            os.remove(part_f)
+        try:
+            with open(part_f, 'ab') as fout:
+                if offset < size:
+                    source.fetch(path, offset, fout)
+        except DOWNLOAD_ERRORS as exc:
+            logging.warning(f'{path}: attempt {attempt} failed ({exc}).')
+            if attempt < RETRIES:
+                _wait(attempt)
+            continue
+        downloaded = {'size': os.path.getsize(part_f),
+                      'sha256': file_sha256(part_f)}
+        if downloaded['size'] == size and \
+                (entry is None or downloaded == entry):
+            os.replace(part_f, out_f)
+            logging.info(f'{path} downloaded.')
+            return downloaded
+        # a corrupt file is downloaded again from the start
+        logging.warning(f'{path}: attempt {attempt} does not match the '
+                        'source size or the manifest.')
+        os.remove(part_f)
+    raise RuntimeError(f'{path}: download failed after {RETRIES} attempts')
+
+
+def main(out_path, source_url=FTP_URL, n_connections=N_CONNECTIONS,
+         manifest_f=None, timeout=TIMEOUT):
+    """ download the MeSH tree files of all years to `out_path` """
+    mk_outdir(out_path)
+    manifest_f = manifest_f or os.path.join(out_path, MANIFEST_FNAME)
+    manifest = load_manifest(manifest_f)
+    source = open_source(source_url, timeout)
+    failed = []
+    try:
+        with ThreadPoolExecutor(n_connections) as executor:
+            futures = {}
+            for path in fpath_generator():
+                fname = os.path.basename(path)
+                futures[executor.submit(
+                    download_file, source, path,
+                    os.path.join(out_path, fname),
+                    manifest.get(fname))] = fname
+            for future in as_completed(futures):
+                try:
+                    manifest[futures[future]] = future.result()
+                except (ValueError, RuntimeError) as exc:
+                    logging.error(exc)
+                    failed.append(futures[future])
+    finally:
+        source.close()
+        save_manifest(manifest, manifest_f)
+    if failed:
+        raise RuntimeError(f'not downloaded: {sorted(failed)}')
+
+
+if __name__ == "__main__":
+    OUT_PATH = sys.argv[1] if len(sys.argv) > 1 else '../data/mesh'
+    SOURCE = sys.argv[2] if len(sys.argv) > 2 else FTP_URL
+    CONNECTIONS = int(sys.argv[3]) if len(sys.argv) > 3 else N_CONNECTIONS
+    MANIFEST = sys.argv[4] if len(sys.argv) > 4 else None
+    TIMEOUT_S = float(sys.argv[5]) if len(sys.argv) > 5 else TIMEOUT
+    main(OUT_PATH, SOURCE, CONNECTIONS, MANIFEST, TIMEOUT_S)
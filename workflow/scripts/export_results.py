@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" This script exports the cleaned results from the result store.
+
+input: result store, cleaned table path template (with '{name}'), (optional)
+model names (default: all the models of the store)
+
+output: cleaned tables
+
+the cleaned tables are built from the models table (fit statistics, residual
+diagnostics) and the coefficients table (labeled terms, odds ratios) of the
+store, in the layout of the summary tables cleaned by clean_sr_reg_results.py
+(logit models) and clean_jif_reg_results.py (OLS models): the statsmodels
+summary tables with the labels written over the names (keeping the padding of
+the names), the date without its comma, and the odds ratios of the logit
+models. All the cleaned tables are written by one process.
+
+"""
+
+import sys
+import time
+import logging
+
+from statsmodels.iolib.summary import summary_params, summary_top
+
+from result_store import FITTED_FORMAT, read_coefficients, read_models
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+TITLES = {'logit': 'Logit Regression Results',
+          'ols': 'OLS Regression Results'}
+OR_HEADER = ', Odds Ratio , [0.025 , 0.975]'
+
+
+def _cells(fmt, value):
+    return [fmt % value]
+
+
+def _fitted(model):
+    fitted = time.strptime(model.fitted, FITTED_FORMAT)
+    # the comma of the summary date would be a column of the csv table
+    return ([time.strftime('%a. %d %b %Y', fitted)],
+            [time.strftime('%H:%M:%S', fitted)])
+
+
+def top_table(model, variables):
+    """ the summary table of the model fit (as the statsmodels summary) """
+    date, fit_time = _fitted(model)
+    if model.family == 'logit':
+        left = [('Dep. Variable:', [model.dv]), ('Model:', ['Logit']),
+                ('Method:', ['MLE']), ('Date:', date), ('Time:', fit_time),
+                ('converged:', [str(bool(model.converged))])]
+        right = [('No. Observations:', _cells('%#6d', model.nobs)),
+                 ('Df Residuals:', _cells('%#6d', model.df_resid)),
+                 ('Df Model:', _cells('%#6d', model.df_model)),
+                 ('Pseudo R-squ.:', _cells('%#6.4g', model.prsquared)),
+                 ('Log-Likelihood:', _cells('%#8.5g', model.llf)),
+                 ('LL-Null:', _cells('%#8.5g', model.llnull)),
+                 ('LLR p-value:', _cells('%#6.4g', model.llr_pvalue))]
+    else:
+        left = [('Dep. Variable:', [model.dv]), ('Model:', ['OLS']),
+                ('Method:', ['Least Squares']), ('Date:', date),
+                ('Time:', fit_time),
+                ('No. Observations:', _cells('%#6d', model.nobs)),
+                ('Df Residuals:', _cells('%#6d', model.df_resid)),
+                ('Df Model:', _cells('%#6d', model.df_model)),
+                ('Covariance Type:', ['nonrobust'])]
+        right = [('R-squared:', _cells('%#8.3f', model.rsquared)),
+                 ('Adj. R-squared:', _cells('%#8.3f', model.rsquared_adj)),
+                 ('F-statistic:', _cells('%#8.4g', model.fvalue)),
+                 ('Prob (F-statistic):', _cells('%#6.3g', model.f_pvalue)),
+                 ('Log-Likelihood:', _cells('%#8.5g', model.llf)),
+                 ('AIC:', _cells('%#8.4g', model.aic)),
+                 ('BIC:', _cells('%#8.4g', model.bic))]
+    return summary_top(None, gleft=left, gright=right, yname=model.dv,
+                       xname=variables, title=TITLES[model.family])
+
+
+def params_table(model, coefficients):
+    """ the summary table of the coefficients """
+    params = (None, coefficients.coef.values, coefficients.std_err.values,
+              coefficients.statistic.values, coefficients.pvalue.values,
+              coefficients[['ci_low', 'ci_high']].values)
+    return summary_params(params, yname=model.dv,
+                          xname=list(coefficients.variable),
+                          use_t=model.family == 'ols')
+
+
+def diagnostics_table(model, variables):
+    """ the summary table of the residual diagnostics of an OLS model """
+    left = [('Omnibus:', _cells('%#6.3f', model.omnibus)),
+            ('Prob(Omnibus):', _cells('%#6.3f', model.omnibus_pvalue)),
+            ('Skew:', _cells('%#6.3f', model.skew)),
+            ('Kurtosis:', _cells('%#6.3f', model.kurtosis))]
+    right = [('Durbin-Watson:', _cells('%#8.3f', model.durbin_watson)),
+             ('Jarque-Bera (JB):', _cells('%#8.3f', model.jarque_bera)),
+             ('Prob(JB):', _cells('%#8.3g', model.jb_pvalue)),
+             ('Cond. No.', _cells('%#8.3g', model.condition_number))]
+    return summary_top(None, gleft=left, gright=right, yname=model.dv,
+                       xname=variables, title='')
+
+
+def _relabel(line, start, name, label):
+    """ `line` with the label written over the name at `start` """
+    assert line.startswith(name, start), (line, name)
+    return line[:start] + label + line[start + len(name):]
+
+
+def cleaned_lines(model, coefficients):
+    """ the lines of the cleaned table of a model """
+    variables = list(coefficients.variable)
+    top = top_table(model, variables).as_csv().split('\n')
+    dep = top.index(next(line for line in top
+                         if line.startswith('Dep. Variable:')))
+    top[dep] = _relabel(top[dep], top[dep].index(',') + 1, model.dv,
+                        model.dv_label)
+    header, *rows = params_table(model, coefficients).as_csv().split('\n')
+    rows = [_relabel(row, 0, coef.variable, coef.label)
+            for row, coef in zip(rows, coefficients.itertuples())]
+    if model.family == 'logit':
+        header += OR_HEADER
+        rows = [f'{row}, {coef.odds_ratio:.2f}, {coef.or_ci_low:.2f}, '
+                f'{coef.or_ci_high:.2f}'
+                for row, coef in zip(rows, coefficients.itertuples())]
+        lines = top + [header] + rows
+    else:
+        diagnostics = diagnostics_table(model, variables).as_csv()
+        lines = top + [header] + rows + [''] + diagnostics.split('\n') + ['']
+    return [line + '\n' for line in lines]
+
+
+def main(store_f, out_path, names=None):
+    models = read_models(store_f, names)
+    coefficients = read_coefficients(store_f, names)
+    for model in models.itertuples():
+        with open(out_path.format(name=model.name), 'w') as fout:
+            fout.writelines(cleaned_lines(
+                model, coefficients[coefficients.name == model.name]))
+    logging.info('%d cleaned tables exported.', len(models))
+
+
+if __name__ == "__main__":
+    RESULT_STORE = sys.argv[1]
+    CLEANED_PATH = sys.argv[2]
+    NAMES = sys.argv[3:] or None
+    main(RESULT_STORE, CLEANED_PATH, NAMES)
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+""" models with absorbed fixed effects.
+
+a categorical column with many levels (e.g. SUBDISCIPLINE or VENUE) can be
+absorbed instead of being encoded as dummy columns: the design matrix only
+has the other covariates, and the effects of the levels are neither estimated
+explicitly nor reported.
+
+    - OLS: the dependent variable and the covariates are demeaned within the
+    levels of each absorbed column, by alternating projections (one pass for
+    a single column), and fitted by OLS (the within estimator). the degrees
+    of freedom account for the absorbed levels, so the coefficients, standard
+    errors, and fit statistics (R-squared, F test, log-likelihood, AIC, BIC)
+    are those of the dummy variable model.
+    - logit: the log-likelihood is concentrated in the fixed effects. each
+    Newton (IRLS) step demeans the working response and the covariates with
+    the IRLS weights, which gives the step of the dummy variable model
+    without its columns; the standard errors are those of the dummy variable
+    model. the levels whose rows all have the same outcome have an infinite
+    effect and their rows carry no information on the coefficients, so they
+    are dropped first.
+
+the intercept is absorbed as well. covariates that do not vary within the
+levels (collinear with the fixed effects) are dropped.
+
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from statsmodels.regression.linear_model import (OLSResults,
+                                                 RegressionResultsWrapper)
+from statsmodels.tools.decorators import cache_readonly
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from scipy.special import expit
+
+from chunked_logit import ChunkedLogitResults
+
+logger = logging.getLogger(__name__)
+
+DEMEAN_TOL = 1e-10
+DEMEAN_MAXITER = 10000
+# covariates whose demeaned norm is below this fraction of their norm are
+# taken as collinear with the fixed effects
+COLLINEAR_TOL = 1e-9
+
+
+def absorbed_groups(df, columns, rows):
+    """ the level codes (0..n_levels - 1) of the `rows` of `df` in each of
+    the absorbed `columns` """
+    return [pd.factorize(df[col].values[rows])[0] for col in columns]
+
+
+def absorbed_dof(groups):
+    """ the degrees of freedom of the fixed effects: the number of levels,
+    less the redundant ones. the redundant levels of the first two columns
+    are counted exactly (one per connected set of levels); each other column
+    is assumed to have one. """
+    n_levels = [codes.max() + 1 if len(codes) else 0 for codes in groups]
+    if len(groups) < 2:
+        return sum(n_levels)
+    first, second = groups[:2]
+    links = sparse.coo_matrix(
+        (np.ones(len(first)), (first, second + n_levels[0])),
+        shape=(n_levels[0] + n_levels[1],) * 2)
+    n_connected, _ = connected_components(links, directed=False)
+    return sum(n_levels) - n_connected - (len(groups) - 2)
+
+
+def demean(X, groups, weights=None, tol=DEMEAN_TOL, maxiter=DEMEAN_MAXITER):
+    """ the columns of `X` less their (weighted) means within the levels of
+    each of the `groups`, by alternating projections """
+    X = np.array(X, dtype=float)
+    weights = np.ones(len(X)) if weights is None else weights
+    level_weights = [np.bincount(codes, weights=weights) for codes in groups]
+    scale = max(np.abs(X).max(), 1.) if X.size else 1.
+    for iteration in range(maxiter):
+        change = 0.
+        for codes, total in zip(groups, level_weights):
+            for j in range(X.shape[1]):
+                means = np.bincount(codes, weights=weights * X[:, j]) / total
+                X[:, j] -= means[codes]
+                change = max(change, np.abs(means).max())
+        if len(groups) == 1 or change < tol * scale:
+            break
+    else:
+        logger.warning('demeaning did not converge in %d iterations.',
+                       maxiter)
+    return X
+
+
+def _drop_collinear(X, X_demeaned, columns):
+    """ the columns that vary within the levels """
+    norms = np.sqrt((X ** 2).sum(axis=0))
+    keep = np.sqrt((X_demeaned ** 2).sum(axis=0)) > COLLINEAR_TOL * norms
+    if not keep.all():
+        logger.warning('collinear with the fixed effects (dropped): %s',
+                       [col for col, k in zip(columns, keep) if not k])
+    return keep
+
+
+def informative_rows(y, groups):
+    """ the rows that are not in a level whose rows all have the same
+    outcome; dropping rows may make other levels uniform, so this is
+    repeated until no level is """
+    keep = np.ones(len(y), dtype=bool)
+    while True:
+        uniform = np.zeros(len(y), dtype=bool)
+        for codes in groups:
+            n = np.bincount(codes[keep], minlength=codes.max() + 1)
+            positive = np.bincount(codes[keep], weights=y[keep],
+                                   minlength=len(n))
+            uniform |= ((positive == 0) | (positive == n))[codes]
+        uniform &= keep
+        if not uniform.any():
+            return keep
+        keep &= ~uniform
+
+
+def _recode(groups, rows):
+    """ the level codes of the `rows`, without the levels that are left """
+    return [np.unique(codes[rows], return_inverse=True)[1]
+            for codes in groups]
+
+
+class AbsorbedOLSResults(OLSResults):
+    """ OLS results of the demeaned data, with the total sum of squares
+    `tss` of the dependent variable (about its mean) """
+
+    def __init__(self, model, params, normalized_cov_params, tss):
+        super().__init__(model, params,
+                         normalized_cov_params=normalized_cov_params,
+                         cov_type='nonrobust')
+        self._tss = tss
+
+    @cache_readonly
+    def centered_tss(self):
+        return self._tss
+
+
+def fit_absorbed_ols(endog, exog, groups):
+    """ OLS of `endog` (series) on `exog` (dataframe) with the fixed effects
+    of the `groups` (level codes of each row) absorbed """
+    exog = exog.drop(columns=['Intercept'], errors='ignore')
+    demeaned = demean(np.column_stack([endog.values, exog.values]), groups)
+    keep = _drop_collinear(exog.values, demeaned[:, 1:], exog.columns)
+    model = sm.OLS(pd.Series(demeaned[:, 0], name=endog.name),
+                   pd.DataFrame(demeaned[:, 1:][:, keep],
+                                columns=exog.columns[keep]))
+    # the residuals are those of the dummy variable model, whose intercept
+    # is one of the absorbed effects
+    df_absorbed = absorbed_dof(groups)
+    model.k_constant = 1
+    model.df_model = keep.sum() + df_absorbed - 1
+    model.df_resid = len(endog) - keep.sum() - df_absorbed
+    result = model.fit()
+    y = endog.values
+    return RegressionResultsWrapper(AbsorbedOLSResults(
+        model, result.params.values, result.normalized_cov_params,
+        np.sum((y - y.mean()) ** 2)))
+
+
+class AbsorbedLogit(object):
+    """ logit model of `endog` (series) on `exog` (dataframe) with the fixed
+    effects of the `groups` (level codes of each row) absorbed """
+
+    def __init__(self, endog, exog, groups):
+        exog = exog.drop(columns=['Intercept'], errors='ignore')
+        rows = informative_rows(endog.values, groups)
+        if not rows.all():
+            logger.info('%d rows in levels with a single outcome dropped.',
+                        (~rows).sum())
+        self.y = endog.values[rows].astype(float)
+        self.groups = _recode(groups, rows)
+        X = exog.values[rows].astype(float)
+        keep = _drop_collinear(X, demean(X, self.groups), exog.columns)
+        self.X = X[:, keep]
+        self.endog_names = endog.name
+        self.exog_names = list(exog.columns[keep])
+
+    def fit(self, maxiter=35, tol=1e-8):
+        """ maximum likelihood by IRLS, starting from the means of the
+        outcomes shrunk toward 1/2. converged once no coefficient changes
+        by more than `tol`. """
+        mu = (self.y + .5) / 2
+        eta = np.log(mu / (1 - mu))
+        params = np.full(self.X.shape[1], np.nan)
+        converged = False
+        for iteration in range(1, maxiter + 1):
+            weights = mu * (1 - mu)
+            z = eta + (self.y - mu) / weights
+            demeaned = demean(np.column_stack([z, self.X]), self.groups,
+                              weights)
+            z_dm, X_dm = demeaned[:, 0], demeaned[:, 1:]
+            info = (X_dm * weights[:, None]).T @ X_dm
+            new_params = np.linalg.solve(info, X_dm.T @ (weights * z_dm))
+            # the fitted linear predictor, fixed effects included
+            eta = z - (z_dm - X_dm @ new_params)
+            mu = expit(eta)
+            converged = np.abs(new_params - params).max() < tol
+            params = new_params
+            llf = np.sum(self.y * eta - np.logaddexp(0, eta))
+            logger.info('iteration %d: log-likelihood %.4f', iteration, llf)
+            if converged:
+                break
+
+        weights = mu * (1 - mu)
+        X_dm = demean(self.X, self.groups, weights)
+        info = (X_dm * weights[:, None]).T @ X_dm
+        return ChunkedLogitResults(
+            self, params, np.linalg.inv(info), llf, len(self.y),
+            self.y.sum(), converged, iteration,
+            df_absorbed=absorbed_dof(self.groups))
+
+
+def fit_absorbed(family, endog, exog, groups):
+    """ the result of a `family` ('ols' or 'logit') model with absorbed
+    fixed effects """
+    if family == 'ols':
+        return fit_absorbed_ols(endog, exog, groups)
+    if family == 'logit':
+        return AbsorbedLogit(endog, exog, groups).fit()
+    raise ValueError(f'unknown family: {family}')
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" This script sums the female author counts of the shards (see shards.py).
+
+input: the path template of the shard counts (directories, with '{shard}';
+see shard_counts.py), the shards (comma separated), the female fraction per
+mesh output path, the covariate counts output directory, and (optional) the
+mesh index: hierarchical mode (the shards are counted per disease tree
+number; see shard_counts.py)
+
+output:
+    - female frac per mesh file, as cal_female_frac_per_mesh.py writes it
+    for the whole data (per disease tree number in the hierarchical mode).
+    - the summed `f_cov_counts` of each female fraction covariate (see
+    multi_author_data_with_cov.py), from which the covariates of the shards
+    are looked up.
+
+"""
+import os
+import sys
+import logging
+
+import telemetry
+from shards import load_mesh_counts, add_mesh_counts
+from mesh_index import load_mesh_index
+from paper_mesh import mesh_fracs, tree_fracs
+from multi_author_data_with_cov import (add_f_cov_counts, load_f_cov_counts,
+                                        save_f_cov_counts)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+
+def main(shard_counts_path, shards, out_path, counts_dir,
+         mesh_index_dir=None):
+    """ sum the counts of the `shards` """
+    meshes, counts, cov_counts = None, None, None
+    for shard in shards:
+        shard_dir = shard_counts_path.format(shard=shard)
+        shard_meshes, shard_counts = load_mesh_counts(shard_dir)
+        shard_cov_counts = load_f_cov_counts(shard_dir)
+        if meshes is None:
+            meshes, counts, cov_counts = (shard_meshes, shard_counts,
+                                          shard_cov_counts)
+            continue
+        meshes, counts = add_mesh_counts(meshes, counts, shard_meshes,
+                                         shard_counts)
+        cov_counts = {cov_cols: add_f_cov_counts(
+            cov_counts[cov_cols], shard_cov_counts[cov_cols], list(cov_cols))
+            for cov_cols in cov_counts}
+    telemetry.checkpoint('shard counts summed.', rows=len(shards))
+
+    if mesh_index_dir is None:
+        mesh_frac_df = mesh_fracs(meshes, counts)
+    else:
+        mesh_frac_df = tree_fracs(meshes, counts,
+                                  load_mesh_index(mesh_index_dir))
+    mesh_frac_df.to_csv(out_path, sep='\t', index=False)
+    telemetry.checkpoint('female fraction per mesh saved.',
+                         rows=len(mesh_frac_df))
+
+    os.makedirs(counts_dir, exist_ok=True)
+    save_f_cov_counts(cov_counts, counts_dir)
+    telemetry.checkpoint('covariate counts saved.')
+
+
+if __name__ == "__main__":
+    SHARD_COUNTS = sys.argv[1]
+    SHARDS = [shard for shard in sys.argv[2].split(',') if shard]
+    OUT_PATH = sys.argv[3]
+    COUNTS_DIR = sys.argv[4]
+    MESH_INDEX = sys.argv[5] if len(sys.argv) > 5 else None
+    telemetry.start('gather_counts', OUT_PATH)
+    main(SHARD_COUNTS, SHARDS, OUT_PATH, COUNTS_DIR, MESH_INDEX)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" This script gathers the result stores of the models fitted by separate
+jobs (see run_regression.py) into one result store.
+
+input: output result store, the result stores of the models (in order)
+
+output: result store of all the models (see result_store.py)
+
+"""
+import sys
+import logging
+
+from result_store import read_records, save_records
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+
+def main(out_f, store_fs):
+    """ write the records of the stores `store_fs` to `out_f` """
+    records = [record for store_f in store_fs
+               for record in read_records(store_f)]
+    names = [record['model']['name'] for record in records]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise ValueError(f'models in several stores: {duplicated}')
+    save_records(records, out_f)
+    logging.info('%d models gathered.', len(records))
+
+
+if __name__ == "__main__":
+    RESULT_STORE = sys.argv[1]
+    MODEL_STORES = sys.argv[2:]
+    main(RESULT_STORE, MODEL_STORES)
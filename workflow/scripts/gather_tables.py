@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" This script concatenates the tables of the shards (see shards.py).
+
+input: output table, the tables of the shards (in order)
+
+output: the table of all the rows (csv/parquet/feather, by the extension of
+the output path); the categorical columns have the sorted union of the levels
+of the shards, as if the whole data had been processed at once.
+
+"""
+import sys
+import logging
+
+import telemetry
+from storage import load_table, save_table
+from shards import concat_tables
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+
+def main(out_f, shard_fs):
+    """ concatenate the tables `shard_fs` into `out_f` """
+    df = concat_tables([load_table(shard_f) for shard_f in shard_fs])
+    telemetry.checkpoint('shard tables loaded.', rows=len(df))
+    save_table(df, out_f)
+    telemetry.checkpoint('table saved.', rows=len(df))
+
+
+if __name__ == "__main__":
+    OUT_PATH = sys.argv[1]
+    SHARD_TABLES = sys.argv[2:]
+    telemetry.start('gather_tables', OUT_PATH)
+    main(OUT_PATH, SHARD_TABLES)
@@ -4,43 +4,48 @@
 category.
 
 input:
-    - ../data/mesh/mtrees{year}.bin files
-        (note that there are no files for 1999 and 2000).
+    - ../data/mesh_index/: the MeSH index compiled from the
+    ../data/mesh/mtrees{year}.bin files (see build_mesh_index.py; note that
+    there are no files for 1999 and 2000).
 
 output:
     - ../data/disease_mesh.txt
 
+a term is a disease term if it has a tree number in the "C" category in any
+year.
+
 """
 import os
 import sys
-import glob
 import logging
+from functools import partial
+
+import telemetry
+from stage_cache import run_stage
+from mesh_index import (DISEASE_CATEGORY, INDEX_FILES, load_mesh_index,
+                        category_terms)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
 
 
-def disease_mesh_term_generator(mesh_files):
-    """ a generator that yield disease mesh terms """
-    for mesh_f in mesh_files:
-        for line in open(mesh_f):
-            try:
-                term, code = line.strip().split(';')
-            except ValueError:
-                continue
-            if code.startswith('C'):
-                yield term
+def disease_terms(index):
+    """ the disease terms of the index """
+    return index.terms[category_terms(index, DISEASE_CATEGORY)]
 
 
-def main(mesh_path, out_path):
+def main(index_dir, out_path):
     """ main function """
-    meshtree_files = glob.glob(os.path.join(mesh_path, '*'))
-    disease_mesh_terms = set(disease_mesh_term_generator(meshtree_files))
+    disease_mesh_terms = disease_terms(load_mesh_index(index_dir))
     with open(out_path, 'w') as fout:
         fout.write('\n'.join(disease_mesh_terms))
+    telemetry.checkpoint('disease mesh terms saved.',
+                         rows=len(disease_mesh_terms))
 
 
 if __name__ == "__main__":
-    IN_FILES = sys.argv[1:-1]
-    OUT_PATH = sys.argv[-1]
-    MESH_PATH = os.path.commonpath(IN_FILES)
-    main(MESH_PATH, OUT_PATH)
+    INDEX_DIR = sys.argv[1]
+    OUT_PATH = sys.argv[2]
+    telemetry.start('generate_disease_mesh_terms', OUT_PATH)
+    run_stage(partial(main, INDEX_DIR, OUT_PATH),
+              inputs=[os.path.join(INDEX_DIR, name) for name in INDEX_FILES],
+              outputs=[OUT_PATH])
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+""" this script generates a synthetic corpus with the layout of the raw
+datasets, to run and benchmark the workflow without the proprietary data.
+
+input: output directory, number of papers, (optional) random seed
+
+output (in the output directory):
+    - genderXgender.txt: publication table (the columns of `load_data` in
+    main_data_cleaning.py).
+    - country_continent.csv, country_continent_added.csv: country data.
+    - MESH.txt: paper-mesh edges; the term frequencies follow Zipf's law.
+    - mesh/mtrees{year}.bin: mesh trees of each year in MESH_YEARS.
+
+the values are random; only the sizes, the dtypes, and the rough shape of the
+distributions (e.g. single author papers, unknown genders, popular journals
+and terms) resemble the real data.
+
+"""
+import os
+import sys
+import logging
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+CHUNKSIZE = 1000000
+MESH_YEARS = list(chain(range(1997, 1999), range(2001, 2019)))
+PUB_YEARS = list(range(2008, 2017))
+
+N_VENUES = 5000
+N_MESH_TERMS = 28000
+DISEASE_FRAC = 0.2  # fraction of the mesh terms in the "C" category
+MESH_PER_PAPER = 8  # mean number of mesh terms per paper
+ZIPF_EXPONENT = 1.1
+
+DISCIPLINES = {
+    'Biomedical Research': ['Biochemistry & Molecular Biology', 'Genetics',
+                            'Immunology', 'Microbiology', 'Cellular Biology',
+                            'Pharmacology', 'Physiology'],
+    'Clinical Medicine': ['Cardiology', 'Cancer', 'Pediatrics', 'Surgery',
+                          'Neurology & Neurosurgery', 'General & Internal '
+                          'Medicine', 'Psychiatry', 'Endocrinology'],
+    'Health': ['Public Health', 'Nursing', 'Health Policy & Services',
+               'Rehabilitation', 'Social Sciences, Biomedical']}
+COUNTRIES = {'USA': 'Northern America', 'Canada': 'Northern America',
+             'England': 'Europe', 'France': 'Europe', 'Germany': 'Europe',
+             'Italy': 'Europe', 'Spain': 'Europe', 'Netherlands': 'Europe',
+             'China': 'Asia', 'Japan': 'Asia', 'India': 'Asia',
+             'South Korea': 'Asia', 'Brazil': 'Latin America',
+             'Mexico': 'Latin America', 'Nigeria': 'Africa',
+             'South Africa': 'Africa', 'Australia': 'Oceania',
+             'Iran': 'Middle East'}
+ADDED_COUNTRIES = {'Scotland': 'Europe'}
+# countries of papers that are in neither country file
+UNLISTED_COUNTRIES = ['Atlantis']
+
+GENDERS = ['M', 'F', 'm', 'f', 'UNK', 'INI', 'UNI']
+GENDER_P = [.5, .3, .03, .02, .08, .05, .02]
+GENDER_TOPICS = ['N', 'B', 'M', 'F']
+GENDER_TOPIC_P = [.75, .18, .04, .03]
+
+
+def zipf_choice(rng, n_items, size, exponent=ZIPF_EXPONENT):
+    """ `size` item indices drawn with probabilities proportional to
+    1 / rank ** exponent """
+    cum_weights = np.cumsum(1 / np.arange(1, n_items + 1) ** exponent)
+    return np.searchsorted(cum_weights, rng.random_sample(size) *
+                           cum_weights[-1])
+
+
+def pub_chunk(rng, pids, venue_ifs):
+    """ a chunk of the publication table with the papers `pids` """
+    n = len(pids)
+    disciplines = list(DISCIPLINES)
+    discipline = rng.randint(len(disciplines), size=n)
+    subdisciplines = np.array([sub for d in disciplines
+                               for sub in DISCIPLINES[d]])
+    n_subs = np.array([len(DISCIPLINES[d]) for d in disciplines])
+    sub_offset = np.cumsum(n_subs) - n_subs
+    subdiscipline = sub_offset[discipline] + (
+        rng.random_sample(n) * n_subs[discipline]).astype(int)
+
+    countries = list(COUNTRIES) + list(ADDED_COUNTRIES) + UNLISTED_COUNTRIES
+    n_authors = np.minimum(rng.geometric(0.18, size=n), 500)
+    gender_first = rng.choice(GENDERS, size=n, p=GENDER_P)
+    gender_last = np.where(n_authors == 1, gender_first,
+                           rng.choice(GENDERS, size=n, p=GENDER_P))
+    venue = zipf_choice(rng, len(venue_ifs), n)
+    year = rng.choice(PUB_YEARS, size=n)
+    impact = venue_ifs[venue] * rng.lognormal(0, 0.1, size=n)
+    female_frac = rng.beta(2, 3, size=n)
+    return pd.DataFrame({
+        'id_Art': pids,
+        'Year': year,
+        'Main_country': np.array(countries)[
+            zipf_choice(rng, len(countries), n, 0.8)],
+        'nb_AUTEUR': n_authors,
+        'NB_ADRESSE': np.minimum(n_authors, rng.geometric(0.4, size=n)),
+        'nb_REFERENCE': rng.poisson(35, size=n),
+        'rEVUE': np.char.add('JOURNAL ', venue.astype(str)),
+        'FI_2': np.where(rng.random_sample(n) < 0.05, np.nan,
+                         np.round(impact, 3)),
+        'CIT_ALL_IAC': rng.negative_binomial(1, 0.08, size=n),
+        'GENDER_TOPIC': rng.choice(GENDER_TOPICS, size=n, p=GENDER_TOPIC_P),
+        'gender_First': gender_first,
+        'gender_Last': gender_last,
+        'fractF': np.round(female_frac, 4),
+        'FractM': np.round(1 - female_frac, 4),
+        'Ediscipline': np.array(disciplines)[discipline],
+        'ESpecialite': subdisciplines[subdiscipline]})
+
+
+def mesh_trees(rng, n_terms=N_MESH_TERMS):
+    """ returns (terms, tree numbers, first years) of a random mesh
+    hierarchy. each new term is attached to a random existing node of its
+    branch (disease or not); some terms get a second tree number. """
+    branches = {True: ['C%02d' % i for i in range(1, 27)],
+                False: ['%s%02d' % (c, i) for c in 'ABDEFGHIJKLMNVZ'
+                        for i in range(1, 6)]}
+    terms = ['Term %d' % i for i in range(n_terms)]
+    trees = branches[True] + branches[False]
+    n_children = {}
+    for i in range(len(trees), n_terms):
+        disease = rng.random_sample() < DISEASE_FRAC
+        branch = branches[disease]
+        parent = branch[rng.randint(len(branch))]
+        n_children[parent] = n_children.get(parent, 0) + 1
+        trees.append('%s.%03d' % (parent, n_children[parent]))
+        branch.append(trees[-1])
+    years = [MESH_YEARS[0] if rng.random_sample() < 0.8
+             else MESH_YEARS[rng.randint(len(MESH_YEARS))] for _ in terms]
+
+    for i in rng.choice(len(terms), size=len(terms) // 10, replace=False):
+        branch = branches[trees[i].startswith('C')]
+        parent = branch[rng.randint(len(branch))]
+        n_children[parent] = n_children.get(parent, 0) + 1
+        terms.append(terms[i])
+        trees.append('%s.%03d' % (parent, n_children[parent]))
+        years.append(years[i])
+    return terms, trees, years
+
+
+def write_mesh_trees(terms, trees, years, mesh_dir):
+    """ write `mtrees{year}.bin` (term;tree number) for each year """
+    os.makedirs(mesh_dir, exist_ok=True)
+    for year in MESH_YEARS:
+        with open(os.path.join(mesh_dir, f'mtrees{year}.bin'), 'w') as fout:
+            for term, tree, first_year in zip(terms, trees, years):
+                if first_year <= year:
+                    fout.write(f'{term};{tree}\n')
+
+
+def main(out_dir, n_papers, seed=0):
+    """ write the synthetic corpus with `n_papers` papers to `out_dir` """
+    rng = np.random.RandomState(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    pd.DataFrame({'COUNTRY': list(COUNTRIES),
+                  'CONTINENT': list(COUNTRIES.values())}).to_csv(
+        os.path.join(out_dir, 'country_continent.csv'), index=False)
+    pd.DataFrame({'COUNTRY': list(ADDED_COUNTRIES),
+                  'CONTINENT': list(ADDED_COUNTRIES.values())}).to_csv(
+        os.path.join(out_dir, 'country_continent_added.csv'), index=False)
+
+    terms, trees, years = mesh_trees(rng)
+    write_mesh_trees(terms, trees, years, os.path.join(out_dir, 'mesh'))
+    logging.info('mesh trees written (%d terms).', len(set(terms)))
+
+    # the terms by popularity; diseases are common in medical papers
+    unique_terms = np.array(sorted(set(terms), key=lambda t: int(t[5:])))
+    popular_terms = unique_terms[rng.permutation(len(unique_terms))]
+    venue_ifs = rng.gamma(1.5, 2, size=N_VENUES)
+    all_pids = 10 ** 7 + rng.permutation(3 * n_papers)[:n_papers]
+
+    pub_f = os.path.join(out_dir, 'genderXgender.txt')
+    mesh_f = os.path.join(out_dir, 'MESH.txt')
+    with open(pub_f, 'w') as pub_out, open(mesh_f, 'w') as mesh_out:
+        mesh_out.write('id_Art\tMESH\n')
+        for start in range(0, n_papers, CHUNKSIZE):
+            pids = all_pids[start:start + CHUNKSIZE]
+            pub_chunk(rng, pids, venue_ifs).to_csv(
+                pub_out, sep='\t', index=False, header=start == 0)
+
+            n_mesh = rng.poisson(MESH_PER_PAPER, size=len(pids))
+            edges = pd.DataFrame({
+                'id_Art': np.repeat(pids, n_mesh),
+                'MESH': popular_terms[zipf_choice(rng, len(popular_terms),
+                                                  n_mesh.sum())]})
+            edges.drop_duplicates().to_csv(mesh_out, sep='\t', index=False,
+                                           header=False)
+            logging.info('%d papers written.', start + len(pids))
+
+
+if __name__ == "__main__":
+    OUT_DIR = sys.argv[1]
+    N_PAPERS = int(sys.argv[2])
+    SEED = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    main(OUT_DIR, N_PAPERS, SEED)
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" This script appends a delivery of new publications to the derived
+datasets, without rebuilding them.
+
+input: new publication data (the format of the raw publication dataset),
+(optional) new paper-mesh data (the format of the raw paper mesh data; '' if
+there is none), (optional) data directory (default: ../data)
+
+output: the single author, multi author, and multi author with covariates
+tables, the female fraction per mesh, and the paper mesh feature, updated in
+place (the file names of the Snakefile), and the ingestion state
+(ingest_state/ in the data directory).
+
+the female fractions are ratios of counts: per disease mesh (papers with
+gender information, female first and last authors; see paper_mesh.py) and
+per group of each female fraction covariate (e.g. MAIN_COUNTRY; see
+multi_author_data_with_cov.py). the state keeps these counts, the paper
+attributes, and the disease paper-mesh edges. a delivery is cleaned as
+main_data_cleaning.py cleans the whole file, and only its papers and edges
+are counted and added to the state. the mesh features are computed again only
+for the papers that share a mesh with the delivery, and the country (group)
+fractions of the rows are looked up from the counts. the results are the same
+as a rebuild from the raw files with the delivery appended.
+
+the state is built from the current datasets the first time (one pass over
+them). a delivery whose publication file was already ingested is skipped;
+papers that are already in the tables are refused.
+
+afterwards, the workflow (`snakemake`) rebuilds the regression table, and
+run_regression.py restores the results of the models whose rows did not change
+(e.g. the OLS models of the other years; the sex reporting models pool all the
+years and use the updated fractions, so they are fitted again).
+
+only the female fractions per mesh term (MESH_DEPTH = 0) are supported.
+
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from storage import load_table, save_table
+from stage_cache import file_digest
+from main_data_cleaning import (load_data, load_country_data, clean_pub_data,
+                                sanity_checks, single_author_pubs,
+                                multi_author_pubs)
+from cal_female_frac_per_mesh import load_disease_mesh
+from paper_attributes import (PaperAttributes, build_paper_attributes,
+                              paper_attributes_from_df, save_paper_attributes,
+                              load_saved_paper_attributes)
+from paper_mesh import (COUNT_COLUMNS, PaperMesh, read_paper_mesh,
+                        load_paper_mesh, save_paper_mesh,
+                        load_saved_paper_mesh, select_meshes,
+                        merge_paper_mesh, paper_edges, edge_codes,
+                        from_edge_codes, mesh_counts, mesh_fracs,
+                        mesh_female_frac_per_paper)
+from multi_author_data_with_cov import (F_COVARIATES, f_cov_counts,
+                                        add_f_cov_counts, save_f_cov_counts,
+                                        load_f_cov_counts,
+                                        add_covariates_from_counts)
+import telemetry
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+DATA_DIR = '../data'
+# the datasets (in the data directory), as in the Snakefile
+DATA_FILES = {'cont_data': 'country_continent.csv',
+              'cont_supp_data': 'country_continent_added.csv',
+              'raw_paper_mesh_data': 'MESH_v20180726.txt',
+              'disease_mesh': 'disease_mesh.txt',
+              'single_author': 'single_author.parquet',
+              'multi_author': 'multi_author.parquet',
+              'female_frac_per_mesh': 'female_frac_per_mesh.csv',
+              'paper_mesh_feature': 'paper_mesh_feature.csv',
+              'multi_author_final': 'multi_author_final.parquet',
+              'state': 'ingest_state'}
+STATE_VERSION = 1
+MANIFEST_FNAME = 'manifest.json'
+
+# papers: paper attributes of the multi-author data (see paper_attributes.py)
+# paper_mesh: disease paper-mesh edges (see paper_mesh.py)
+# mesh_counts: `mesh_counts` of the edges, aligned with paper_mesh.meshes
+# cov_counts: `f_cov_counts` of each covariate (tuple of its columns)
+# deltas: the ingested deliveries
+IngestState = namedtuple('IngestState', ['papers', 'paper_mesh',
+                                         'mesh_counts', 'cov_counts',
+                                         'deltas'])
+
+
+def build_state(paths, disease_terms):
+    """ the state of the current datasets """
+    papers = build_paper_attributes(paths['multi_author'])
+    paper_mesh = load_paper_mesh(paths['raw_paper_mesh_data'], disease_terms)
+    multi_df = load_table(paths['multi_author'], columns=sorted(
+        {col for cov_cols in F_COVARIATES for col in cov_cols} |
+        {'GENDER_FIRST', 'GENDER_LAST'}))
+    return IngestState(
+        papers=papers, paper_mesh=paper_mesh,
+        mesh_counts=mesh_counts(paper_mesh, papers),
+        cov_counts={tuple(cov_cols): f_cov_counts(multi_df, cov_cols)
+                    for cov_cols in F_COVARIATES},
+        deltas=[])
+
+
+def save_state(state, state_dir, multi_author_f):
+    """ save the state of the multi-author data `multi_author_f` to a new
+    directory, which then replaces `state_dir` (the manifest is written
+    last; it marks the state as complete) """
+    tmp_dir = f'{state_dir}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    save_paper_attributes(state.papers, os.path.join(tmp_dir, 'papers'))
+    save_paper_mesh(state.paper_mesh, os.path.join(tmp_dir, 'paper_mesh'))
+    np.save(os.path.join(tmp_dir, 'mesh_counts.npy'), state.mesh_counts)
+    save_f_cov_counts(state.cov_counts, tmp_dir)
+    with open(os.path.join(tmp_dir, MANIFEST_FNAME), 'w') as fout:
+        json.dump({'version': STATE_VERSION,
+                   'multi_author': file_digest(multi_author_f),
+                   'covariates': [list(cov_cols)
+                                  for cov_cols in state.cov_counts],
+                   'deltas': state.deltas}, fout, indent=2)
+    if os.path.exists(state_dir):
+        os.rename(state_dir, f'{state_dir}.old')
+    os.rename(tmp_dir, state_dir)
+    shutil.rmtree(f'{state_dir}.old', ignore_errors=True)
+
+
+def load_state(state_dir, multi_author_f):
+    """ the saved state, or None if there is none or it is not the state of
+    the multi-author data `multi_author_f` (e.g. the datasets were rebuilt)
+    """
+    manifest_f = os.path.join(state_dir, MANIFEST_FNAME)
+    if not os.path.exists(manifest_f):
+        return None
+    with open(manifest_f) as fin:
+        manifest = json.load(fin)
+    if manifest['version'] != STATE_VERSION or \
+            manifest['covariates'] != [list(cov_cols)
+                                       for cov_cols in F_COVARIATES] or \
+            manifest['multi_author'] != file_digest(multi_author_f):
+        return None
+    return IngestState(
+        papers=load_saved_paper_attributes(
+            os.path.join(state_dir, 'papers')),
+        paper_mesh=load_saved_paper_mesh(
+            os.path.join(state_dir, 'paper_mesh')),
+        mesh_counts=np.load(os.path.join(state_dir, 'mesh_counts.npy')),
+        cov_counts=load_f_cov_counts(state_dir),
+        deltas=manifest['deltas'])
+
+
+def append_rows(df, delta_df):
+    """ the rows of `delta_df` appended to `df`; the categorical columns
+    keep the (sorted) union of their levels """
+    df, delta_df = df.copy(), delta_df.copy()
+    for col in df.columns:
+        if df[col].dtype.name == 'category' and \
+                delta_df[col].dtype.name == 'category':
+            levels = sorted(set(df[col].cat.categories) |
+                            set(delta_df[col].cat.categories))
+            df[col] = df[col].cat.set_categories(levels)
+            delta_df[col] = delta_df[col].cat.set_categories(levels)
+    return pd.concat([df, delta_df[df.columns]], ignore_index=True)
+
+
+def merge_papers(papers, other):
+    """ the attribute table of the papers of both tables (which have no
+    paper in common) """
+    pids = np.concatenate([papers.pids, other.pids])
+    order = np.argsort(pids, kind='mergesort')
+    return PaperAttributes(**{
+        name: np.concatenate([getattr(papers, name),
+                              getattr(other, name)])[order]
+        for name in PaperAttributes._fields})
+
+
+def update_mesh_state(state, delta_papers, delta_paper_mesh):
+    """ add the papers and the disease edges of a delivery. returns the
+    papers, the edges, the mesh counts, and the papers whose mesh features
+    change. only the edges of the new papers and the new edges of the other
+    papers are counted. """
+    papers = merge_papers(state.papers, delta_papers)
+    paper_mesh = merge_paper_mesh(state.paper_mesh, delta_paper_mesh)
+    pids, meshes = paper_mesh.pids, paper_mesh.meshes
+
+    # the edges of the delivery that are not in the state
+    delta_codes = np.setdiff1d(
+        edge_codes(delta_paper_mesh, pids, meshes),
+        edge_codes(paper_edges(state.paper_mesh, delta_paper_mesh.pids),
+                   pids, meshes))
+    new_edges = from_edge_codes(
+        np.union1d(delta_codes, edge_codes(
+            paper_edges(paper_mesh, delta_papers.pids), pids, meshes)),
+        pids, meshes)
+    delta_counts = mesh_counts(new_edges, papers)
+
+    counts = np.zeros((len(meshes), len(COUNT_COLUMNS)))
+    counts[np.searchsorted(meshes, state.paper_mesh.meshes)] = \
+        state.mesh_counts
+    counts += delta_counts
+
+    # the papers of the meshes whose fractions change, and the papers with
+    # new edges (even if they are not in the multi-author data)
+    changed = delta_counts.any(axis=1)
+    affected = np.union1d(
+        pids[np.unique(paper_mesh.pid_idx[changed[paper_mesh.mesh_idx]])],
+        pids[new_edges.pid_idx])
+    return papers, paper_mesh, counts, affected
+
+
+def update_paper_features(feature_df, paper_mesh, mesh_frac_df, pids):
+    """ the paper mesh features with those of the papers `pids` computed
+    again """
+    updated = mesh_female_frac_per_paper(paper_edges(paper_mesh, pids),
+                                         mesh_frac_df)
+    return pd.concat([feature_df[~feature_df.PID.isin(pids)], updated],
+                     ignore_index=True) \
+        .sort_values('PID', kind='mergesort').reset_index(drop=True)
+
+
+def _read_tsv(path, exact=False):
+    # the unchanged rows are parsed exactly to be written back as they were;
+    # otherwise the file is read as the next script of the workflow reads it
+    return pd.read_csv(path, sep='\t',
+                       float_precision='round_trip' if exact else None)
+
+
+def main(pub_delta_f, paper_mesh_delta_f=None, data_dir=DATA_DIR,
+         files=None):
+    """ append a delivery to the datasets; `files` overrides the paths of
+    `DATA_FILES` """
+    paths = {name: os.path.join(data_dir, fname)
+             for name, fname in DATA_FILES.items()}
+    paths.update(files or {})
+    frac_df = pd.read_csv(paths['female_frac_per_mesh'], sep='\t', nrows=0)
+    if 'MESH' not in frac_df.columns:
+        raise ValueError('only the fractions per mesh term (MESH_DEPTH = 0) '
+                         'can be updated')
+
+    delivery = {'publications': file_digest(pub_delta_f)}
+    if paper_mesh_delta_f:
+        delivery['paper_mesh'] = file_digest(paper_mesh_delta_f)
+    disease_terms = load_disease_mesh(paths['disease_mesh'])
+    state = load_state(paths['state'], paths['multi_author'])
+    if state is None:
+        state = build_state(paths, disease_terms)
+        telemetry.checkpoint('ingestion state built.',
+                             rows=len(state.papers.pids))
+    elif any(delta['publications'] == delivery['publications']
+             for delta in state.deltas):
+        logging.info(f'{pub_delta_f} is already ingested.')
+        return
+
+    delta_df = clean_pub_data(load_data(pub_delta_f), load_country_data(
+        paths['cont_data'], paths['cont_supp_data']))
+    sanity_checks(delta_df, expected_n_rows=None)
+    telemetry.checkpoint('delivery cleaned.', rows=len(delta_df))
+
+    single_df = load_table(paths['single_author'])
+    multi_df = load_table(paths['multi_author'])
+    known = np.isin(delta_df.PID.values,
+                    np.concatenate([single_df.PID.values,
+                                    multi_df.PID.values]))
+    if known.any():
+        raise ValueError(f'{known.sum()} papers of the delivery are already '
+                         'in the tables')
+    single_df = append_rows(single_df, single_author_pubs(delta_df))
+    delta_multi_df = multi_author_pubs(delta_df)
+    multi_df = append_rows(multi_df, delta_multi_df)
+    telemetry.checkpoint('publications appended.', rows=len(multi_df))
+
+    if paper_mesh_delta_f:
+        delta_paper_mesh = select_meshes(read_paper_mesh(paper_mesh_delta_f),
+                                         disease_terms)
+    else:
+        delta_paper_mesh = PaperMesh(pids=np.array([], dtype=np.int64),
+                                     meshes=np.array([], dtype=str),
+                                     pid_idx=np.array([], dtype=np.int32),
+                                     mesh_idx=np.array([], dtype=np.int32))
+    papers, paper_mesh, counts, affected = update_mesh_state(
+        state, paper_attributes_from_df(delta_multi_df), delta_paper_mesh)
+    telemetry.checkpoint('mesh counts updated.', rows=len(affected))
+
+    # the datasets are written in the order of the workflow, so that
+    # Snakemake sees each one newer than its inputs and only rebuilds the
+    # regression table
+    save_table(single_df, paths['single_author'])
+    save_table(multi_df, paths['multi_author'])
+    mesh_fracs(paper_mesh.meshes, counts).to_csv(
+        paths['female_frac_per_mesh'], sep='\t', index=False)
+    update_paper_features(
+        _read_tsv(paths['paper_mesh_feature'], exact=True), paper_mesh,
+        _read_tsv(paths['female_frac_per_mesh']), affected).to_csv(
+            paths['paper_mesh_feature'], sep='\t', index=False)
+    telemetry.checkpoint('paper mesh features updated.', rows=len(affected))
+
+    cov_counts = {cov_cols: add_f_cov_counts(
+        counts_df, f_cov_counts(delta_multi_df, list(cov_cols)),
+        list(cov_cols)) for cov_cols, counts_df in state.cov_counts.items()}
+    final_df = add_covariates_from_counts(
+        multi_df, _read_tsv(paths['paper_mesh_feature']), cov_counts)
+    save_table(final_df, paths['multi_author_final'])
+    save_state(IngestState(papers=papers, paper_mesh=paper_mesh,
+                           mesh_counts=counts, cov_counts=cov_counts,
+                           deltas=state.deltas + [dict(
+                               delivery, rows=len(delta_df),
+                               years=sorted(int(year) for year in
+                                            delta_df.YEAR.unique()))]),
+               paths['state'], paths['multi_author'])
+    telemetry.checkpoint('datasets and state saved.', rows=len(final_df))
+
+
+if __name__ == "__main__":
+    PUB_DELTA = sys.argv[1]
+    PAPER_MESH_DELTA = sys.argv[2] if len(sys.argv) > 2 else None
+    DATA = sys.argv[3] if len(sys.argv) > 3 else DATA_DIR
+    telemetry.start('ingest_delta', os.path.join(
+        DATA, DATA_FILES['multi_author_final']))
+    main(PUB_DELTA, PAPER_MESH_DELTA, DATA)
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+""" display labels of the dependent variables and the model terms, shared by
+the result cleaning scripts and the result store (see result_store.py). """
+
+DV_LABELS = {'SRA': 'SR',
+             'SRF': 'SR_F',
+             'SRM': 'SR_M',
+             'SRB': 'SR_B',
+             'IF': 'Impact Factor'}
+
+VARIABLE_LABELS = {'GENDER_FL[T.AF]': 'Male-Female',
+                   'GENDER_FL[T.FA]': 'Female-Male',
+                   'GENDER_FL[T.FF]': 'Female-Female',
+                   'GENDER_TOPIC[T.B]': 'Sex reported (M & F)',
+                   'GENDER_TOPIC[T.F]': 'Sex reported (F)',
+                   'GENDER_TOPIC[T.M]': 'Sex reported (M)',
+                   'GENDER_FIRST[T.F]': 'Female first author',
+                   'GENDER_LAST[T.F]': 'Female last author'}
+
+
+def dv_label(dv):
+    """ display label of a dependent variable """
+    return DV_LABELS.get(dv, dv)
+
+
+def variable_label(variable):
+    """ display label of a model term (e.g. 'GENDER_FL[T.FF]') """
+    return VARIABLE_LABELS.get(variable, variable)
+
+
+def relabel(text, labels):
+    """ replace the names in `text` by their labels """
+    for name, label in labels.items():
+        text = text.replace(name, label)
+    return text
@@ -7,20 +7,40 @@ input:
     - the continent dataset (by Vincent Larivière).
 
 output:
-    - a csv file with country and continent columns.
+    - single author and multi author tables (csv/parquet/feather, by the
+    extension of the output path).
+
+optional arguments:
+    - chunk size (rows). if given (> 0), the publication dataset is streamed
+    and cleaned chunk by chunk so that the memory use is bounded; the outputs
+    are written incrementally (csv or parquet) and the sanity checks run on
+    aggregates collected over the chunks.
+    - expected number of cleaned rows (default: `EXPECTED_N_ROWS`; 0: not
+    checked, e.g. for a shard of the dataset, see shards.py).
 
 """
 import sys
 import logging
+from functools import partial
 
 import numpy as np
 import pandas as pd
 
+from storage import save_table, open_table_writer
+import telemetry
+from stage_cache import run_stage
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
 
+# number of cleaned rows in the 2018 snapshot (genderXgender_v20180710.txt)
+EXPECTED_N_ROWS = 2106521
+NOT_NULL_COLS = ['DISCIPLINE', 'SUBDISCIPLINE', 'N_CITATIONS', 'N_AUTHORS',
+                 'N_ADDRESSES', 'N_REFS']
+
 
-def load_data(in_file):
-    """ returns a pandas dataframe of the raw dataset. """
+def load_data(in_file, chunksize=None):
+    """ returns a pandas dataframe of the raw dataset (or an iterator of
+    dataframes with `chunksize` rows if it is given). """
     dtypes = {'id_Art': 'int',
               'Year': 'int',
               'Main_country': 'category',
@@ -36,7 +56,7 @@ def load_data(in_file):
               'FractM': 'float',
               'Ediscipline': 'category',
               'ESpecialite': 'category'}
-    return pd.read_csv(in_file, sep='\t', dtype=dtypes)
+    return pd.read_csv(in_file, sep='\t', dtype=dtypes, chunksize=chunksize)
 
 
 def load_country_data(main_country_data_file, added_country_data_file):
@@ -85,27 +105,107 @@ def drop_unk_gender(pub_df):
     return pub_df.dropna(subset=['GENDER_FIRST', 'GENDER_LAST', 'GENDER_TOPIC'])
 
 
-def sanity_checks(cleaned_df):
+def clean_pub_data(raw_pub_df, cntry_df):
+    """ rename, merge with the country data, and drop unknown genders """
+    merged_df = merge_pubdata_with_country_data(rename_df(raw_pub_df),
+                                                cntry_df)
+    return drop_unk_gender(clean_gender_var(merged_df))
+
+
+def init_sanity_stats():
+    """ running aggregates for the sanity checks """
+    return {'n_rows': 0,
+            'n_single_author_gender_mismatch': 0,
+            'n_nulls': {col: 0 for col in NOT_NULL_COLS}}
+
+
+def update_sanity_stats(stats, cleaned_df):
+    """ add a chunk of the cleaned data to the aggregates """
+    single_df = cleaned_df[cleaned_df.N_AUTHORS == 1]
+    stats['n_rows'] += len(cleaned_df)
+    stats['n_single_author_gender_mismatch'] += int(
+        (single_df.GENDER_FIRST.astype(object) !=
+         single_df.GENDER_LAST.astype(object)).sum())
+    for col in NOT_NULL_COLS:
+        stats['n_nulls'][col] += int(cleaned_df[col].isnull().sum())
+    return stats
+
+
+def check_sanity_stats(stats, expected_n_rows=EXPECTED_N_ROWS):
+    """ impact factor may still contain NaN. the number of rows is not
+    checked if `expected_n_rows` is None. """
+    if expected_n_rows is not None:
+        assert stats['n_rows'] == expected_n_rows
+    assert stats['n_single_author_gender_mismatch'] == 0
+    for col in NOT_NULL_COLS:
+        assert stats['n_nulls'][col] == 0, col
+
+
+def sanity_checks(cleaned_df, expected_n_rows=EXPECTED_N_ROWS):
     """ impact factor may still contain NaN """
-    assert len(cleaned_df) == 2106521
-    assert all(cleaned_df[cleaned_df.N_AUTHORS == 1].GENDER_FIRST ==
-               cleaned_df[cleaned_df.N_AUTHORS == 1].GENDER_LAST)
-    assert cleaned_df.DISCIPLINE.isnull().sum() == 0
-    assert cleaned_df.SUBDISCIPLINE.isnull().sum() == 0
-    assert cleaned_df.N_CITATIONS.isnull().sum() == 0
-    assert cleaned_df.N_AUTHORS.isnull().sum() == 0
-    assert cleaned_df.N_ADDRESSES.isnull().sum() == 0
-    assert cleaned_df.N_REFS.isnull().sum() == 0
+    check_sanity_stats(update_sanity_stats(init_sanity_stats(), cleaned_df),
+                       expected_n_rows)
+
+
+def single_author_pubs(cleaned_df):
+    """ single author papers """
+    return cleaned_df[cleaned_df.N_AUTHORS == 1]
+
+
+def multi_author_pubs(cleaned_df):
+    """ multi-author papers """
+    return cleaned_df[cleaned_df.N_AUTHORS > 1]
 
 
 def save_single_author_pubs(cleaned_df, out_file):
     """ single author table """
-    cleaned_df[cleaned_df.N_AUTHORS == 1].to_csv(out_file, index=False)
+    save_table(single_author_pubs(cleaned_df), out_file)
 
 
 def save_multi_author_pubs(cleaned_df, out_file):
     """ multi-author paper table """
-    cleaned_df[cleaned_df.N_AUTHORS > 1].to_csv(out_file, index=False)
+    save_table(multi_author_pubs(cleaned_df), out_file)
+
+
+def stream_clean_pubs(pub_data_file, cntry_df, single_out_file,
+                      multi_out_file, chunksize,
+                      expected_n_rows=EXPECTED_N_ROWS):
+    """ clean the publication data chunk by chunk and append the single and
+    multi author papers to the outputs """
+    stats = init_sanity_stats()
+    with open_table_writer(single_out_file) as single_writer, \
+            open_table_writer(multi_out_file) as multi_writer:
+        for raw_chunk in load_data(pub_data_file, chunksize=chunksize):
+            chunk = clean_pub_data(raw_chunk, cntry_df)
+            update_sanity_stats(stats, chunk)
+            single_writer.write(chunk[chunk.N_AUTHORS == 1])
+            multi_writer.write(chunk[chunk.N_AUTHORS > 1])
+            telemetry.checkpoint('cleaned chunk written.', rows=len(chunk))
+    check_sanity_stats(stats, expected_n_rows)
+
+
+def main(pub_data_file, cntry_data_file, cntry_added_data_file,
+         single_out_file, multi_out_file, chunksize=0,
+         expected_n_rows=EXPECTED_N_ROWS):
+    """ clean the publication data (in chunks if `chunksize` > 0) and save
+    the single and multi author tables """
+    cntry_df = load_country_data(cntry_data_file, cntry_added_data_file)
+    telemetry.checkpoint('country data loaded.', rows=len(cntry_df))
+    if chunksize > 0:
+        stream_clean_pubs(pub_data_file, cntry_df, single_out_file,
+                          multi_out_file, chunksize, expected_n_rows)
+    else:
+        raw_df = load_data(pub_data_file)
+        telemetry.checkpoint('publication data loaded.', rows=len(raw_df))
+        df = clean_pub_data(raw_df, cntry_df)
+        del raw_df
+        telemetry.checkpoint('publication data cleaned.', rows=len(df))
+        sanity_checks(df, expected_n_rows)
+
+        save_single_author_pubs(df, single_out_file)
+        save_multi_author_pubs(df, multi_out_file)
+        telemetry.checkpoint('single and multi author data saved.',
+                             rows=len(df))
 
 
 if __name__ == "__main__":
@@ -114,13 +214,14 @@ if __name__ == "__main__":
     COUNTRY_ADDED_DATA_FILE = sys.argv[3]
     SINGLE_AUTHOR_OUT_FILE = sys.argv[4]
     MULTI_AUTHOR_OUT_FILE = sys.argv[5]
-
-    COUNTRY_DF = load_country_data(COUNTRY_DATA_FILE, COUNTRY_ADDED_DATA_FILE)
-    RAW_PUB_DF = load_data(PUB_DATA_FILE)
-    RENAMED_PUB_DF = rename_df(RAW_PUB_DF)
-    MERGED_DF = merge_pubdata_with_country_data(RENAMED_PUB_DF, COUNTRY_DF)
-    DF = drop_unk_gender(clean_gender_var(MERGED_DF))
-    sanity_checks(DF)
-
-    save_single_author_pubs(DF, SINGLE_AUTHOR_OUT_FILE)
-    save_multi_author_pubs(DF, MULTI_AUTHOR_OUT_FILE)
+    CHUNKSIZE = int(sys.argv[6]) if len(sys.argv) > 6 else 0
+    N_ROWS = int(sys.argv[7]) if len(sys.argv) > 7 else EXPECTED_N_ROWS
+
+    telemetry.start('main_data_cleaning', MULTI_AUTHOR_OUT_FILE)
+    # the chunk size does not change the content of the outputs
+    run_stage(partial(main, PUB_DATA_FILE, COUNTRY_DATA_FILE,
+                      COUNTRY_ADDED_DATA_FILE, SINGLE_AUTHOR_OUT_FILE,
+                      MULTI_AUTHOR_OUT_FILE, CHUNKSIZE, N_ROWS or None),
+              inputs=[PUB_DATA_FILE, COUNTRY_DATA_FILE,
+                      COUNTRY_ADDED_DATA_FILE],
+              outputs=[SINGLE_AUTHOR_OUT_FILE, MULTI_AUTHOR_OUT_FILE])
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+""" compiled index of the MeSH trees of all years.
+
+the `mtrees{year}.bin` files (one `term;tree number` line per node) are parsed
+once into integer-coded arrays, which are saved as .npy files and memory-mapped
+when loaded:
+
+    - terms: sorted unique term names; a term id is a position in it.
+    - trees: sorted unique tree numbers (e.g. 'C04.557'); a tree id is a
+    position in it. the subtree of a tree number is a contiguous range,
+    because the descendants of 'C04' are exactly the numbers 'C04.*'.
+    - tree_parent: tree id of the parent tree number (-1 for the top level).
+    - child_ptr, child_idx: children of each tree id (csr layout).
+    - node_tree, node_term, node_years: the (tree number, term) pairs sorted
+    by tree id, with a bitset of the years in which the pair appears (bit i
+    is `years[i]`).
+    - term_years: bitset of the years in which each term appears.
+
+"""
+import os
+import re
+import json
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+DISEASE_CATEGORY = 'C'
+INDEX_ARRAYS = ['terms', 'trees', 'tree_parent', 'child_ptr', 'child_idx',
+                'node_tree', 'node_term', 'node_years', 'term_years']
+INDEX_FILES = [f'{name}.npy' for name in INDEX_ARRAYS] + ['years.json']
+MTREES_PATTERN = re.compile(r'mtrees(\d{4})\.bin$')
+
+MeshIndex = namedtuple('MeshIndex', INDEX_ARRAYS + ['years'])
+
+
+def year_of_mtrees_file(path):
+    """ the year of a `mtrees{year}.bin` file """
+    match = MTREES_PATTERN.search(os.path.basename(path))
+    if match is None:
+        raise ValueError(f'not a mesh tree file: {path}')
+    return int(match.group(1))
+
+
+def read_mtrees(path):
+    """ (terms, tree numbers) of a mesh tree file. malformed lines (not
+    exactly one ';') are skipped. """
+    with open(path) as fin:
+        pairs = [line.split(';') for line in fin.read().splitlines()]
+    pairs = [pair for pair in pairs if len(pair) == 2]
+    return [term for term, _ in pairs], [tree for _, tree in pairs]
+
+
+def parent_tree(tree):
+    """ parent tree number ('C04.557.337' -> 'C04.557'; 'C04' -> '') """
+    return tree.rpartition('.')[0]
+
+
+def build_mesh_index(mesh_files):
+    """ build the index from the mesh tree files of all years """
+    years = sorted(year_of_mtrees_file(path) for path in mesh_files)
+    if len(years) > 64:
+        raise ValueError('the year bitsets hold at most 64 years')
+    year_bit = {year: np.uint64(1) << np.uint64(i)
+                for i, year in enumerate(years)}
+
+    frames = []
+    for path in mesh_files:
+        terms, trees = read_mtrees(path)
+        frames.append(pd.DataFrame({'TERM': terms, 'TREE': trees,
+                                    'YEAR_BIT': year_bit[
+                                        year_of_mtrees_file(path)]}))
+    nodes = pd.concat(frames, ignore_index=True)
+    nodes['TERM'] = nodes.TERM.str.strip()
+    nodes['TREE'] = nodes.TREE.str.strip()
+
+    terms = np.unique(nodes.TERM.values).astype(str)
+    trees = np.unique(nodes.TREE.values).astype(str)
+    # one node per (tree, term) with the years or-ed together
+    keys, key_idx = np.unique(
+        np.searchsorted(trees, nodes.TREE.values).astype(np.int64) *
+        len(terms) + np.searchsorted(terms, nodes.TERM.values),
+        return_inverse=True)
+    node_tree = (keys // len(terms)).astype(np.int32)
+    node_term = (keys % len(terms)).astype(np.int32)
+    node_years = np.zeros(len(keys), dtype=np.uint64)
+    np.bitwise_or.at(node_years, key_idx, nodes.YEAR_BIT.values)
+
+    term_years = np.zeros(len(terms), dtype=np.uint64)
+    np.bitwise_or.at(term_years, node_term, node_years)
+
+    parents = np.array([parent_tree(tree) for tree in trees], dtype=str)
+    tree_parent = np.searchsorted(trees, parents).astype(np.int32)
+    found = (parents != '') & (tree_parent < len(trees))
+    found[found] = trees[tree_parent[found]] == parents[found]
+    tree_parent[~found] = -1
+
+    has_parent = np.flatnonzero(tree_parent >= 0)
+    order = has_parent[np.argsort(tree_parent[has_parent], kind='mergesort')]
+    child_ptr = np.zeros(len(trees) + 1, dtype=np.int32)
+    child_ptr[1:] = np.cumsum(np.bincount(tree_parent[has_parent],
+                                          minlength=len(trees)))
+    return MeshIndex(terms=terms, trees=trees, tree_parent=tree_parent,
+                     child_ptr=child_ptr, child_idx=order.astype(np.int32),
+                     node_tree=node_tree, node_term=node_term,
+                     node_years=node_years, term_years=term_years,
+                     years=years)
+
+
+def save_mesh_index(index, index_dir):
+    """ save the arrays as `{name}.npy` (and the years as json) """
+    os.makedirs(index_dir, exist_ok=True)
+    for name in INDEX_ARRAYS:
+        np.save(os.path.join(index_dir, f'{name}.npy'), getattr(index, name))
+    with open(os.path.join(index_dir, 'years.json'), 'w') as fout:
+        json.dump(index.years, fout)
+
+
+def load_mesh_index(index_dir, mmap_mode='r'):
+    """ load a saved index; the arrays are memory-mapped """
+    with open(os.path.join(index_dir, 'years.json')) as fin:
+        years = json.load(fin)
+    arrays = {name: np.load(os.path.join(index_dir, f'{name}.npy'),
+                            mmap_mode=mmap_mode)
+              for name in INDEX_ARRAYS}
+    return MeshIndex(years=years, **arrays)
+
+
+def year_mask(index, year=None):
+    """ bitset of `year` (all years if None) """
+    if year is None:
+        return ~np.uint64(0)
+    return np.uint64(1) << np.uint64(index.years.index(year))
+
+
+def term_ids(index, names):
+    """ term ids of the names (-1 for unknown names) """
+    names = np.asarray(names, dtype=str)
+    ids = np.searchsorted(index.terms, names)
+    ids[ids == len(index.terms)] = 0
+    return np.where(index.terms[ids] == names, ids, -1)
+
+
+def tree_id(index, tree):
+    """ tree id of a tree number (-1 if unknown) """
+    pos = int(np.searchsorted(index.trees, tree))
+    if pos < len(index.trees) and index.trees[pos] == tree:
+        return pos
+    return -1
+
+
+def prefix_range(index, prefix):
+    """ range of the tree ids of the tree numbers starting with `prefix` """
+    # the smallest string after all strings with the prefix
+    end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return (int(np.searchsorted(index.trees, prefix)),
+            int(np.searchsorted(index.trees, end)))
+
+
+def subtree_range(index, tree):
+    """ range of the tree ids of `tree` and its descendants """
+    return (int(np.searchsorted(index.trees, tree)),
+            prefix_range(index, tree + '.')[1])
+
+
+def _range_nodes(index, start, stop, year=None):
+    lo, hi = np.searchsorted(index.node_tree, [start, stop])
+    in_year = (index.node_years[lo:hi] & year_mask(index, year)) != 0
+    return index.node_term[lo:hi][in_year], index.node_tree[lo:hi][in_year]
+
+
+def _range_terms(index, start, stop, year=None):
+    return np.unique(_range_nodes(index, start, stop, year)[0])
+
+
+def children(index, tree):
+    """ tree numbers of the children of `tree` """
+    pos = tree_id(index, tree)
+    if pos < 0:
+        return index.trees[:0]
+    return index.trees[index.child_idx[index.child_ptr[pos]:
+                                       index.child_ptr[pos + 1]]]
+
+
+def descendant_terms(index, tree, year=None, include_self=True):
+    """ sorted ids of the terms at `tree` or below it (in `year`) """
+    start, stop = subtree_range(index, tree)
+    if not include_self and tree_id(index, tree) >= 0:
+        start += 1
+    return _range_terms(index, start, stop, year)
+
+
+def category_terms(index, category, year=None):
+    """ sorted ids of the terms with a tree number in `category` (e.g. 'C',
+    the diseases) in `year` (any year if None) """
+    return _range_terms(index, *prefix_range(index, category), year=year)
+
+
+def category_nodes(index, category, year=None):
+    """ (term ids, tree ids) of the (tree number, term) pairs in `category`
+    in `year` (any year if None) """
+    return _range_nodes(index, *prefix_range(index, category), year=year)
+
+
+def tree_depths(index):
+    """ depth of each tree number ('C04' is 1, 'C04.557' is 2, ...) """
+    return np.char.count(index.trees, '.') + 1
+
+
+def ancestor_pairs(index, tree_ids):
+    """ (positions, ancestors): each of the `tree_ids` (by its position)
+    paired with itself and with each of its ancestors """
+    positions = [np.arange(len(tree_ids))]
+    ancestors = [np.asarray(tree_ids, dtype=np.int32)]
+    while len(ancestors[-1]):
+        parents = index.tree_parent[ancestors[-1]]
+        up = parents >= 0
+        positions.append(positions[-1][up])
+        ancestors.append(parents[up])
+    return np.concatenate(positions), np.concatenate(ancestors)
+
+
+def ancestors_at_depth(index, tree_ids, depth):
+    """ the ancestor at `depth` of each tree id (the tree id itself if it is
+    not deeper) """
+    ancestors = np.array(tree_ids, dtype=np.int32)
+    depths = tree_depths(index)
+    while True:
+        deeper = np.flatnonzero(depths[ancestors] > depth)
+        deeper = deeper[index.tree_parent[ancestors[deeper]] >= 0]
+        if len(deeper) == 0:
+            return ancestors
+        ancestors[deeper] = index.tree_parent[ancestors[deeper]]
+
+
+def is_disease(index, term_id, year=None):
+    """ whether the terms (ids) are disease terms in `year` (any year if
+    None) """
+    return np.isin(term_id, category_terms(index, DISEASE_CATEGORY, year))
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+""" model specification files (see workflow/models.yaml).
+
+a specification file lists the models of run_regression.py. each entry is
+expanded into model dicts ({'name', 'family', 'dv', 'ivs', 'sample',
+'year'}, and 'output' and 'absorb' if given), one per combination of the
+values of its `grid` blocks; the name and the output are templates filled
+with the fields and the grid values. 'absorb' is a column (or a list of
+columns) whose fixed effects are absorbed (see fixed_effects.py).
+
+"""
+import os
+import re
+from itertools import product
+
+import yaml
+
+# workflow/models.yaml
+MODEL_SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          os.pardir, 'models.yaml')
+MODEL_FIELDS = ['name', 'family', 'dv', 'ivs', 'sample', 'year', 'output',
+                'absorb']
+MODEL_DEFAULTS = {'sample': 'all', 'year': None}
+TEMPLATE_FIELDS = ['name', 'output']
+REQUIRED_FIELDS = ['name', 'family', 'dv', 'ivs']
+RESULT_PATH = '../results/{name}.csv'
+IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+
+def expand_grid(grid):
+    """ the combinations (dicts) of the values of the grid blocks """
+    if not grid:
+        return [{}]
+    combinations = []
+    for block in grid:
+        keys = list(block)
+        values = [v if isinstance(v, list) else [v] for v in block.values()]
+        combinations += [dict(zip(keys, combination))
+                         for combination in product(*values)]
+    return combinations
+
+
+def expand_entry(entry):
+    """ the models of a specification file entry """
+    entry = dict(entry)
+    grid = entry.pop('grid', None)
+    models = []
+    for combination in expand_grid(grid):
+        fields = dict(MODEL_DEFAULTS, **entry)
+        fields.update(combination)
+        for key in TEMPLATE_FIELDS:
+            if key in fields:
+                fields[key] = fields[key].format(**fields)
+        model = {key: fields[key] for key in MODEL_FIELDS if key in fields}
+        missing = [key for key in REQUIRED_FIELDS if key not in model]
+        if missing:
+            raise ValueError(f'model {model.get("name")}: missing {missing}')
+        models.append(model)
+    return models
+
+
+def load_model_specs(path=MODEL_SPEC):
+    """ the models of a specification file, in order """
+    with open(path) as fin:
+        spec = yaml.safe_load(fin)
+    models = [model for entry in spec['models']
+              for model in expand_entry(entry)]
+    names = [model['name'] for model in models]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise ValueError(f'duplicated model names: {duplicated}')
+    return models
+
+
+def result_path(model):
+    """ result file of a model """
+    return model.get('output', RESULT_PATH.format(name=model['name']))
+
+
+def absorbed_columns(model):
+    """ the columns whose fixed effects a model absorbs """
+    absorb = model.get('absorb') or []
+    return [absorb] if isinstance(absorb, str) else list(absorb)
+
+
+def spec_columns(models, columns):
+    """ the `columns` (of the table) that the models refer to """
+    names = set()
+    for model in models:
+        for term in [model['dv']] + list(model['ivs']):
+            names.update(IDENTIFIER.findall(term))
+        names.update(absorbed_columns(model))
+    return [col for col in columns if col in names]
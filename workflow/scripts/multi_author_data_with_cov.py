@@ -5,51 +5,174 @@
 input:
     - multi-author data
     - paper mesh feature data
+    - (optional) directory of the female fraction counts
 
 output:
     multi author data with mesh, country, and subdiscipline covariates
 
+the female fraction covariates are ratios of counts per group; the counts
+(`f_cov_counts`) can be kept and updated with new rows only (see
+ingest_delta.py), or counted per shard of the data and summed (see
+shards.py), and the fractions looked up from them (`attach_f_cov_counts`).
+if the counts are given, the fractions of the rows are looked up from them
+instead of computed from the multi-author data (e.g. a shard).
+
 """
+import os
 import sys
 import logging
+from functools import partial
 
+import numpy as np
 import pandas as pd
 
+from storage import load_table, save_table
+from target_encoding import target_means
+import telemetry
+from stage_cache import run_stage
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
 
+# grouping columns of the female fraction covariates; e.g. ['DISCIPLINE',
+# 'YEAR'] adds F_FIRST_DISCIPLINE_YEAR and F_LAST_DISCIPLINE_YEAR
+F_COVARIATES = [['MAIN_COUNTRY']]
+# the columns of `f_cov_counts` (after the grouping columns)
+COUNT_COLUMNS = ['N_FIRST', 'SUM_FIRST', 'N_LAST', 'SUM_LAST']
+COUNT_DTYPES = {'N_FIRST': np.int64, 'SUM_FIRST': float, 'N_LAST': np.int64,
+                'SUM_LAST': float}
+
+
+def female_indicators(df):
+    """ 1/0 female first and last author indicators (NaN if unknown) """
+    return {pos: np.where(df[f'GENDER_{pos}'].isnull(), np.nan,
+                          (df[f'GENDER_{pos}'] == 'F').values)
+            for pos in ['FIRST', 'LAST']}
+
+
+def cal_f_cov(df, cov_cols, leave_one_out=False, smoothing=0):
+    """ attach F_FIRST_{cov_cols} and F_LAST_{cov_cols}, the female first
+    and last author fractions of the papers with the same values of the
+    covariate column(s) (see target_encoding.py) """
+    if isinstance(cov_cols, str):
+        cov_cols = [cov_cols]
+    name = '_'.join(cov_cols)
+    logging.info(f'{name} w GENDER_FIRST, GENDER_LAST')
+    means = target_means(df, cov_cols, female_indicators(df),
+                         leave_one_out=leave_one_out, smoothing=smoothing)
+    for pos, values in means.items():
+        df[f'F_{pos}_{name}'] = values
+    return df
+
+
+def _group_keys(df, cov_cols):
+    # the categorical columns as strings, as they are read from a csv file
+    return pd.DataFrame({col: df[col].astype(object).values
+                         if df[col].dtype.name == 'category'
+                         else df[col].values for col in cov_cols})
+
 
-def cal_f_cov(df, cov_col):
-    tempdf = df.copy()
+def f_cov_counts(df, cov_cols):
+    """ the counts of each group of the covariate column(s): rows with a
+    known first (last) author gender, and female first (last) authors.
+    rows with a missing group value are left out. """
+    indicators = female_indicators(df)
+    counts = _group_keys(df, cov_cols)
     for pos in ['FIRST', 'LAST']:
-        logging.info(f'{cov_col} w GENDER_{pos}')
-        tempdf[f'GENDER_{pos}'].replace(dict(M=0, F=1), inplace=True)
-        f_dict = tempdf.groupby(cov_col)[f'GENDER_{pos}'].mean().to_dict()
-        df[f'F_{pos}_{cov_col}'] = tempdf[cov_col].replace(f_dict)
+        counts[f'N_{pos}'] = (~np.isnan(indicators[pos])).astype(np.int64)
+        counts[f'SUM_{pos}'] = np.nan_to_num(indicators[pos])
+    counts = counts.dropna(subset=cov_cols)
+    return counts.groupby(cov_cols, sort=True)[COUNT_COLUMNS].sum() \
+        .reset_index()
+
+
+def add_f_cov_counts(counts, other, cov_cols):
+    """ the sum of two count tables of the same covariate column(s) """
+    return pd.concat([counts, other], ignore_index=True) \
+        .groupby(cov_cols, sort=True)[COUNT_COLUMNS].sum().reset_index()
+
+
+def attach_f_cov_counts(df, cov_cols, counts):
+    """ attach the columns of `cal_f_cov` from the counts of the groups
+    instead of the rows of `df` """
+    name = '_'.join(cov_cols)
+    found = _group_keys(df, cov_cols).merge(counts, on=cov_cols,
+                                            how='left')
+    for pos in ['FIRST', 'LAST']:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            df[f'F_{pos}_{name}'] = (found[f'SUM_{pos}'].values /
+                                     found[f'N_{pos}'].values)
     return df
 
 
-def attach_f_country(df):
-    ''' calculate f_first_country and f_last_country '''
-    return cal_f_cov(df, 'MAIN_COUNTRY')
+def f_cov_counts_path(counts_dir, cov_cols):
+    """ the file of the counts of the covariate column(s) in `counts_dir` """
+    return os.path.join(counts_dir, f'f_{"_".join(cov_cols)}.csv')
 
 
-def main(multi_author_f, paper_mesh_feature_f, out_f):
-    """ merge multi author df with paper mesh feature df w left join on PID """
+def save_f_cov_counts(cov_counts, counts_dir):
+    """ save the counts of each covariate (tuple of its columns) """
+    for cov_cols, counts in cov_counts.items():
+        save_table(counts, f_cov_counts_path(counts_dir, cov_cols))
 
-    multi_df = pd.read_csv(multi_author_f)
-    logging.info('multi author data loaded.')
 
-    mesh_df = pd.read_csv(paper_mesh_feature_f, sep='\t')
-    logging.info('paper mesh feature loaded.')
+def load_f_cov_counts(counts_dir):
+    """ the counts of each covariate of `F_COVARIATES` (tuple of its
+    columns) saved in `counts_dir` """
+    # the count columns of an empty table (e.g. of a shard) are not numeric
+    return {tuple(cov_cols): load_table(f_cov_counts_path(
+        counts_dir, cov_cols)).astype(COUNT_DTYPES)
+            for cov_cols in F_COVARIATES}
 
+
+def add_covariates(multi_df, mesh_df):
+    """ left join the paper mesh features on PID and attach the female
+    fraction covariates """
+    df = pd.merge(multi_df, mesh_df, on='PID', how='left')
+    for cov_cols in F_COVARIATES:
+        df = cal_f_cov(df, cov_cols)
+    return df
+
+
+def add_covariates_from_counts(multi_df, mesh_df, cov_counts):
+    """ `add_covariates` with the female fractions of the counts """
     df = pd.merge(multi_df, mesh_df, on='PID', how='left')
-    df = attach_f_country(df)
+    for cov_cols in F_COVARIATES:
+        df = attach_f_cov_counts(df, cov_cols, cov_counts[tuple(cov_cols)])
+    return df
+
+
+def main(multi_author_f, paper_mesh_feature_f, out_f, counts_dir=None):
+    """ merge multi author df with paper mesh feature df w left join on PID
+    (the female fractions are looked up from the counts in `counts_dir` if
+    it is given) """
+
+    multi_df = load_table(multi_author_f)
+    telemetry.checkpoint('multi author data loaded.', rows=len(multi_df))
+
+    mesh_df = pd.read_csv(paper_mesh_feature_f, sep='\t')
+    telemetry.checkpoint('paper mesh feature loaded.', rows=len(mesh_df))
+
+    if counts_dir is None:
+        df = add_covariates(multi_df, mesh_df)
+    else:
+        df = add_covariates_from_counts(multi_df, mesh_df,
+                                        load_f_cov_counts(counts_dir))
+    telemetry.checkpoint('covariates attached.', rows=len(df))
 
-    df.to_csv(out_f, index=False)
+    save_table(df, out_f)
+    telemetry.checkpoint('data saved.', rows=len(df))
 
 
 if __name__ == "__main__":
     MULTI_AUTHOR_DATA = sys.argv[1]
     PAPER_MESH_FEATURE_DATA = sys.argv[2]
     OUT_PATH = sys.argv[3]
-    main(MULTI_AUTHOR_DATA, PAPER_MESH_FEATURE_DATA, OUT_PATH)
+    COUNTS_DIR = sys.argv[4] if len(sys.argv) > 4 else None
+    COUNTS_INPUTS = [] if COUNTS_DIR is None else [
+        f_cov_counts_path(COUNTS_DIR, cov_cols) for cov_cols in F_COVARIATES]
+    telemetry.start('multi_author_data_with_cov', OUT_PATH)
+    run_stage(partial(main, MULTI_AUTHOR_DATA, PAPER_MESH_FEATURE_DATA,
+                      OUT_PATH, COUNTS_DIR),
+              inputs=[MULTI_AUTHOR_DATA, PAPER_MESH_FEATURE_DATA] +
+              COUNTS_INPUTS,
+              outputs=[OUT_PATH])
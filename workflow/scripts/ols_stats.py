@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+""" OLS from sufficient statistics.
+
+the cross products (X'X, X'y, y'y) are computed once per cell of the data
+(e.g. discipline x year). a model on any union of cells is then assembled by
+summing the cells' statistics and solving a small linear system, instead of
+decomposing its design matrix.
+
+the fitted model is returned as a regular statsmodels result, so the summary
+(incl. the residual diagnostics) is the same as with `OLS.fit()`.
+
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from statsmodels.regression.linear_model import (OLSResults,
+                                                 RegressionResultsWrapper)
+
+# cells: dataframe of the cell keys (one row per cell); XtX, Xty, yty, n:
+# statistics of each cell, stacked along the first axis.
+CellStats = namedtuple('CellStats', ['cells', 'XtX', 'Xty', 'yty', 'n'])
+
+
+def get_cells(df, columns):
+    """ returns the cell id of each row and a dataframe of the cell keys """
+    cell_ids, cells = pd.factorize(
+        pd.MultiIndex.from_arrays([df[col] for col in columns]))
+    cells = cells.to_frame(index=False)
+    cells.columns = columns
+    return cell_ids, cells
+
+
+def cell_stats(X, y, cell_ids, cells):
+    """ X'X, X'y, y'y, and the number of rows of each cell in one pass.
+
+    `cell_ids` gives the cell (row of `cells`) of each row of `X` and `y`;
+    rows with a negative id are skipped.
+    """
+    n_cells, k = len(cells), X.shape[1]
+    order = np.argsort(cell_ids, kind='mergesort')
+    bounds = np.searchsorted(cell_ids[order], np.arange(n_cells + 1))
+    XtX = np.zeros((n_cells, k, k))
+    Xty = np.zeros((n_cells, k))
+    yty = np.zeros(n_cells)
+    for cell in range(n_cells):
+        rows = order[bounds[cell]:bounds[cell + 1]]
+        X_cell, y_cell = X[rows], y[rows]
+        XtX[cell] = X_cell.T @ X_cell
+        Xty[cell] = X_cell.T @ y_cell
+        yty[cell] = y_cell @ y_cell
+    return CellStats(cells=cells, XtX=XtX, Xty=Xty, yty=yty,
+                     n=np.diff(bounds))
+
+
+def fit_ols(endog, exog, XtX, Xty):
+    """ OLS result of `endog` on `exog` whose cross products `XtX`, `Xty` are
+    already known (e.g. summed cell statistics with the columns of `exog`).
+    """
+    model = sm.OLS(endog, exog)
+    normalized_cov_params = np.linalg.inv(XtX)
+    params = normalized_cov_params @ Xty
+    # what `fit` would get from the decomposition of exog
+    model.rank = XtX.shape[0]
+    eigenvalues = np.clip(np.linalg.eigvalsh(XtX), 0, None)
+    model.wexog_singular_values = np.sqrt(eigenvalues)[::-1]
+    model.normalized_cov_params = normalized_cov_params
+    result = OLSResults(model, params,
+                        normalized_cov_params=normalized_cov_params,
+                        cov_type='nonrobust')
+    return RegressionResultsWrapper(result)
+
+
+def sum_cells(stats, selected, keep):
+    """ summed X'X and X'y of the `selected` cells (boolean mask), restricted
+    to the `keep` columns """
+    XtX = stats.XtX[selected].sum(axis=0)[np.ix_(keep, keep)]
+    Xty = stats.Xty[selected].sum(axis=0)[keep]
+    return XtX, Xty
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+""" compact table of the paper attributes used by the mesh covariates.
+
+the papers of the multi-author data are stored as aligned arrays sorted by
+paper id, so a batch of paper ids is looked up with one binary search
+(`np.searchsorted`) instead of python dictionaries:
+
+    - pids: sorted unique paper ids (int64).
+    - female_first, female_last: 1 if the first (last) author is female,
+    0 otherwise (int8).
+
+the table is cached on disk as .npy files, keyed by the digest of the input
+file (see stage_cache.py), and memory-mapped when loaded.
+
+"""
+import os
+import json
+import hashlib
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+from storage import load_table
+from stage_cache import cached_digests, save_array, save_json
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+PAPER_CACHE_DIR = '../data/cache/papers'
+ATTRIBUTE_ARRAYS = ['pids', 'female_first', 'female_last']
+
+PaperAttributes = namedtuple('PaperAttributes', ATTRIBUTE_ARRAYS)
+
+
+def build_paper_attributes(multi_author_data_f):
+    """ the attribute table of the papers in the multi-author data """
+    return paper_attributes_from_df(load_table(
+        multi_author_data_f, columns=['PID', 'GENDER_FIRST', 'GENDER_LAST']))
+
+
+def paper_attributes_from_df(multi_df):
+    """ the attribute table of the papers of a multi-author dataframe (the
+    last row of a duplicated paper id is kept) """
+    author_data_df = multi_df[['PID', 'GENDER_FIRST', 'GENDER_LAST']] \
+        .drop_duplicates('PID', keep='last').sort_values('PID')
+    return PaperAttributes(
+        pids=author_data_df.PID.values.astype(np.int64),
+        female_first=(author_data_df.GENDER_FIRST == 'F').values.astype(
+            np.int8),
+        female_last=(author_data_df.GENDER_LAST == 'F').values.astype(
+            np.int8))
+
+
+def save_paper_attributes(papers, path_prefix):
+    """ save as `{path_prefix}.{name}.npy` and `{path_prefix}.json` """
+    for name in ATTRIBUTE_ARRAYS:
+        save_array(getattr(papers, name), f'{path_prefix}.{name}.npy')
+    # the metadata is moved in place last; it marks the entry as complete
+    save_json({'n_papers': len(papers.pids)}, f'{path_prefix}.json')
+
+
+def load_saved_paper_attributes(path_prefix, mmap_mode='r'):
+    """ load a saved table; the arrays are memory-mapped """
+    return PaperAttributes(**{
+        name: np.load(f'{path_prefix}.{name}.npy', mmap_mode=mmap_mode)
+        for name in ATTRIBUTE_ARRAYS})
+
+
+def load_paper_attributes(multi_author_data_f, cache_dir=PAPER_CACHE_DIR):
+    """ the attribute table of the multi-author data, from the cache if
+    possible (nothing is cached if `cache_dir` is None) """
+    if cache_dir is None:
+        return build_paper_attributes(multi_author_data_f)
+
+    key = json.dumps([CACHE_VERSION, cached_digests([multi_author_data_f],
+                                                    cache_dir)[0]])
+    path_prefix = os.path.join(cache_dir,
+                               hashlib.sha1(key.encode()).hexdigest())
+    if os.path.exists(f'{path_prefix}.json'):
+        logger.info('paper attributes loaded from the cache.')
+        return load_saved_paper_attributes(path_prefix)
+
+    papers = build_paper_attributes(multi_author_data_f)
+    os.makedirs(cache_dir, exist_ok=True)
+    save_paper_attributes(papers, path_prefix)
+    logger.info('paper attributes cached.')
+    return load_saved_paper_attributes(path_prefix)
+
+
+def paper_positions(papers, pids):
+    """ positions of the paper ids `pids` in the table (-1 if absent) """
+    pids = np.asarray(pids, dtype=np.int64)
+    if len(papers.pids) == 0:
+        return np.full(len(pids), -1, dtype=np.int64)
+    pos = np.searchsorted(papers.pids, pids)
+    pos[pos == len(papers.pids)] = 0
+    return np.where(papers.pids[pos] == pids, pos, -1)
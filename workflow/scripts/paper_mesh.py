@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+
+""" shared paper-mesh engine for the mesh covariates.
+
+the paper-mesh edge list is loaded into integer-coded arrays (paper index,
+mesh index) and the female fractions are computed with grouped reductions
+(bincount) instead of python dictionaries of sets. the text file is parsed
+once; the arrays are cached on disk (keyed by the digest of the file, see
+stage_cache.py) and memory-mapped by the next runs.
+
+    - female_frac_per_mesh: female first/last author fraction of each mesh.
+    - mesh_female_frac_per_paper: average of the mesh fractions of each paper.
+
+the fractions are ratios of counts per mesh (`mesh_counts`), which can be
+kept and updated with the edges of new papers only (see ingest_delta.py), or
+counted per shard of the papers and summed (see shards.py; the counts per
+tree number, `tree_counts`, in the hierarchical mode).
+
+the hierarchical mode aggregates along the disease tree (see mesh_index.py):
+
+    - female_frac_per_tree: the female fractions of the papers of every
+    disease tree number, including its subtree; the edges are expanded into
+    the ancestors of the tree numbers of their meshes, and each paper counts
+    once per tree number.
+    - tree_female_frac_per_paper: average of the fractions of the ancestors
+    (at a given depth) of the meshes of each paper.
+
+"""
+import os
+import csv
+import json
+import hashlib
+import logging
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from mesh_index import (DISEASE_CATEGORY, term_ids, category_nodes,
+                        tree_depths, ancestor_pairs, ancestors_at_depth)
+from paper_attributes import paper_positions
+from stage_cache import cached_digests, save_array, save_json
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+EDGE_CACHE_DIR = '../data/cache/paper_mesh'
+
+# pids: sorted unique paper ids, meshes: mesh terms (strings),
+# pid_idx / mesh_idx: one entry per (paper, mesh) edge, indexing the above.
+# the edges are sorted by paper and mesh.
+PaperMesh = namedtuple('PaperMesh', ['pids', 'meshes', 'pid_idx', 'mesh_idx'])
+# the columns of `mesh_counts`
+COUNT_COLUMNS = ['N_FIRST', 'SUM_FIRST', 'N_LAST', 'SUM_LAST']
+
+
+def read_paper_mesh(raw_paper_mesh_data_f):
+    """ parse the paper-mesh edge list (tab separated, with a header).
+    duplicated edges are removed. """
+    df = pd.read_csv(raw_paper_mesh_data_f, sep='\t', header=0,
+                     names=['PID', 'MESH'], quoting=csv.QUOTE_NONE,
+                     dtype={'PID': np.int64, 'MESH': 'category'})
+    meshes = np.asarray(df.MESH.cat.categories.str.strip(), dtype=str)
+    has_mesh = df.MESH.notnull().values
+    mesh_idx = df.MESH.cat.codes.values[has_mesh]
+    pids = df.PID.values[has_mesh]
+    del df
+
+    # stripped names may collide; recode onto the unique names
+    meshes, mesh_recode = np.unique(meshes, return_inverse=True)
+    mesh_idx = mesh_recode[mesh_idx]
+
+    pids, pid_idx = np.unique(pids, return_inverse=True)
+    n_meshes = max(len(meshes), 1)
+    edges = np.unique(pid_idx.astype(np.int64) * n_meshes + mesh_idx)
+    return PaperMesh(pids=pids, meshes=meshes,
+                     pid_idx=(edges // n_meshes).astype(np.int32),
+                     mesh_idx=(edges % n_meshes).astype(np.int32))
+
+
+def save_paper_mesh(paper_mesh, path_prefix):
+    """ save as `{path_prefix}.{name}.npy` and `{path_prefix}.json` """
+    for name in PaperMesh._fields:
+        save_array(getattr(paper_mesh, name), f'{path_prefix}.{name}.npy')
+    # the metadata is moved in place last; it marks the entry as complete
+    save_json({'n_edges': len(paper_mesh.pid_idx)}, f'{path_prefix}.json')
+
+
+def load_saved_paper_mesh(path_prefix, mmap_mode='r'):
+    """ load a saved edge list; the arrays are memory-mapped """
+    return PaperMesh(**{
+        name: np.load(f'{path_prefix}.{name}.npy', mmap_mode=mmap_mode)
+        for name in PaperMesh._fields})
+
+
+def select_meshes(paper_mesh, mesh_terms):
+    """ the edges with a mesh in `mesh_terms`; the papers and meshes without
+    such edges are dropped """
+    # membership is tested once per distinct mesh, not per edge
+    is_term = np.isin(paper_mesh.meshes, list(mesh_terms))
+    keep = is_term[paper_mesh.mesh_idx]
+    # the codes are recoded in order, so the edges stay sorted
+    mesh_idx = (np.cumsum(is_term) - 1)[paper_mesh.mesh_idx[keep]]
+    used_pids, pid_idx = np.unique(paper_mesh.pid_idx[keep],
+                                   return_inverse=True)
+    return PaperMesh(pids=paper_mesh.pids[used_pids],
+                     meshes=paper_mesh.meshes[is_term],
+                     pid_idx=pid_idx.astype(np.int32),
+                     mesh_idx=mesh_idx.astype(np.int32))
+
+
+def edge_codes(paper_mesh, pids, meshes):
+    """ the edges as integers (paper * number of meshes + mesh), indexing
+    the sorted `pids` and `meshes`, which include those of `paper_mesh` """
+    return np.searchsorted(pids, paper_mesh.pids)[paper_mesh.pid_idx] \
+        .astype(np.int64) * max(len(meshes), 1) + \
+        np.searchsorted(meshes, paper_mesh.meshes)[paper_mesh.mesh_idx]
+
+
+def from_edge_codes(codes, pids, meshes):
+    """ the edge list of the (sorted unique) `edge_codes` """
+    n_meshes = max(len(meshes), 1)
+    return PaperMesh(pids=pids, meshes=meshes,
+                     pid_idx=(codes // n_meshes).astype(np.int32),
+                     mesh_idx=(codes % n_meshes).astype(np.int32))
+
+
+def merge_paper_mesh(paper_mesh, other):
+    """ the union of the edges of two edge lists """
+    pids = np.union1d(paper_mesh.pids, other.pids)
+    meshes = np.union1d(paper_mesh.meshes, other.meshes)
+    return from_edge_codes(np.union1d(edge_codes(paper_mesh, pids, meshes),
+                                      edge_codes(other, pids, meshes)),
+                           pids, meshes)
+
+
+def paper_edges(paper_mesh, pids):
+    """ the edges of the papers `pids`; the papers and meshes (and their
+    indices) are kept """
+    pos = paper_positions(paper_mesh, pids)
+    pos = np.unique(pos[pos >= 0])
+    # the edges are sorted by paper, so each paper is a range of edges
+    start = np.searchsorted(paper_mesh.pid_idx, pos, 'left')
+    n_edges = np.searchsorted(paper_mesh.pid_idx, pos, 'right') - start
+    edges = np.repeat(start - np.cumsum(n_edges) + n_edges, n_edges) + \
+        np.arange(n_edges.sum())
+    return paper_mesh._replace(pid_idx=paper_mesh.pid_idx[edges],
+                               mesh_idx=paper_mesh.mesh_idx[edges])
+
+
+def load_paper_mesh(raw_paper_mesh_data_f, mesh_terms=None,
+                    cache_dir=EDGE_CACHE_DIR):
+    """ load the paper-mesh edge list, from the cache if possible (nothing
+    is cached if `cache_dir` is None).
+
+    only the edges with a mesh in `mesh_terms` are kept if it is given.
+    """
+    if cache_dir is None:
+        paper_mesh = read_paper_mesh(raw_paper_mesh_data_f)
+    else:
+        key = json.dumps([CACHE_VERSION,
+                          cached_digests([raw_paper_mesh_data_f])[0]])
+        path_prefix = os.path.join(cache_dir,
+                                   hashlib.sha1(key.encode()).hexdigest())
+        if os.path.exists(f'{path_prefix}.json'):
+            logger.info('paper-mesh edges loaded from the cache.')
+        else:
+            os.makedirs(cache_dir, exist_ok=True)
+            save_paper_mesh(read_paper_mesh(raw_paper_mesh_data_f),
+                            path_prefix)
+            logger.info('paper-mesh edges cached.')
+        paper_mesh = load_saved_paper_mesh(path_prefix)
+
+    if mesh_terms is not None:
+        paper_mesh = select_meshes(paper_mesh, mesh_terms)
+    return paper_mesh
+
+
+def group_sum(groups, values, n_groups):
+    """ sum and number of `values` per group (NaN values are skipped) """
+    valid = ~np.isnan(values)
+    counts = np.bincount(groups[valid], minlength=n_groups)
+    sums = np.bincount(groups[valid], weights=values[valid],
+                       minlength=n_groups)
+    return sums, counts
+
+
+def group_mean(groups, values, n_groups):
+    """ mean of `values` per group (NaN values are skipped).
+
+    returns (means, counts); groups without values have a NaN mean.
+    """
+    sums, counts = group_sum(groups, values, n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts, counts
+
+
+def _author_counts(pids, pid_idx, groups, papers, n_groups):
+    # the counts (see `COUNT_COLUMNS`) of each group, from the (paper, group)
+    # pairs `pid_idx` (indexing `pids`), `groups`; the papers without gender
+    # information do not count
+    author_idx = paper_positions(papers, pids)[pid_idx]
+    known = author_idx >= 0
+    author_idx, groups = author_idx[known], groups[known]
+    ff_sum, ff_cnt = group_sum(
+        groups, papers.female_first[author_idx].astype(float), n_groups)
+    fl_sum, fl_cnt = group_sum(
+        groups, papers.female_last[author_idx].astype(float), n_groups)
+    return np.column_stack([ff_cnt, ff_sum, fl_cnt, fl_sum])
+
+
+def mesh_counts(paper_mesh, papers):
+    """ the counts of each mesh (one row per mesh, aligned with
+    `paper_mesh.meshes`; see `COUNT_COLUMNS`): the papers with gender
+    information, and their female first (last) authors """
+    return _author_counts(paper_mesh.pids, paper_mesh.pid_idx,
+                          paper_mesh.mesh_idx, papers,
+                          len(paper_mesh.meshes))
+
+
+def mesh_fracs(meshes, counts):
+    """ the dataframe of `female_frac_per_mesh` from the `mesh_counts` """
+    ff_cnt, ff_sum, fl_cnt, fl_sum = counts.T
+    found = (ff_cnt > 0) & (fl_cnt > 0)
+    return pd.DataFrame({'MESH': meshes[found],
+                         'F_FIRST_MESH': ff_sum[found] / ff_cnt[found],
+                         'F_LAST_MESH': fl_sum[found] / fl_cnt[found]})
+
+
+def female_frac_per_mesh(paper_mesh, papers):
+    """ returns a dataframe (MESH, F_FIRST_MESH, F_LAST_MESH) with the average
+    of the female first (last) author indicators of the papers of each mesh.
+
+    `papers` is the paper attribute table (see paper_attributes.py). papers
+    that are not in it do not count; meshes without such papers are dropped.
+    """
+    return mesh_fracs(paper_mesh.meshes, mesh_counts(paper_mesh, papers))
+
+
+def mesh_female_frac_per_paper(paper_mesh, mesh_frac_df):
+    """ returns a dataframe (PID, F_FIRST_MESH, F_LAST_MESH) with the average
+    female fractions of the meshes of each paper.
+
+    `mesh_frac_df` is the output of `female_frac_per_mesh`; meshes that are
+    not in it are ignored and papers without any such mesh are dropped.
+    """
+    fracs = mesh_frac_df.set_index('MESH').reindex(paper_mesh.meshes)
+    n_papers = len(paper_mesh.pids)
+    ff, ff_cnt = group_mean(
+        paper_mesh.pid_idx,
+        fracs.F_FIRST_MESH.values[paper_mesh.mesh_idx], n_papers)
+    fl, fl_cnt = group_mean(
+        paper_mesh.pid_idx,
+        fracs.F_LAST_MESH.values[paper_mesh.mesh_idx], n_papers)
+    found = (ff_cnt > 0) & (fl_cnt > 0)
+    return pd.DataFrame({'PID': paper_mesh.pids[found],
+                         'F_FIRST_MESH': ff[found],
+                         'F_LAST_MESH': fl[found]})
+
+
+def _disease_nodes(meshes, index):
+    # (mesh index, tree id) of the disease tree numbers of the meshes
+    node_term, node_tree = category_nodes(index, DISEASE_CATEGORY)
+    mesh_of_term = np.full(len(index.terms), -1, dtype=np.int64)
+    ids = term_ids(index, meshes)
+    mesh_of_term[ids[ids >= 0]] = np.flatnonzero(ids >= 0)
+    node_mesh = mesh_of_term[node_term]
+    return node_mesh[node_mesh >= 0], node_tree[node_mesh >= 0]
+
+
+def _paper_trees(paper_mesh, node_mesh, node_tree, n_trees):
+    # (paper index, tree id) of the distinct (paper, tree number) pairs: each
+    # edge is expanded into the tree ids paired with its mesh (`node_mesh`,
+    # `node_tree`)
+    pairs = np.unique(node_mesh.astype(np.int64) * n_trees + node_tree)
+    pair_mesh, pair_tree = pairs // n_trees, pairs % n_trees
+    start = np.searchsorted(pair_mesh, paper_mesh.mesh_idx, 'left')
+    n_pairs = np.searchsorted(pair_mesh, paper_mesh.mesh_idx, 'right') - start
+    offset = np.arange(n_pairs.sum()) - np.repeat(np.cumsum(n_pairs) -
+                                                  n_pairs, n_pairs)
+    edges = np.unique(np.repeat(paper_mesh.pid_idx.astype(np.int64) *
+                                n_trees, n_pairs) +
+                      pair_tree[np.repeat(start, n_pairs) + offset])
+    return edges // n_trees, edges % n_trees
+
+
+def tree_counts(paper_mesh, papers, index):
+    """ the counts of each tree number (one row per tree id of the mesh
+    `index`; see `COUNT_COLUMNS`): the papers with gender information that
+    have a disease mesh in its subtree, and their female first (last)
+    authors. a paper counts once per tree number, however many of its
+    meshes (and tree numbers of its meshes) are in the subtree. """
+    node_mesh, node_tree = _disease_nodes(paper_mesh.meshes, index)
+    position, ancestor = ancestor_pairs(index, node_tree)
+    pid_idx, tree_idx = _paper_trees(paper_mesh, node_mesh[position],
+                                     ancestor, len(index.trees))
+    return _author_counts(paper_mesh.pids, pid_idx, tree_idx, papers,
+                          len(index.trees))
+
+
+def female_frac_per_tree(paper_mesh, papers, index):
+    """ returns a dataframe (TREE, DEPTH, N_FIRST, N_LAST, F_FIRST_MESH,
+    F_LAST_MESH) with the female first (last) author fractions of the papers
+    of every disease tree number of the mesh `index`, including its subtree
+    (see `tree_counts`): N_FIRST (N_LAST) is the number of distinct papers.
+    tree numbers without papers are dropped.
+    """
+    return tree_fracs(index.trees, tree_counts(paper_mesh, papers, index),
+                      index)
+
+
+def tree_fracs(trees, counts, index):
+    """ the dataframe of `female_frac_per_tree` from the `tree_counts` of
+    the tree numbers `trees` (sorted, in the mesh `index`) """
+    all_counts = np.zeros((len(index.trees), counts.shape[1]))
+    all_counts[np.searchsorted(index.trees, trees)] = counts
+    ff_cnt, ff_sum, fl_cnt, fl_sum = all_counts.T
+
+    found = (ff_cnt > 0) & (fl_cnt > 0)
+    return pd.DataFrame({'TREE': index.trees[found],
+                         'DEPTH': tree_depths(index)[found],
+                         'N_FIRST': ff_cnt[found].astype(np.int64),
+                         'N_LAST': fl_cnt[found].astype(np.int64),
+                         'F_FIRST_MESH': ff_sum[found] / ff_cnt[found],
+                         'F_LAST_MESH': fl_sum[found] / fl_cnt[found]},
+                        columns=['TREE', 'DEPTH', 'N_FIRST', 'N_LAST',
+                                 'F_FIRST_MESH', 'F_LAST_MESH'])
+
+
+def tree_female_frac_per_paper(paper_mesh, tree_frac_df, index, depth=None):
+    """ returns a dataframe (PID, F_FIRST_MESH, F_LAST_MESH) with the average
+    female fractions of the ancestors at `depth` of the disease tree numbers
+    of each paper's meshes (a tree number that is not deeper, or any tree
+    number if `depth` is None, stands for itself). each ancestor counts once
+    per paper.
+
+    `tree_frac_df` is the output of `female_frac_per_tree`; tree numbers that
+    are not in it are ignored and papers without any such tree number are
+    dropped.
+    """
+    node_mesh, node_tree = _disease_nodes(paper_mesh.meshes, index)
+    if depth is not None:
+        node_tree = ancestors_at_depth(index, node_tree, depth)
+    # each edge is expanded into the ancestors of its mesh
+    pid_idx, tree_idx = _paper_trees(paper_mesh, node_mesh, node_tree,
+                                     len(index.trees))
+
+    fracs = tree_frac_df.set_index('TREE').reindex(index.trees)
+    n_papers = len(paper_mesh.pids)
+    ff, ff_cnt = group_mean(pid_idx, fracs.F_FIRST_MESH.values[tree_idx],
+                            n_papers)
+    fl, fl_cnt = group_mean(pid_idx, fracs.F_LAST_MESH.values[tree_idx],
+                            n_papers)
+    found = (ff_cnt > 0) & (fl_cnt > 0)
+    return pd.DataFrame({'PID': paper_mesh.pids[found],
+                         'F_FIRST_MESH': ff[found],
+                         'F_LAST_MESH': fl[found]})
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" This script runs the whole workflow in one process.
+
+input: (optional) data directory (default: ../data), number of worker
+processes fitting the models (default: 1), checkpoints (comma separated
+dataset names, e.g. 'multi_author,reg_table', or 'all'; default: none), and
+'resume' to load the datasets from their existing checkpoints
+
+output: the results, the result store, and the cleaned results (as the
+Snakefile), and the checkpoints.
+
+the stages are the functions of the scripts of the Snakefile rules, run as a
+DAG: each stage takes its inputs (dataframes, arrays, mesh index, ...) from
+the earlier stages in memory instead of reading their files, so that the
+libraries are imported and the tables parsed once. a dataset is written
+(to its path in the data directory, see `CHECKPOINTS`) only if it is a
+checkpoint, and released as soon as no later stage uses it.
+
+with 'resume', the datasets whose checkpoint files exist are loaded instead
+of computed (their inputs are not checked; remove stale checkpoints).
+
+"""
+import os
+import sys
+import glob
+import logging
+from collections import namedtuple
+
+import pandas as pd
+
+from storage import load_table, save_table
+from continent_data_cleaning import load_continent_data
+from main_data_cleaning import (EXPECTED_N_ROWS, load_data, clean_pub_data,
+                                sanity_checks, single_author_pubs,
+                                multi_author_pubs)
+from mesh_index import build_mesh_index, save_mesh_index, load_mesh_index
+from generate_disease_mesh_terms import disease_terms
+from cal_female_frac_per_mesh import load_disease_mesh
+from paper_attributes import paper_attributes_from_df
+from paper_mesh import (load_paper_mesh, female_frac_per_mesh,
+                        female_frac_per_tree, mesh_female_frac_per_paper,
+                        tree_female_frac_per_paper)
+from multi_author_data_with_cov import add_covariates
+from prepare_reg_table import pre_process
+from run_regression import (load_models, used_columns, strings_as_categories,
+                            fit_and_save)
+from result_store import RESULT_STORE
+from model_specs import MODEL_SPEC
+import export_results
+import telemetry
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+DATA_DIR = '../data'
+CLEANED_REG_RESULTS = '../results_clean/{name}.csv'
+# raw inputs (in the data directory), as in the Snakefile
+RAW_DATA = {'raw_cont_data': 'Country_Region_2.xlsx',
+            'cont_supp_data': 'country_continent_added.csv',
+            'raw_pub_data': 'genderXgender_v20180710.txt',
+            'raw_paper_mesh_data': 'MESH_v20180726.txt',
+            'raw_mesh_data': 'mesh/mtrees*.bin'}
+# datasets that can be saved (and loaded with 'resume'), in the data
+# directory; the table formats follow the extensions (see storage.py)
+CHECKPOINTS = {'country_continent': 'country_continent.csv',
+               'single_author': 'single_author.parquet',
+               'multi_author': 'multi_author.parquet',
+               'mesh_index': 'mesh_index',
+               'disease_mesh': 'disease_mesh.txt',
+               'female_frac_per_mesh': 'female_frac_per_mesh.csv',
+               'paper_mesh_feature': 'paper_mesh_feature.csv',
+               'multi_author_final': 'multi_author_final.parquet',
+               'reg_table': 'reg_table.parquet'}
+TARGETS = ['single_author', 'cleaned_results']
+
+# `function(*inputs)` returns the outputs (a tuple if there are several).
+# the `consumes` inputs are modified by the function; they are copied if a
+# later stage uses them as well.
+Stage = namedtuple('Stage', ['name', 'function', 'inputs', 'outputs',
+                             'consumes'])
+
+
+def _write_tsv(df, path):
+    df.to_csv(path, sep='\t', index=False)
+
+
+def _write_lines(terms, path):
+    with open(path, 'w') as fout:
+        fout.write('\n'.join(sorted(terms)))
+
+
+# dataset -> (writer(value, path), reader(path))
+CHECKPOINT_IO = {
+    'country_continent': (lambda df, path: df.to_csv(path, index=False),
+                          pd.read_csv),
+    'single_author': (save_table, load_table),
+    'multi_author': (save_table, load_table),
+    'mesh_index': (save_mesh_index, load_mesh_index),
+    'disease_mesh': (_write_lines, load_disease_mesh),
+    'female_frac_per_mesh': (_write_tsv,
+                             lambda path: pd.read_csv(path, sep='\t')),
+    'paper_mesh_feature': (_write_tsv,
+                           lambda path: pd.read_csv(path, sep='\t')),
+    'multi_author_final': (save_table, load_table),
+    'reg_table': (save_table, load_table)}
+
+
+def clean_pubs(raw_pub_f, cont_df, cont_supp_f, expected_n_rows):
+    """ the single and multi author papers (main_data_cleaning.py) """
+    cntry_df = pd.concat([cont_df, pd.read_csv(cont_supp_f)])
+    df = clean_pub_data(load_data(raw_pub_f), cntry_df)
+    sanity_checks(df, expected_n_rows)
+    return (single_author_pubs(df).reset_index(drop=True),
+            multi_author_pubs(df).reset_index(drop=True))
+
+
+def mesh_female_frac(paper_mesh, papers, index, depth):
+    """ female fractions per disease mesh, or per tree number if `depth` """
+    if depth:
+        return female_frac_per_tree(paper_mesh, papers, index)
+    return female_frac_per_mesh(paper_mesh, papers)
+
+
+def paper_mesh_feature(paper_mesh, frac_df, index, depth):
+    """ the mesh covariates of the papers """
+    if depth:
+        return tree_female_frac_per_paper(paper_mesh, frac_df, index, depth)
+    return mesh_female_frac_per_paper(paper_mesh, frac_df)
+
+
+def regression(reg_df, model_spec_f, n_workers, result_store_f):
+    """ fit the models and write the results (run_regression.py) """
+    models = load_models(model_spec_f)
+    df = strings_as_categories(reg_df[used_columns(models,
+                                                   list(reg_df.columns))])
+    fit_and_save(models, df, n_workers, result_store_f=result_store_f)
+    return result_store_f
+
+
+def clean_results(result_store_f, cleaned_path):
+    os.makedirs(os.path.dirname(cleaned_path) or '.', exist_ok=True)
+    export_results.main(result_store_f, cleaned_path)
+    return cleaned_path
+
+
+STAGES = [
+    Stage('country_data_cleaning', load_continent_data, ['raw_cont_data'],
+          ['country_continent'], []),
+    Stage('main_data_cleaning', clean_pubs,
+          ['raw_pub_data', 'country_continent', 'cont_supp_data',
+           'expected_n_rows'], ['single_author', 'multi_author'], []),
+    Stage('mesh_index', lambda pattern: build_mesh_index(
+        sorted(glob.glob(pattern))), ['raw_mesh_data'], ['mesh_index'], []),
+    Stage('disease_mesh', lambda index: set(disease_terms(index)),
+          ['mesh_index'], ['disease_mesh'], []),
+    Stage('paper_attributes', paper_attributes_from_df, ['multi_author'],
+          ['papers'], []),
+    Stage('paper_mesh', load_paper_mesh,
+          ['raw_paper_mesh_data', 'disease_mesh'], ['paper_mesh'], []),
+    Stage('cal_female_frac_per_mesh', mesh_female_frac,
+          ['paper_mesh', 'papers', 'mesh_index', 'mesh_depth'],
+          ['female_frac_per_mesh'], []),
+    Stage('cal_mesh_female_frac_per_paper', paper_mesh_feature,
+          ['paper_mesh', 'female_frac_per_mesh', 'mesh_index', 'mesh_depth'],
+          ['paper_mesh_feature'], []),
+    Stage('multi_author_with_cov', add_covariates,
+          ['multi_author', 'paper_mesh_feature'], ['multi_author_final'],
+          []),
+    Stage('prepare_reg_table', pre_process, ['multi_author_final'],
+          ['reg_table'], ['multi_author_final']),
+    Stage('regression', regression,
+          ['reg_table', 'model_spec', 'n_workers', 'result_store'],
+          ['result_store_f'], []),
+    Stage('result_cleaning', clean_results,
+          ['result_store_f', 'cleaned_path'], ['cleaned_results'], []),
+]
+
+
+def plan(stages, targets, available):
+    """ the stages needed for the `targets`, in order, given the
+    `available` values """
+    producers = {name: stage for stage in stages for name in stage.outputs}
+    planned = []
+
+    def require(name):
+        if name in available:
+            return
+        if name not in producers:
+            raise ValueError(f'no stage computes {name}')
+        stage = producers[name]
+        if stage in planned:
+            return
+        for input_name in stage.inputs:
+            require(input_name)
+        planned.append(stage)
+
+    for target in targets:
+        require(target)
+    return planned
+
+
+def run_pipeline(values, targets=TARGETS, stages=STAGES, checkpoints=None,
+                 resume=False):
+    """ run the stages computing the `targets` from the `values` (the raw
+    inputs and the parameters: name -> value), and return the targets.
+
+    `checkpoints` maps the datasets to save to their paths; with `resume`,
+    those whose file exists are loaded instead of computed.
+    """
+    values = dict(values)
+    checkpoints = checkpoints or {}
+    if resume:
+        for name, path in checkpoints.items():
+            if os.path.exists(path) and name not in values:
+                values[name] = CHECKPOINT_IO[name][1](path)
+                telemetry.checkpoint(f'{name} loaded from {path}.')
+    planned = plan(stages, targets, values)
+    uses = {}
+    for stage in planned:
+        for name in stage.inputs:
+            uses[name] = uses.get(name, 0) + 1
+
+    for stage in planned:
+        for name in stage.inputs:
+            uses[name] -= 1
+        args = [values[name].copy()
+                if name in stage.consumes and
+                (uses[name] > 0 or name in targets) else values[name]
+                for name in stage.inputs]
+        outputs = stage.function(*args)
+        if len(stage.outputs) == 1:
+            outputs = (outputs, )
+        for name, value in zip(stage.outputs, outputs):
+            values[name] = value
+            if name in checkpoints:
+                CHECKPOINT_IO[name][0](value, checkpoints[name])
+                telemetry.checkpoint(f'{name} saved to {checkpoints[name]}.')
+        # the datasets that no later stage uses are released
+        for name in stage.inputs + stage.outputs:
+            if uses.get(name, 0) == 0 and name not in targets:
+                values.pop(name, None)
+        telemetry.checkpoint(f'{stage.name} done.')
+    return {name: values[name] for name in targets}
+
+
+def main(data_dir=DATA_DIR, n_workers=1, checkpoints=(), resume=False,
+         expected_n_rows=EXPECTED_N_ROWS, mesh_depth=0,
+         model_spec_f=MODEL_SPEC, result_store_f=RESULT_STORE,
+         cleaned_path=CLEANED_REG_RESULTS, targets=TARGETS, raw_data=None):
+    """ run the workflow; `raw_data` overrides the raw input paths """
+    values = {name: os.path.join(data_dir, fname)
+              for name, fname in RAW_DATA.items()}
+    values.update(raw_data or {})
+    values.update({'expected_n_rows': expected_n_rows,
+                   'mesh_depth': mesh_depth,
+                   'model_spec': model_spec_f,
+                   'n_workers': n_workers,
+                   'result_store': result_store_f,
+                   'cleaned_path': cleaned_path})
+    unknown = set(checkpoints) - set(CHECKPOINTS)
+    if unknown:
+        raise ValueError(f'unknown checkpoints: {sorted(unknown)}')
+    return run_pipeline(
+        values, targets,
+        checkpoints={name: os.path.join(data_dir, CHECKPOINTS[name])
+                     for name in checkpoints},
+        resume=resume)
+
+
+if __name__ == "__main__":
+    DATA = sys.argv[1] if len(sys.argv) > 1 else DATA_DIR
+    N_WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    SAVED = sys.argv[3] if len(sys.argv) > 3 else ''
+    SAVED = list(CHECKPOINTS) if SAVED == 'all' else \
+        [name for name in SAVED.split(',') if name]
+    RESUME = len(sys.argv) > 4 and sys.argv[4] == 'resume'
+    telemetry.start('pipeline', os.path.join(
+        os.path.dirname(RESULT_STORE), 'pipeline'))
+    main(DATA, N_WORKERS, SAVED, RESUME)
@@ -7,36 +7,103 @@ input: multi-author data
 
 output: regression table with all variables
 
+the categorical columns are stored as categories, with fixed levels where the
+values are known (see `CATEGORIES`; the pivots come first), the dependent
+variables as int8, and the numeric columns as int32 and float32 where no value
+changes.
+
 """
 
 import sys
 import logging
+from functools import partial
 
+import numpy as np
 import pandas as pd
 
+from storage import load_table, save_table
+import telemetry
+from stage_cache import run_stage
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
 
+# categorical columns; the levels of the other columns are sorted. patsy takes
+# the first level as the reference, so the pivots come first.
+CATEGORIES = {'MAIN_COUNTRY': None,
+              'VENUE': None,
+              'GENDER_TOPIC': ['A', 'B', 'F', 'M'],
+              'GENDER_FIRST': ['A', 'F'],
+              'GENDER_LAST': ['A', 'F'],
+              'DISCIPLINE': ['Biomedical Research', 'Clinical Medicine',
+                             'Health'],
+              'SUBDISCIPLINE': None,
+              'COUNTRY': None,
+              'CONTINENT': None,
+              'GENDER_FL': ['AA', 'AF', 'FA', 'FF']}
+# the pivot (reference) level of the variables, renamed to sort first
+PIVOTS = {'GENDER_TOPIC': {'N': 'A'},
+          'GENDER_FIRST': {'M': 'A'},
+          'GENDER_LAST': {'M': 'A'},
+          'CONTINENT': {'Northern America': 'AA'}}
+# the value of each dependent variable for each GENDER_TOPIC level
+DEP_VARS = {'SRA': dict(A=0, B=1, M=1, F=1),
+            'SRM': dict(A=0, B=1, M=1, F=0),
+            'SRF': dict(A=0, B=1, M=0, F=1),
+            'SRB': dict(A=0, B=1, M=0, F=0)}
+
+
+def rename_levels(values, renames):
+    """ categorical `values` with the levels renamed (levels may merge) """
+    renamed = values.astype('category').map(
+        lambda level: renames.get(level, level))
+    return renamed.astype('category')
+
 
 def remove_comma_in_subdiscipline(df):
     """ remove comma because it creates issues with statsmodels export """
-    df.SUBDISCIPLINE.replace('Social Sciences, Biomedical',
-                             'Biomedical Social Sciences', inplace=True)
+    df['SUBDISCIPLINE'] = rename_levels(
+        df.SUBDISCIPLINE,
+        {'Social Sciences, Biomedical': 'Biomedical Social Sciences'})
     return df
 
 
 def set_pivot(df):
     """ set the pivot (reference) variables """
-    df.GENDER_TOPIC.replace('N', 'A', inplace=True)
-    df.GENDER_FIRST.replace('M', 'A', inplace=True)
-    df.GENDER_LAST.replace('M', 'A', inplace=True)
-    df.CONTINENT.replace('Northern America', 'AA', inplace=True)
+    for col, renames in PIVOTS.items():
+        df[col] = rename_levels(df[col], renames)
+    return set_categories(df)
+
+
+def set_categories(df):
+    """ store the categorical columns as categories with the levels of
+    `CATEGORIES` (sorted if not fixed), without the unused levels.
+
+    the plain string columns that the categories replace were sorted, so
+    the renamed pivots must come first in the fixed levels as well.
+    """
+    for col, levels in CATEGORIES.items():
+        if col not in df:
+            continue
+        values = df[col].astype('category')
+        observed = values.cat.remove_unused_categories().cat.categories
+        if levels is None:
+            levels = sorted(observed)
+        unknown = set(observed) - set(levels)
+        if unknown:
+            raise ValueError(f'{col}: unknown levels {sorted(unknown)}')
+        df[col] = values.cat.set_categories(levels) \
+            .cat.remove_unused_categories()
     return df
 
 
 def set_first_last_gender_var(df):
     ''' create a varialbe for first + last author's gender '''
-    df['GENDER_FL'] = df.GENDER_FIRST + df.GENDER_LAST
-    return df
+    first, last = df.GENDER_FIRST.cat, df.GENDER_LAST.cat
+    levels = [a + b for a in first.categories for b in last.categories]
+    codes = first.codes.values * len(last.categories) + last.codes.values
+    codes[(first.codes.values < 0) | (last.codes.values < 0)] = -1
+    df['GENDER_FL'] = pd.Categorical.from_codes(codes, levels)
+    return set_categories(df)
 
 
 def add_combined_covariates(df):
@@ -47,34 +114,56 @@ def add_combined_covariates(df):
 
 
 def add_dep_vars(df):
-    ''' adding SR, SR_M, SR_F, and SR_B variables '''
-    df['SRA'] = df.GENDER_TOPIC.replace(dict(A=0, B=1, M=1, F=1),
-                                        inplace=False)
-    df['SRM'] = df.GENDER_TOPIC.replace(dict(A=0, B=1, M=1, F=0),
-                                        inplace=False)
-    df['SRF'] = df.GENDER_TOPIC.replace(dict(A=0, B=1, M=0, F=1),
-                                        inplace=False)
-    df['SRB'] = df.GENDER_TOPIC.replace(dict(A=0, B=1, M=0, F=0),
-                                        inplace=False)
+    ''' adding SR, SR_M, SR_F, and SR_B variables (int8), looked up by the
+    GENDER_TOPIC codes '''
+    topic = df.GENDER_TOPIC.cat
+    if (topic.codes.values < 0).any():
+        raise ValueError('GENDER_TOPIC has missing values')
+    for dv, values in DEP_VARS.items():
+        lookup = np.array([values[level] for level in topic.categories],
+                          dtype=np.int8)
+        df[dv] = lookup[topic.codes.values]
+    return df
+
+
+def downcast_numbers(df):
+    """ store the integer columns as int32 and the float columns as float32
+    where no value changes """
+    int32 = np.iinfo(np.int32)
+    for col in df.select_dtypes(include='int64'):
+        values = df[col].values
+        if len(values) and int32.min <= values.min() and \
+                values.max() <= int32.max:
+            df[col] = values.astype(np.int32)
+    for col in df.select_dtypes(include='float64'):
+        values = df[col].values
+        downcast = values.astype(np.float32)
+        if ((downcast == values) | np.isnan(values)).all():
+            df[col] = downcast
     return df
 
 
 def pre_process(df):
     ''' pre-processing the data '''
     df = remove_comma_in_subdiscipline(df)
-    logging.info('a comma from the subdiscipline variable removed.')
+    telemetry.checkpoint('a comma from the subdiscipline variable removed.')
 
     df = set_pivot(df)
-    logging.info('pivot variables are set up.')
+    telemetry.checkpoint('pivot variables are set up.')
 
     df = set_first_last_gender_var(df)
-    logging.info('first + last author gender variable generated.')
+    telemetry.checkpoint('first + last author gender variable generated.')
 
     df = add_combined_covariates(df)
-    logging.info('combined covariates generated.')
+    telemetry.checkpoint('combined covariates generated.')
 
     df = add_dep_vars(df)
-    logging.info('dependent variables are added.')
+    telemetry.checkpoint('dependent variables are added.')
+
+    df = downcast_numbers(df)
+    telemetry.checkpoint('numeric columns downcast.')
+    logging.info('memory usage: {:.1f} MB'.format(
+        df.memory_usage(deep=True).sum() / 2 ** 20))
 
     logging.info('# of rows without mesh var: {}'.format(
         df.F_FIRST_MESH.isna().sum()))
@@ -86,16 +175,19 @@ def pre_process(df):
 
 def main(data_f, reg_table_f):
     """ run regressions and write the results """
-    df = pd.read_csv(data_f)
-    logging.info('data loaded (N = {}).'.format(len(df)))
+    df = load_table(data_f)
+    telemetry.checkpoint('data loaded.', rows=len(df))
 
     df = pre_process(df)
-    logging.info('data processed')
+    telemetry.checkpoint('data processed.', rows=len(df))
 
-    df.to_csv(reg_table_f, index=False)
+    save_table(df, reg_table_f)
+    telemetry.checkpoint('regression table saved.', rows=len(df))
 
 
 if __name__ == "__main__":
     MULTI_AUTHOR_DATA = sys.argv[1]
     REG_TABLE = sys.argv[2]
-    main(MULTI_AUTHOR_DATA, REG_TABLE)
+    telemetry.start('prepare_reg_table', REG_TABLE)
+    run_stage(partial(main, MULTI_AUTHOR_DATA, REG_TABLE),
+              inputs=[MULTI_AUTHOR_DATA], outputs=[REG_TABLE])
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+""" bootstrap and permutation inference of logit models.
+
+the replicates of a model are refits on the same encoded design matrix:
+
+    - cluster bootstrap: clusters (e.g. venues) are drawn with replacement,
+    and each row is weighted by the number of draws of its cluster.
+    - permutation test: the rows of the tested columns (e.g. the GENDER_FL
+    dummies) are permuted, which breaks their association with the outcome
+    while keeping the other covariates. the p-value of a coefficient is the
+    share of the permutations with a larger coefficient (in absolute value)
+    than the full-sample one.
+
+a replicate only changes the row weights or the tested columns, so the design
+matrix is never copied; it is shared by the forked worker processes, and each
+fit is a weighted Newton's method warm started from the full-sample
+coefficients.
+
+"""
+import logging
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+
+logger = logging.getLogger(__name__)
+
+REPLICATES_PER_TASK = 10
+RESAMPLING_COLUMNS = ['coef', 'boot_se', 'boot_ci_low', 'boot_ci_high',
+                      'perm_pvalue']
+
+# the state of the model being resampled (design matrix, outcome, start,
+# clusters, and tested columns). it is set before the pool is created, so
+# that forked workers share the parent's copy.
+_STATE = None
+
+
+def logit_newton(X, y, weights=None, start=None, replace=None, maxiter=35,
+                 tol=1e-8):
+    """ maximum likelihood of a logit model with frequency `weights` by
+    Newton's method, starting from `start` (zeros by default).
+
+    `replace` is an optional (columns, values) pair: the `columns` of `X` are
+    taken from the `values` array instead, without copying `X`.
+
+    returns (params, converged). the coefficients of the columns that are
+    zero in all the weighted rows (e.g. a level that a bootstrap sample does
+    not draw) are not identified; they are NaN.
+    """
+    k = X.shape[1]
+    weights = np.ones(len(y)) if weights is None else weights
+    params = np.zeros(k) if start is None else np.array(start, dtype=float)
+    for _ in range(maxiter):
+        if replace is None:
+            eta = X @ params
+        else:
+            cols, values = replace
+            eta = X @ params - X[:, cols] @ params[cols] + \
+                values @ params[cols]
+        p = expit(eta)
+        w = weights * p * (1 - p)
+        score = X.T @ (weights * (y - p))
+        info = (X * w[:, None]).T @ X
+        if replace is not None:
+            # the rows and columns of the replaced columns
+            cross = X.T @ (values * w[:, None])
+            cross[cols] = values.T @ (values * w[:, None])
+            info[:, cols] = cross
+            info[cols, :] = cross.T
+            score[cols] = values.T @ (weights * (y - p))
+        # the coefficients of absent columns stay where they are
+        absent = np.diag(info) == 0
+        info[absent, absent] = 1
+        try:
+            step = np.linalg.solve(info, score)
+        except np.linalg.LinAlgError:
+            return params, False
+        params = params + step
+        if np.abs(step).max() < tol:
+            return np.where(absent, np.nan, params), True
+    return params, False
+
+
+def cluster_codes(clusters):
+    """ integer codes of the cluster labels; rows without a label are their
+    own clusters. returns (codes, number of clusters). """
+    codes, uniques = pd.factorize(clusters)
+    missing = codes < 0
+    codes[missing] = len(uniques) + np.arange(missing.sum())
+    return codes, len(uniques) + missing.sum()
+
+
+def _replicate(task):
+    """ fit one replicate: ('bootstrap' or 'permutation', seed) """
+    kind, seed = task
+    X, y, start, codes, n_clusters, test_cols = _STATE
+    rng = np.random.RandomState(seed)
+    if kind == 'bootstrap':
+        draws = np.bincount(rng.randint(n_clusters, size=n_clusters),
+                            minlength=n_clusters)
+        return logit_newton(X, y, draws[codes].astype(float), start)
+    perm = rng.permutation(len(y))
+    return logit_newton(X, y, start=start,
+                        replace=(test_cols, X[perm[:, None], test_cols]))
+
+
+def _run_tasks(tasks):
+    return [_replicate(task) for task in tasks]
+
+
+def _init_worker(state):
+    """ set the model state in workers that were not forked """
+    global _STATE
+    if state is not None:
+        _STATE = state
+
+
+def run_replicates(tasks, n_workers=1):
+    """ fit the replicates of the current state; returns the parameters of
+    the replicates that converged, for each kind """
+    batches = [tasks[i:i + REPLICATES_PER_TASK]
+               for i in range(0, len(tasks), REPLICATES_PER_TASK)]
+    if n_workers <= 1:
+        fits = [_run_tasks(batch) for batch in batches]
+    else:
+        forked = multiprocessing.get_start_method() == 'fork'
+        pool = multiprocessing.Pool(n_workers, initializer=_init_worker,
+                                    initargs=(None if forked else _STATE,))
+        try:
+            fits = pool.map(_run_tasks, batches)
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    params = {}
+    for (kind, _), (fit, converged) in zip(tasks, sum(fits, [])):
+        params.setdefault(kind, [])
+        if converged:
+            params[kind].append(fit)
+    for kind, kind_params in params.items():
+        n_tasks = sum(task[0] == kind for task in tasks)
+        if len(kind_params) < n_tasks:
+            logger.warning('%d of %d %s replicates did not converge; '
+                           'dropped.', n_tasks - len(kind_params), n_tasks,
+                           kind)
+    return {kind: np.array(kind_params)
+            for kind, kind_params in params.items() if kind_params}
+
+
+def resample_logit(X, y, columns, clusters=None, test_columns=(),
+                   n_bootstrap=0, n_permutations=0, n_workers=1, seed=0,
+                   alpha=.05):
+    """ bootstrap and permutation statistics of a logit model.
+
+    `X` and `y` are the design matrix and outcome of the model, `columns` the
+    names of the columns of `X`. the bootstrap draws the `clusters` (labels
+    of the rows; each row is a cluster if None); the permutation test permutes
+    the `test_columns` (names) jointly.
+
+    returns a dataframe indexed by the columns with the full-sample
+    coefficient, the bootstrap standard error and percentile confidence
+    interval, and the permutation p-value (NaN for the other columns).
+    """
+    global _STATE
+    y = np.asarray(y, dtype=float)
+    start, converged = logit_newton(X, y)
+    if not converged:
+        logger.warning('the full-sample fit did not converge.')
+    if clusters is None:
+        codes, n_clusters = np.arange(len(y)), len(y)
+    else:
+        codes, n_clusters = cluster_codes(clusters)
+    test_cols = np.array([i for i, col in enumerate(columns)
+                          if col in test_columns], dtype=int)
+
+    tasks = [('bootstrap', seed + i) for i in range(n_bootstrap)]
+    if len(test_cols):
+        tasks += [('permutation', seed + n_bootstrap + i)
+                  for i in range(n_permutations)]
+    _STATE = X, y, start, codes, n_clusters, test_cols
+    try:
+        params = run_replicates(tasks, n_workers)
+    finally:
+        _STATE = None
+
+    result = pd.DataFrame(np.nan, index=columns, columns=RESAMPLING_COLUMNS)
+    result['coef'] = start
+    boot = params.get('bootstrap')
+    if boot is not None:
+        # the replicates where a coefficient was not identified are skipped
+        result['boot_se'] = np.nanstd(boot, axis=0, ddof=1)
+        result['boot_ci_low'] = np.nanpercentile(boot, 100 * alpha / 2,
+                                                 axis=0)
+        result['boot_ci_high'] = np.nanpercentile(
+            boot, 100 * (1 - alpha / 2), axis=0)
+    perm = params.get('permutation')
+    if perm is not None:
+        extreme = (np.abs(perm[:, test_cols]) >=
+                   np.abs(start[test_cols])).sum(axis=0)
+        result.iloc[test_cols, RESAMPLING_COLUMNS.index('perm_pvalue')] = \
+            (1 + extreme) / (1 + len(perm))
+    return result
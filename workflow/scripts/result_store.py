@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+""" result store of the regression models (an SQLite file).
+
+run_regression.py writes the results of all the models, in the order of the
+specification file, into one file with two tables:
+
+    - models: one row per model; its specification (family, dv, formula,
+    sample, year, absorbed columns), the labeled dv, the fit statistics
+    (those that the family has; NULL otherwise), the residual diagnostics of
+    the OLS models, the time of the fit, and the summary table
+    (`summary().as_csv()`).
+    - coefficients: one row per model term; the labeled term, the
+    coefficient, standard error, test statistic, p-value, and confidence
+    interval, and the odds ratio and its interval for the logit models.
+
+the labels (see labels.py) are applied when the results are written. the
+coefficients are indexed by model and by term, so the coefficients of any
+set of models (e.g. all the GENDER_FL terms) are one query; the cleaned
+result tables are built from these two tables by export_results.py. the
+stores of models fitted by separate jobs are gathered into one
+(`read_records`; see gather_results.py).
+
+"""
+import os
+import time
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+from statsmodels.stats.stattools import (durbin_watson, jarque_bera,
+                                         omni_normtest)
+
+from labels import dv_label, variable_label
+
+RESULT_STORE = '../results/results.sqlite'
+FIT_STATS = ['nobs', 'df_model', 'df_resid', 'llf', 'llnull', 'llr_pvalue',
+             'prsquared', 'rsquared', 'rsquared_adj', 'fvalue', 'f_pvalue',
+             'aic', 'bic']
+# the residual diagnostics of the OLS summary tables
+DIAGNOSTICS = ['omnibus', 'omnibus_pvalue', 'skew', 'kurtosis',
+               'durbin_watson', 'jarque_bera', 'jb_pvalue', 'condition_number']
+FITTED_FORMAT = '%Y-%m-%d %H:%M:%S'  # local time
+MODEL_COLUMNS = ([('name', 'TEXT PRIMARY KEY'), ('family', 'TEXT'),
+                  ('dv', 'TEXT'), ('dv_label', 'TEXT'), ('formula', 'TEXT'),
+                  ('sample', 'TEXT'), ('year', 'INTEGER'),
+                  ('absorb', 'TEXT')] +
+                 [(stat, 'REAL') for stat in FIT_STATS + DIAGNOSTICS] +
+                 [('converged', 'INTEGER'), ('fitted', 'TEXT'),
+                  ('summary', 'TEXT')])
+COEFFICIENT_COLUMNS = [('name', 'TEXT'), ('position', 'INTEGER'),
+                       ('variable', 'TEXT'), ('label', 'TEXT'),
+                       ('coef', 'REAL'), ('std_err', 'REAL'),
+                       ('statistic', 'REAL'), ('pvalue', 'REAL'),
+                       ('ci_low', 'REAL'), ('ci_high', 'REAL'),
+                       ('odds_ratio', 'REAL'), ('or_ci_low', 'REAL'),
+                       ('or_ci_high', 'REAL')]
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS models ({})'.format(
+        ', '.join(f'{col} {kind}' for col, kind in MODEL_COLUMNS)),
+    'CREATE TABLE IF NOT EXISTS coefficients ({}, '
+    'PRIMARY KEY (name, position))'.format(
+        ', '.join(f'{col} {kind}' for col, kind in COEFFICIENT_COLUMNS)),
+    'CREATE INDEX IF NOT EXISTS coefficients_variable '
+    'ON coefficients (variable)']
+
+
+def _value(value):
+    """ a plain python value (sqlite and json cannot store numpy types) """
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def ols_diagnostics(result):
+    """ the residual diagnostics of an OLS result, as its summary table
+    computes them """
+    jb, jb_pvalue, skew, kurtosis = jarque_bera(result.wresid)
+    omnibus, omnibus_pvalue = omni_normtest(result.wresid)
+    return {'omnibus': omnibus, 'omnibus_pvalue': omnibus_pvalue,
+            'skew': skew, 'kurtosis': kurtosis,
+            'durbin_watson': durbin_watson(result.wresid),
+            'jarque_bera': jb, 'jb_pvalue': jb_pvalue,
+            'condition_number': result.condition_number}
+
+
+def result_records(model, formula, result, summary):
+    """ the rows of a fitted model: {'model': row of the models table,
+    'coefficients': rows of the coefficients table (without the name)}.
+    `summary` is the summary table of the result. """
+    row = {'name': model['name'], 'family': model['family'],
+           'dv': model['dv'], 'dv_label': dv_label(model['dv']),
+           'formula': formula, 'sample': model['sample'],
+           'year': model['year'],
+           'absorb': ', '.join(model.get('absorb', [])) or None}
+    for stat in FIT_STATS:
+        row[stat] = _value(getattr(result, stat, None))
+    retvals = getattr(result, 'mle_retvals', None)
+    row['converged'] = None if retvals is None else \
+        int(retvals['converged'])
+    diagnostics = ols_diagnostics(result) if model['family'] == 'ols' \
+        else {}
+    for stat in DIAGNOSTICS:
+        row[stat] = _value(diagnostics.get(stat))
+    row['fitted'] = time.strftime(FITTED_FORMAT)
+    row['summary'] = summary
+
+    ci = np.asarray(result.conf_int())
+    columns = [np.asarray(values, dtype=float) for values in
+               [result.params, result.bse, result.tvalues, result.pvalues,
+                ci[:, 0], ci[:, 1]]]
+    if model['family'] == 'logit':
+        columns += list(np.exp([columns[0], columns[4], columns[5]]))
+    else:
+        columns += [np.full(len(columns[0]), np.nan)] * 3
+    coefficients = []
+    for position, variable in enumerate(result.model.exog_names):
+        values = [float(values[position]) for values in columns]
+        coefficients.append(dict(
+            zip([col for col, _ in COEFFICIENT_COLUMNS[4:]], values),
+            position=position, variable=variable,
+            label=variable_label(variable)))
+    return {'model': row, 'coefficients': coefficients}
+
+
+def save_records(records, path=RESULT_STORE):
+    """ write a result store of the models' records (see `result_records`),
+    in order. the file is replaced at once. """
+    model_cols = [col for col, _ in MODEL_COLUMNS]
+    coef_cols = [col for col, _ in COEFFICIENT_COLUMNS]
+    tmp_path = f'{path}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with closing(sqlite3.connect(tmp_path)) as conn, conn:
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.executemany('INSERT INTO models ({}) VALUES ({})'.format(
+            ', '.join(model_cols), ', '.join('?' * len(model_cols))),
+            [[record['model'][col] for col in model_cols]
+             for record in records])
+        conn.executemany('INSERT INTO coefficients ({}) VALUES ({})'.format(
+            ', '.join(coef_cols), ', '.join('?' * len(coef_cols))),
+            [[record['model']['name']] + [row[col] for col in coef_cols[1:]]
+             for record in records for row in record['coefficients']])
+    os.replace(tmp_path, path)
+
+
+def read_records(path=RESULT_STORE):
+    """ the records of the models of a result store (see `result_records`),
+    in order """
+    with closing(sqlite3.connect(path)) as conn:
+        conn.row_factory = sqlite3.Row
+        models = conn.execute('SELECT * FROM models ORDER BY rowid')
+        records = {row['name']: {'model': dict(row), 'coefficients': []}
+                   for row in models}
+        for row in conn.execute('SELECT * FROM coefficients '
+                                'ORDER BY name, position'):
+            coefficient = dict(row)
+            records[coefficient.pop('name')]['coefficients'].append(
+                coefficient)
+    return list(records.values())
+
+
+def _query(path, query, params):
+    with closing(sqlite3.connect(path)) as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+def _where(conditions):
+    """ WHERE clause and parameters of (column, values) conditions; None
+    values are not filtered """
+    clauses = []
+    params = []
+    for col, values in conditions:
+        if values is None:
+            continue
+        values = list(values)
+        clauses.append('{} IN ({})'.format(col, ', '.join('?' * len(values))))
+        params += values
+    if not clauses:
+        return '', params
+    return ' WHERE ' + ' AND '.join(clauses), params
+
+
+def read_models(path=RESULT_STORE, names=None, summary=False):
+    """ the models table (of the models `names`, if given), without the
+    summary tables unless `summary` """
+    columns = [col for col, _ in MODEL_COLUMNS
+               if summary or col != 'summary']
+    where, params = _where([('name', names)])
+    return _query(path, 'SELECT {} FROM models{} ORDER BY rowid'.format(
+        ', '.join(columns), where), params)
+
+
+def read_coefficients(path=RESULT_STORE, names=None, variables=None):
+    """ the coefficients of the models `names` and the terms `variables`
+    (all if None), with the family and the labeled dv of their model """
+    where, params = _where([('c.name', names), ('c.variable', variables)])
+    return _query(path, 'SELECT c.*, m.family, m.dv_label '
+                  'FROM coefficients c JOIN models m ON m.name = c.name{} '
+                  'ORDER BY m.rowid, c.position'.format(where), params)
@@ -3,18 +3,80 @@
 
 """ This script runs the main models.
 
-input: multi-author data
+input: multi-author data, (optional) number of worker processes, (optional)
+logit backend ('statsmodels' or 'chunked'), (optional) number of bootstrap
+replicates, number of permutations, and bootstrap cluster column ('VENUE' or
+'MAIN_COUNTRY'), (optional) model specification file (default: models.yaml),
+(optional) names of the models to fit (comma separated; default: all) and
+result store (default: results/results.sqlite)
 
 output: tables and figures.
 
+the models are read from the specification file (see model_specs.py) and run
+as one batch. models with the same specification (but the name) are fitted
+once, and the result is copied. a subset of the models can be fitted by a
+separate job (e.g. one job per model, see the Snakefile), with its own result
+store; the stores are then gathered by gather_results.py.
+
+the models are independent, so they are fitted by a pool of worker processes
+when more than one worker is requested. each result file is written by the
+worker as soon as its model is fitted. the coefficients, fit statistics, and
+summary tables of all the models are then written to the result store
+(results/results.sqlite; see result_store.py).
+
+models with the same covariates share one design matrix, encoded once for the
+whole table and cached on disk (see design_matrix.py); the samples are row
+masks of it. the OLS models are assembled from cross products computed once
+per discipline x year cell (see ols_stats.py).
+
+with the 'chunked' logit backend, the sex reporting models are instead fitted
+by streaming the regression table in chunks (see chunked_logit.py), so that
+their design matrices are never held in memory.
+
+a model may absorb the fixed effects of high-cardinality columns (e.g.
+SUBDISCIPLINE or VENUE; 'absorb' in the specification) instead of encoding
+them as dummy columns (see fixed_effects.py). only the coefficients of its
+other covariates are estimated and reported. absorbed models are fitted in
+memory, without the cell statistics, and are not resampled.
+
+each result is also cached, keyed by the model specification, the content of
+the columns the model uses in the rows of its sample (and their levels), and
+the code (see stage_cache.py). when the table is rebuilt, only the models
+whose rows changed are fitted again; e.g. when the papers of a new year are
+appended (see ingest_delta.py), the OLS models of the other years are
+restored.
+
+if bootstrap replicates or permutations are requested, the sex reporting
+models are also resampled (see resampling.py): cluster bootstrap standard
+errors and confidence intervals of all coefficients, and permutation p-values
+of the GENDER_FL coefficients are written to results/resampling/.
+
 """
 
+import os
+import re
 import sys
+import json
+import shutil
+import hashlib
 import logging
+import multiprocessing
 
 import numpy as np
 import pandas as pd
-import statsmodels.formula.api as smf
+import statsmodels.api as sm
+
+from storage import load_table, iter_table, table_columns
+from stage_cache import cached_digests, code_digest
+from design_matrix import get_design_matrix, sample_design
+from ols_stats import get_cells, cell_stats, sum_cells, fit_ols
+from chunked_logit import ChunkedLogit
+from fixed_effects import absorbed_groups, fit_absorbed
+from resampling import resample_logit
+from model_specs import (MODEL_SPEC, RESULT_PATH, load_model_specs,
+                         result_path, spec_columns, absorbed_columns)
+from result_store import RESULT_STORE, result_records, save_records
+import telemetry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,73 +84,446 @@ logger = logging.getLogger(__name__)
 BR = 'Biomedical Research'
 CM = 'Clinical Medicine'
 HE = 'Health'
+SAMPLES = {'all': None, 'br': BR, 'cm': CM, 'he': HE}
+
+# the samples are unions of these cells; OLS statistics are kept per cell
+CELL_COLUMNS = ['DISCIPLINE', 'YEAR']
+
+DESIGN_CACHE_DIR = '../data/cache/design'
+MODEL_CACHE_DIR = '../data/cache/models'
+MODEL_CACHE_VERSION = 6
+FAMILIES = {'logit': sm.Logit, 'ols': sm.OLS}
+LOGIT_BACKENDS = ['statsmodels', 'chunked']
+
+RESAMPLING_PATH = '../results/resampling/{name}.csv'
+RESAMPLING_CLUSTERS = ['VENUE', 'MAIN_COUNTRY']
+PERMUTED_VARIABLE = 'GENDER_FL'
+
+# the regression table, the design matrices (rhs formula -> DesignMatrix),
+# and the OLS cell statistics ((rhs, dv) -> CellStats) used by the worker
+# processes. they are set before the pool is created, so that forked workers
+# share the parent's copy instead of receiving a pickled copy with every task.
+_REG_DF = None
+_DESIGNS = None
+_CELL_STATS = None
+# path of the regression table, streamed by the chunked logit backend
+_REG_TABLE_F = None
+
+
+def sample_mask(df, sample='all', year=None):
+    """ rows of a discipline sample ('all', 'br', 'cm', or 'he') and year """
+    mask = np.ones(len(df), dtype=bool)
+    if SAMPLES[sample] is not None:
+        mask &= (df.DISCIPLINE == SAMPLES[sample]).values
+    if year is not None:
+        mask &= (df.YEAR == year).values
+    return mask
+
+
+def load_models(model_spec_f=MODEL_SPEC):
+    """ the model specifications of the file """
+    models = load_model_specs(model_spec_f)
+    for model in models:
+        if model['family'] not in FAMILIES:
+            raise ValueError(f'{model["name"]}: unknown family '
+                             f'{model["family"]}')
+        if model['sample'] not in SAMPLES:
+            raise ValueError(f'{model["name"]}: unknown sample '
+                             f'{model["sample"]}')
+        if 'absorb' in model:
+            model['absorb'] = absorbed_columns(model)
+            in_formula = spec_columns([dict(model, absorb=None)],
+                                      model['absorb'])
+            if in_formula:
+                raise ValueError(f'{model["name"]}: absorbed columns in the '
+                                 f'formula {in_formula}')
+    return models
 
 
-def run_model(model):
+def reg_columns(models, reg_table_f):
+    """ the columns of the table used by the models and the samples """
+    return used_columns(models, table_columns(reg_table_f))
+
+
+def used_columns(models, columns):
+    """ the `columns` used by the models and the samples """
+    used = spec_columns(models, columns)
+    return [col for col in columns if col in CELL_COLUMNS or col in used]
+
+
+def get_rhs(model):
+    """ right-hand side of the patsy formula of a model specification """
+    return ' + '.join(model['ivs'])
+
+
+def get_formula(model):
+    """ patsy formula of a model specification """
+    return '{} ~ {}'.format(model['dv'], get_rhs(model))
+
+
+def load_designs(models, df, input_digest=None, cache_dir=None):
+    """ the design matrix of each distinct right-hand side of the models """
+    return {rhs: get_design_matrix(df, rhs, input_digest, cache_dir)
+            for rhs in sorted({get_rhs(model) for model in models})}
+
+
+def load_cell_stats(models, df, designs):
+    """ cross products per cell for each (rhs, dv) of the OLS models """
+    all_cell_ids, cells = get_cells(df, CELL_COLUMNS)
+    stats = {}
+    for model in models:
+        key = (get_rhs(model), model['dv'])
+        if model['family'] != 'ols' or 'absorb' in model or key in stats:
+            continue
+        design = designs[key[0]]
+        y = df[model['dv']].values[design.rows].astype(float)
+        cell_ids = np.where(np.isnan(y), -1, all_cell_ids[design.rows])
+        stats[key] = cell_stats(design.X, np.nan_to_num(y), cell_ids, cells)
+        telemetry.checkpoint('cell statistics computed: {} ~ {}'.format(
+            *key[::-1]), rows=len(y))
+    return stats
+
+
+def run_chunked_model(model, reg_table_f):
+    """ fit a logit model by streaming the regression table in chunks """
+    logger.info('model: %s (%s, chunked)', get_formula(model), model['name'])
+
+    def sample_chunks():
+        for df in iter_table(reg_table_f,
+                             columns=reg_columns([model], reg_table_f)):
+            yield df[sample_mask(df, model['sample'], model['year'])]
+
+    result = ChunkedLogit(get_formula(model), sample_chunks).fit()
+    telemetry.checkpoint(f'model fitted: {model["name"]}.',
+                         rows=result.nobs)
+    return result
+
+
+def run_model(model, df, designs, all_cell_stats=None, reg_table_f=None):
     """ run a model based on the specification """
-    iv_str = ' + '.join(model['ivs'])
-    dep_var = model['dv']
-    model_formula = f'{dep_var} ~ {iv_str}'
-    logger.info('model: %s', model_formula)
+    if model.get('backend') == 'chunked':
+        return run_chunked_model(model, reg_table_f)
+    logger.info('model: %s (%s)', get_formula(model), model['name'])
+
+    mask = sample_mask(df, model['sample'], model['year'])
+    mask &= df[model['dv']].notnull().values
+    for col in model.get('absorb', []):
+        mask &= df[col].notnull().values
+    design = sample_design(designs[get_rhs(model)], mask)
+    endog = pd.Series(df[model['dv']].values[design.rows].astype(float),
+                      name=model['dv'])
+    exog = pd.DataFrame(design.X, columns=design.columns)
 
-    result = smf.logit(model_formula, data=model['data']).fit()
-    logger.info('model fitted.')
+    stats_key = (get_rhs(model), model['dv'])
+    if 'absorb' in model:
+        result = fit_absorbed(
+            model['family'], endog, exog,
+            absorbed_groups(df, model['absorb'], design.rows))
+    elif model['family'] == 'ols' and stats_key in (all_cell_stats or {}):
+        stats = all_cell_stats[stats_key]
+        selected = sample_mask(stats.cells, model['sample'], model['year'])
+        XtX, Xty = sum_cells(stats, selected, design.keep)
+        result = fit_ols(endog, exog, XtX, Xty)
+    else:
+        result = FAMILIES[model['family']](endog, exog).fit()
+    telemetry.checkpoint(f'model fitted: {model["name"]}.', rows=len(endog))
     return result
 
 
-def run_sr_models(all_df):
-    """ run sex reporting models """
-    br_df = all_df[all_df.DISCIPLINE == BR]
-    cm_df = all_df[all_df.DISCIPLINE == CM]
-    he_df = all_df[all_df.DISCIPLINE == HE]
+def save_result(model, result):
+    """ write the summary table of a fitted model; returns the records of
+    the model for the result store """
+    summary = result.summary().as_csv()
+    with open(result_path(model), 'w') as fout:
+        fout.write(summary)
+    return result_records(model, get_formula(model), result, summary)
+
+
+def model_columns(model, df):
+    """ columns of `df` that the model uses (incl. the sample filters) """
+    formula = get_formula(model)
+    return [col for col in df.columns
+            if col in CELL_COLUMNS or re.search(rf'\b{col}\b', formula) or
+            col in model.get('absorb', [])]
+
+
+def column_digest(column, mask=None):
+    """ digest of the values of a column (in the rows of `mask`), and of its
+    levels if it is categorical """
+    if mask is not None:
+        column = column[mask]
+    hashed = pd.util.hash_pandas_object(column, index=False).values
+    digest = hashlib.sha1(hashed.tobytes())
+    if column.dtype.name == 'category':
+        digest.update(json.dumps(
+            [str(level) for level in column.cat.categories]).encode())
+    return digest.hexdigest()
+
+
+def model_keys(models, df):
+    """ result cache key of each model (name -> key) """
+    code = code_digest()
+    digests = {}
+    keys = {}
+    for model in models:
+        columns = model_columns(model, df)
+        rows = (model['sample'], model['year'])
+        mask = sample_mask(df, *rows)
+        for col in columns:
+            if (col, rows) not in digests:
+                digests[col, rows] = column_digest(df[col], mask)
+        spec = {k: v for k, v in model.items()
+                if k not in ['name', 'output']}
+        key = json.dumps([MODEL_CACHE_VERSION, spec,
+                          [digests[col, rows] for col in columns], code],
+                         sort_keys=True)
+        keys[model['name']] = hashlib.sha1(key.encode()).hexdigest()
+    return keys
 
-    ivs = ['GENDER_FL', 'YEAR', 'np.log2(N_AUTHORS)', 'CONTINENT', 'F_MESH',
-           'F_COUNTRY', 'SUBDISCIPLINE']
-    models = [{'name': 'sra_all', 'dv': 'SRA', 'ivs': ivs, 'data': all_df},
-              {'name': 'sra_br', 'dv': 'SRA', 'ivs': ivs, 'data': br_df},
-              {'name': 'sra_cm', 'dv': 'SRA', 'ivs': ivs, 'data': cm_df},
-              {'name': 'sra_he', 'dv': 'SRA', 'ivs': ivs, 'data': he_df},
-              {'name': 'srm_all', 'dv': 'SRM', 'ivs': ivs, 'data': all_df},
-              {'name': 'srf_all', 'dv': 'SRF', 'ivs': ivs, 'data': all_df},
-              {'name': 'srb_all', 'dv': 'SRB', 'ivs': ivs, 'data': all_df}]
 
+def restore_results(models, keys, cache_dir):
+    """ copy the cached results in place; returns the models to fit and the
+    records of the restored ones (name -> records) """
+    to_fit = []
+    records = {}
     for model in models:
-        with open('../results/SR_{}.csv'.format(model['name']), 'w') as fout:
-            result = run_model(model)
-            fout.write(result.summary().as_csv())
+        cached_f = os.path.join(cache_dir, keys[model['name']])
+        if os.path.exists(f'{cached_f}.csv') and \
+                os.path.exists(f'{cached_f}.json'):
+            shutil.copyfile(f'{cached_f}.csv', result_path(model))
+            with open(f'{cached_f}.json') as fin:
+                records[model['name']] = rename_records(json.load(fin),
+                                                        model['name'])
+            logger.info('%s restored from the cache.', model['name'])
+        else:
+            to_fit.append(model)
+    return to_fit, records
+
+
+def store_result(model, keys, cache_dir, records):
+    """ copy a saved result and its records to the cache """
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_f = os.path.join(cache_dir, keys[model['name']])
+    with open(f'{cached_f}.json.tmp', 'w') as fout:
+        json.dump(records, fout)
+    os.replace(f'{cached_f}.json.tmp', f'{cached_f}.json')
+    shutil.copyfile(result_path(model), f'{cached_f}.csv.tmp')
+    os.replace(f'{cached_f}.csv.tmp', f'{cached_f}.csv')
+
+
+def unique_models(models, keys):
+    """ the first model of each specification, and the other models with
+    the same specification (name -> models) """
+    first = {}
+    duplicates = {}
+    for model in models:
+        key = keys[model['name']]
+        if key in first:
+            duplicates.setdefault(first[key]['name'], []).append(model)
+        else:
+            first[key] = model
+    return list(first.values()), duplicates
+
+
+def rename_records(records, name):
+    """ the records of a model under another name """
+    return dict(records, model=dict(records['model'], name=name))
+
 
+def copy_duplicates(model, duplicates, records):
+    """ copy the result of a model to the models with the same spec; returns
+    the records of all of them (name -> records) """
+    copied = {model['name']: records}
+    for duplicate in duplicates.get(model['name'], []):
+        shutil.copyfile(result_path(model), result_path(duplicate))
+        copied[duplicate['name']] = rename_records(records,
+                                                   duplicate['name'])
+    return copied
+
+
+def load_reg_table(reg_table_f, models, extra_columns=()):
+    """ load the columns used by the models (and the `extra_columns`).
+    string columns are stored as categories, which are compact and shared
+    well by forked workers. """
+    df = load_table(reg_table_f, columns=reg_columns(models, reg_table_f) +
+                    list(extra_columns))
+    return strings_as_categories(df)
+
+
+def strings_as_categories(df):
+    """ the dataframe with its string columns as categories """
+    strings = df.select_dtypes(include='object').columns
+    return df.assign(**{col: df[col].astype('category') for col in strings})
+
+
+def _init_worker(models, reg_table_f, cache_dir):
+    """ load the regression table and the (cached) design matrices in workers
+    that were not forked """
+    global _REG_DF, _DESIGNS, _CELL_STATS, _REG_TABLE_F
+    _REG_TABLE_F = reg_table_f
+    if _REG_DF is None:
+        _REG_DF = load_reg_table(reg_table_f, models)
+        _DESIGNS = load_designs(models, _REG_DF,
+                                cached_digests([reg_table_f])[0], cache_dir)
+        _CELL_STATS = load_cell_stats(models, _REG_DF, _DESIGNS)
+
+
+def _run_and_save(model):
+    return model['name'], save_result(
+        model, run_model(model, _REG_DF, _DESIGNS, _CELL_STATS,
+                         _REG_TABLE_F))
+
+
+def run_models(models, df, n_workers=1, reg_table_f=None,
+               cache_dir=DESIGN_CACHE_DIR, logit_backend='statsmodels',
+               model_cache_dir=MODEL_CACHE_DIR):
+    """ fit the models and save the results, with `n_workers` processes.
+
+    the design matrices are cached in `cache_dir` if the table was loaded
+    from `reg_table_f`. the 'chunked' `logit_backend` streams the table from
+    `reg_table_f` to fit the logit models. the results are cached in
+    `model_cache_dir` (None disables the cache).
+
+    returns the records of the models for the result store (name -> records).
+    """
+    global _REG_DF, _DESIGNS, _CELL_STATS, _REG_TABLE_F
+    if logit_backend not in LOGIT_BACKENDS:
+        raise ValueError(f'unknown logit backend: {logit_backend}')
+    if logit_backend == 'chunked':
+        if reg_table_f is None:
+            raise ValueError('the chunked backend needs the table file')
+        models = [dict(model, backend='chunked')
+                  if model['family'] == 'logit' and 'absorb' not in model
+                  else model for model in models]
+    keys = model_keys(models, df)
+    records = {}
+    if model_cache_dir is not None:
+        models, records = restore_results(models, keys, model_cache_dir)
+    models, duplicates = unique_models(models, keys)
+    if not models:
+        return records
+    in_memory = [model for model in models if 'backend' not in model]
+    input_digest = cached_digests([reg_table_f])[0] if reg_table_f else None
+    designs = load_designs(in_memory, df, input_digest, cache_dir)
+    all_cell_stats = load_cell_stats(in_memory, df, designs)
+    if n_workers <= 1:
+        for model in models:
+            model_records = save_result(model, run_model(
+                model, df, designs, all_cell_stats, reg_table_f))
+            records.update(copy_duplicates(model, duplicates, model_records))
+            if model_cache_dir is not None:
+                store_result(model, keys, model_cache_dir, model_records)
+        return records
+
+    _REG_DF, _DESIGNS, _CELL_STATS = df, designs, all_cell_stats
+    _REG_TABLE_F = reg_table_f
+    pool = multiprocessing.Pool(n_workers, initializer=_init_worker,
+                                initargs=(in_memory, reg_table_f, cache_dir))
+    try:
+        by_name = {model['name']: model for model in models}
+        for name, model_records in pool.imap_unordered(_run_and_save,
+                                                       models):
+            telemetry.checkpoint(f'{name} saved.')
+            records.update(copy_duplicates(by_name[name], duplicates,
+                                           model_records))
+            if model_cache_dir is not None:
+                store_result(by_name[name], keys, model_cache_dir,
+                             model_records)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        _REG_DF, _DESIGNS, _CELL_STATS, _REG_TABLE_F = None, None, None, None
+    return records
+
+
+def run_resampling(models, df, n_bootstrap=0, n_permutations=0,
+                   cluster='VENUE', n_workers=1, reg_table_f=None,
+                   cache_dir=DESIGN_CACHE_DIR):
+    """ bootstrap (clustered by the `cluster` column) and permutation
+    (of GENDER_FL) statistics of the logit models; written to
+    RESAMPLING_PATH """
+    if cluster not in RESAMPLING_CLUSTERS:
+        raise ValueError(f'unknown bootstrap cluster: {cluster}')
+    models = [model for model in models
+              if model['family'] == 'logit' and 'absorb' not in model]
+    input_digest = cached_digests([reg_table_f])[0] if reg_table_f else None
+    designs = load_designs(models, df, input_digest, cache_dir)
+    os.makedirs(os.path.dirname(RESAMPLING_PATH), exist_ok=True)
+    for model in models:
+        mask = sample_mask(df, model['sample'], model['year'])
+        mask &= df[model['dv']].notnull().values
+        design = sample_design(designs[get_rhs(model)], mask)
+        result = resample_logit(
+            design.X, df[model['dv']].values[design.rows], design.columns,
+            clusters=df[cluster].values[design.rows],
+            test_columns=[col for col in design.columns
+                          if col.startswith(f'{PERMUTED_VARIABLE}[')],
+            n_bootstrap=n_bootstrap, n_permutations=n_permutations,
+            n_workers=n_workers)
+        result.to_csv(RESAMPLING_PATH.format(name=model['name']),
+                      index_label='variable')
+        telemetry.checkpoint(f'{model["name"]} resampled.',
+                             rows=len(design.rows))
 
-def run_jif_models(all_df):
-    """ journal impact factor models """
-    br_df = all_df[all_df.DISCIPLINE == BR]
-    cm_df = all_df[all_df.DISCIPLINE == CM]
-    he_df = all_df[all_df.DISCIPLINE == HE]
-    years = [2008, 2010, 2012, 2014, 2016]
-    jif_model = ('IF ~ GENDER_TOPIC + GENDER_FIRST + GENDER_LAST '
-                 '+ np.log2(N_AUTHORS) + CONTINENT + SUBDISCIPLINE')
 
-    def run_and_save(df, model_name='IF_all'):
-        for year in years:
-            result = smf.ols(jif_model, data=df[df.YEAR == year]).fit()
-            with open(f'../results/{model_name}_{year}.csv', 'w') as fout:
-                fout.write(result.summary().as_csv())
+def select_models(models, names):
+    """ the models `names` (all if None), in the order of `models` """
+    if names is None:
+        return models
+    unknown = set(names) - {model['name'] for model in models}
+    if unknown:
+        raise ValueError(f'unknown models: {sorted(unknown)}')
+    return [model for model in models if model['name'] in names]
 
-    run_and_save(df=all_df, model_name='IF_all')
-    run_and_save(df=br_df, model_name='IF_br')
-    run_and_save(df=cm_df, model_name='IF_cm')
-    run_and_save(df=he_df, model_name='IF_he')
 
+def main(reg_table_f, n_workers=1, logit_backend='statsmodels',
+         n_bootstrap=0, n_permutations=0, cluster='VENUE',
+         model_spec_f=MODEL_SPEC, result_store_f=RESULT_STORE, names=None):
+    """ run regressions (of the models `names`, if given) and write the
+    results (and the result store) """
+    models = select_models(load_models(model_spec_f), names)
+    resample = n_bootstrap > 0 or n_permutations > 0
+    all_df = load_reg_table(reg_table_f, models,
+                            [cluster] if resample else [])
+    telemetry.checkpoint('data loaded.', rows=len(all_df))
+    fit_and_save(models, all_df, n_workers, reg_table_f, logit_backend,
+                 n_bootstrap, n_permutations, cluster, result_store_f)
 
-def main(reg_table_f, result_files):
-    """ run regressions and write the results """
-    all_df = pd.read_csv(reg_table_f)
-    logger.info('data loaded (N = {}).'.format(len(all_df)))
 
-    run_sr_models(all_df)
-    run_jif_models(all_df)
+def fit_and_save(models, all_df, n_workers=1, reg_table_f=None,
+                 logit_backend='statsmodels', n_bootstrap=0,
+                 n_permutations=0, cluster='VENUE',
+                 result_store_f=RESULT_STORE):
+    """ fit the models on the (loaded) regression table, and write their
+    results, the result store, and the resampling results """
+    # one pool for all models keeps the workers busy until the end
+    records = run_models(models, all_df, n_workers, reg_table_f,
+                         logit_backend=logit_backend)
+    save_records([records[model['name']] for model in models],
+                 result_store_f)
+    telemetry.checkpoint('result store saved.')
+    if n_bootstrap > 0 or n_permutations > 0:
+        run_resampling(models, all_df, n_bootstrap, n_permutations,
+                       cluster, n_workers, reg_table_f)
 
 
 if __name__ == "__main__":
     REG_TABLE = sys.argv[1]
-    RESULT = sys.argv[2:]
-    main(REG_TABLE, RESULT)
+    N_WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    LOGIT_BACKEND = sys.argv[3] if len(sys.argv) > 3 else 'statsmodels'
+    N_BOOTSTRAP = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    N_PERMUTATIONS = int(sys.argv[5]) if len(sys.argv) > 5 else 0
+    CLUSTER = sys.argv[6] if len(sys.argv) > 6 else 'VENUE'
+    MODEL_SPEC_F = sys.argv[7] if len(sys.argv) > 7 else MODEL_SPEC
+    NAMES = [name for name in sys.argv[8].split(',') if name] \
+        if len(sys.argv) > 8 else []
+    RESULT_STORE_F = sys.argv[9] if len(sys.argv) > 9 else RESULT_STORE
+    # the jobs of subsets of the models report next to their result store
+    telemetry.start('run_regression', os.path.splitext(RESULT_STORE_F)[0]
+                    if NAMES else os.path.join(os.path.dirname(RESULT_PATH),
+                                               'regression'))
+    main(REG_TABLE, N_WORKERS, LOGIT_BACKEND, N_BOOTSTRAP, N_PERMUTATIONS,
+         CLUSTER, MODEL_SPEC_F, RESULT_STORE_F, NAMES or None)
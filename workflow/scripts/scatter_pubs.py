@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" This script splits the publication dataset into shards (see shards.py).
+
+input: the publication dataset, the path template of the shards (with
+'{shard}'), the years of the shards (comma separated; '' for none), and
+(optional) 'discipline' to shard by discipline as well
+
+output: one file per shard (see `shard_names`), with the header and the lines
+of the dataset whose year (and discipline) are those of the shard; a shard
+without lines has the header only.
+
+the lines are copied as they are (bytes; only the year and the discipline
+are parsed), so each shard is cleaned by main_data_cleaning.py exactly as the
+whole dataset would be.
+
+"""
+import os
+import sys
+import logging
+from contextlib import ExitStack
+
+import telemetry
+from shards import OTHER_SHARD, shard_names, shard_name
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+YEAR_COLUMN = 'Year'
+DISCIPLINE_COLUMN = 'Ediscipline'
+
+
+def main(pub_data_f, shard_path, years=(), by_discipline=False):
+    """ write the lines of each shard to `shard_path.format(shard=name)` """
+    names = shard_names(years, by_discipline)
+    if not names:
+        raise ValueError('no shards: give the years or the disciplines')
+    n_lines = dict.fromkeys(names, 0)
+    with open(pub_data_f, 'rb') as fin, ExitStack() as stack:
+        outs = {}
+        for name in names:
+            path = shard_path.format(shard=name)
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            outs[name] = stack.enter_context(open(f'{path}.tmp', 'wb'))
+        header = fin.readline()
+        columns = header.decode().rstrip('\r\n').split('\t')
+        year_col = columns.index(YEAR_COLUMN)
+        discipline_col = columns.index(DISCIPLINE_COLUMN)
+        for out in outs.values():
+            out.write(header)
+        for line in fin:
+            fields = line.rstrip(b'\r\n').split(b'\t')
+            name = shard_name(int(fields[year_col]),
+                              fields[discipline_col].decode(), years,
+                              by_discipline)
+            outs[name].write(line)
+            n_lines[name] += 1
+    # the shards are moved in place once all of them are complete
+    for name in names:
+        path = shard_path.format(shard=name)
+        os.replace(f'{path}.tmp', path)
+        logging.info(f'shard {name}: {n_lines[name]} lines.')
+    telemetry.checkpoint('publications split.', rows=sum(n_lines.values()))
+
+
+if __name__ == "__main__":
+    PUB_DATA_FILE = sys.argv[1]
+    SHARD_PATH = sys.argv[2]
+    YEARS = [int(year) for year in sys.argv[3].split(',') if year]
+    BY_DISCIPLINE = len(sys.argv) > 4 and sys.argv[4] == 'discipline'
+    telemetry.start('scatter_pubs', SHARD_PATH.format(shard=OTHER_SHARD))
+    main(PUB_DATA_FILE, SHARD_PATH, YEARS, BY_DISCIPLINE)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" This script counts the female authors of a shard (see shards.py).
+
+input: disease mesh terms, multi-author data of the shard, paper-mesh data,
+output directory, and (optional) the mesh index: hierarchical mode
+
+output (in the output directory):
+    - meshes.npy, mesh_counts.npy: the `mesh_counts` of the papers of the
+    shard (see paper_mesh.py), one row per disease mesh; in the hierarchical
+    mode, the `tree_counts`, one row per disease tree number with papers
+    (the papers of a shard are not in the others, so the distinct papers of
+    a tree number are summed over the shards).
+    - f_{covariate}.csv: the `f_cov_counts` of the rows of the shard, for
+    each female fraction covariate (see multi_author_data_with_cov.py).
+
+the counts of all the shards are summed by gather_counts.py.
+
+"""
+import os
+import sys
+import logging
+from functools import partial
+
+import telemetry
+from stage_cache import run_stage
+from storage import load_table
+from shards import save_mesh_counts
+from cal_female_frac_per_mesh import load_disease_mesh
+from paper_attributes import paper_attributes_from_df
+from mesh_index import INDEX_FILES, load_mesh_index
+from paper_mesh import load_paper_mesh, mesh_counts, tree_counts
+from multi_author_data_with_cov import (F_COVARIATES, f_cov_counts,
+                                        f_cov_counts_path, save_f_cov_counts)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+
+def main(disease_mesh_f, multi_author_data_f, raw_paper_mesh_data_f,
+         counts_dir, mesh_index_dir=None):
+    """ count the papers and the rows of the shard """
+    multi_df = load_table(multi_author_data_f, columns=sorted(
+        {col for cov_cols in F_COVARIATES for col in cov_cols} |
+        {'PID', 'GENDER_FIRST', 'GENDER_LAST'}))
+    telemetry.checkpoint('multi author data loaded.', rows=len(multi_df))
+
+    paper_mesh = load_paper_mesh(raw_paper_mesh_data_f,
+                                 load_disease_mesh(disease_mesh_f))
+    telemetry.checkpoint('mesh -> paper id loaded.',
+                         rows=len(paper_mesh.pid_idx))
+
+    papers = paper_attributes_from_df(multi_df)
+    os.makedirs(counts_dir, exist_ok=True)
+    if mesh_index_dir is None:
+        save_mesh_counts(paper_mesh.meshes, mesh_counts(paper_mesh, papers),
+                         counts_dir)
+    else:
+        index = load_mesh_index(mesh_index_dir)
+        counts = tree_counts(paper_mesh, papers, index)
+        found = counts.any(axis=1)
+        save_mesh_counts(index.trees[found], counts[found], counts_dir)
+    save_f_cov_counts({tuple(cov_cols): f_cov_counts(multi_df, cov_cols)
+                       for cov_cols in F_COVARIATES}, counts_dir)
+    telemetry.checkpoint('counts saved.', rows=len(multi_df))
+
+
+if __name__ == "__main__":
+    DISEASE_MESH = sys.argv[1]
+    MULTI_AUTHOR_DATA = sys.argv[2]
+    RAW_PAPER_MESH_DATA = sys.argv[3]
+    COUNTS_DIR = sys.argv[4]
+    MESH_INDEX = sys.argv[5] if len(sys.argv) > 5 else None
+    INDEX_INPUTS = [] if MESH_INDEX is None else [
+        os.path.join(MESH_INDEX, name) for name in INDEX_FILES]
+    telemetry.start('shard_counts', os.path.join(COUNTS_DIR, 'counts'))
+    run_stage(partial(main, DISEASE_MESH, MULTI_AUTHOR_DATA,
+                      RAW_PAPER_MESH_DATA, COUNTS_DIR, MESH_INDEX),
+              inputs=[DISEASE_MESH, MULTI_AUTHOR_DATA,
+                      RAW_PAPER_MESH_DATA] + INDEX_INPUTS,
+              outputs=[os.path.join(COUNTS_DIR, name)
+                       for name in ['meshes.npy', 'mesh_counts.npy']] +
+              [f_cov_counts_path(COUNTS_DIR, cov_cols)
+               for cov_cols in F_COVARIATES])
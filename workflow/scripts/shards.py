@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+""" sharding of the workflow by publication year (and discipline).
+
+the Snakefile can split the publications into shards (scatter_pubs.py), so
+that the heavy steps run as one job per shard:
+
+    - each shard is cleaned (main_data_cleaning.py) and counted
+    (shard_counts.py): the counts of the female fractions per disease mesh
+    (see `mesh_counts` in paper_mesh.py; per disease tree number in the
+    hierarchical mode, see `tree_counts`) and per group of each female
+    fraction covariate (see `f_cov_counts` in multi_author_data_with_cov.py).
+    - the counts of the shards are summed (gather_counts.py) into the female
+    fractions per mesh and the covariate counts, which are the same as those
+    of the whole data.
+    - the covariates are attached to each shard (multi_author_data_with_cov.py,
+    with the gathered counts) and its regression table is prepared
+    (prepare_reg_table.py).
+    - the tables of the shards are concatenated (gather_tables.py).
+
+a shard is named after its year ('2008'), its discipline ('br', see
+`DISCIPLINES`), or both ('2008-br'); the rows of the other years and
+disciplines are in the `OTHER_SHARD`. the concatenated tables have the rows of
+the shards in the order of the shard names (and in the order of the raw file
+within a shard), and the same values and levels as the unsharded tables.
+
+"""
+import os
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+DISCIPLINES = {'br': 'Biomedical Research',
+               'cm': 'Clinical Medicine',
+               'he': 'Health'}
+OTHER_SHARD = 'other'
+
+
+def shard_names(years=(), by_discipline=False):
+    """ the names of the shards of the `years` (and the disciplines); none
+    if neither is given (no sharding) """
+    keys = []
+    if years:
+        keys.append([str(year) for year in years])
+    if by_discipline:
+        keys.append(list(DISCIPLINES))
+    if not keys:
+        return []
+    return ['-'.join(key) for key in product(*keys)] + [OTHER_SHARD]
+
+
+def shard_name(year, discipline, years=(), by_discipline=False):
+    """ the shard of a publication of the `year` (int) and the `discipline`
+    (the name in the raw data) """
+    codes = {name: code for code, name in DISCIPLINES.items()}
+    key = []
+    if years:
+        if year not in years:
+            return OTHER_SHARD
+        key.append(str(year))
+    if by_discipline:
+        if discipline not in codes:
+            return OTHER_SHARD
+        key.append(codes[discipline])
+    return '-'.join(key)
+
+
+def concat_tables(dfs):
+    """ the rows of the tables, in order. the empty tables are skipped (their
+    columns may have other dtypes); the categorical columns have the (sorted)
+    union of their levels. """
+    dfs = [df for df in dfs if len(df)] or dfs[:1]
+    dfs = [df.copy() for df in dfs]
+    for col in dfs[0].columns:
+        if all(df[col].dtype.name == 'category' for df in dfs):
+            levels = sorted(set().union(*[df[col].cat.categories
+                                          for df in dfs]))
+            for df in dfs:
+                df[col] = df[col].cat.set_categories(levels)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def save_mesh_counts(meshes, counts, counts_dir):
+    """ save the `mesh_counts` of the `meshes` in `counts_dir` """
+    np.save(os.path.join(counts_dir, 'meshes.npy'), meshes)
+    np.save(os.path.join(counts_dir, 'mesh_counts.npy'), counts)
+
+
+def load_mesh_counts(counts_dir):
+    """ the meshes and their counts saved in `counts_dir` """
+    return (np.load(os.path.join(counts_dir, 'meshes.npy')),
+            np.load(os.path.join(counts_dir, 'mesh_counts.npy')))
+
+
+def add_mesh_counts(meshes, counts, other_meshes, other_counts):
+    """ the sum of two mesh count tables, aligned with the union of their
+    (sorted) meshes """
+    union = np.union1d(meshes, other_meshes)
+    total = np.zeros((len(union), counts.shape[1]))
+    total[np.searchsorted(union, meshes)] += counts
+    total[np.searchsorted(union, other_meshes)] += other_counts
+    return union, total
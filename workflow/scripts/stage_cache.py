@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+""" content-addressed cache of the workflow stages.
+
+snakemake reruns a stage when an input is newer than its outputs, even if the
+content did not change (e.g. a re-downloaded file). `run_stage` computes a key
+from the content of the inputs, the parameters, and the source of the scripts
+(the running script and the local modules it imported). the outputs are
+stored under this key; if the key is found, they are copied from the cache
+instead of being computed again.
+
+file digests are remembered by (path, size, modification time), so a large
+input is only hashed again when it was modified (or touched).
+
+    cache_dir/digests.json: the remembered file digests.
+    cache_dir/{key}/: the outputs of a stage run (`0`, `1`, ... in order).
+
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+import logging
+
+import numpy as np
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+STAGE_CACHE_DIR = '../data/cache/stages'
+DIGEST_INDEX = 'digests.json'
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def file_digest(path, block_size=1 << 20):
+    """ sha1 hex digest of the file content """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fin:
+        for block in iter(lambda: fin.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_array(array, path):
+    """ `np.save` to `path` through a temporary file. concurrent jobs may
+    build the same cache entry while others memory-map it, so an entry file
+    is replaced at once, never rewritten in place. """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fout:
+        np.save(fout, array)
+    os.replace(tmp_path, path)
+
+
+def save_json(obj, path):
+    """ `json.dump` to `path` through a temporary file (see `save_array`) """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as fout:
+        json.dump(obj, fout)
+    os.replace(tmp_path, path)
+
+
+def _load_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, DIGEST_INDEX)) as fin:
+            return json.load(fin)
+    except (IOError, ValueError):
+        return {}
+
+
+def _save_index(index, cache_dir):
+    # concurrent stages may update the index; the last writer wins, which
+    # only costs the others' digests to be computed again
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, DIGEST_INDEX)
+    with open(f'{path}.{os.getpid()}.tmp', 'w') as fout:
+        json.dump(index, fout)
+    os.replace(f'{path}.{os.getpid()}.tmp', path)
+
+
+def cached_digests(paths, cache_dir=STAGE_CACHE_DIR):
+    """ `file_digest` of the paths, remembered by (size, modification time)
+    in `cache_dir` """
+    index = _load_index(cache_dir)
+    digests, updated = [], False
+    for path in paths:
+        abs_path = os.path.abspath(path)
+        stat = os.stat(abs_path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        entry = index.get(abs_path)
+        if entry is None or entry[:2] != signature:
+            entry = signature + [file_digest(abs_path)]
+            index[abs_path] = entry
+            updated = True
+        digests.append(entry[2])
+    if updated:
+        _save_index(index, cache_dir)
+    return digests
+
+
+def code_digest():
+    """ digest of the running script and the local modules it imported """
+    sources = set()
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None)
+        if path and path.endswith('.py') and \
+                os.path.dirname(os.path.abspath(path)) == SCRIPT_DIR:
+            sources.add(os.path.abspath(path))
+    digest = hashlib.sha1()
+    for path in sorted(sources):
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as fin:
+            digest.update(fin.read())
+    return digest.hexdigest()
+
+
+def stage_key(inputs, params=None, cache_dir=STAGE_CACHE_DIR):
+    """ key of a stage run: the content of the `inputs`, the `params`
+    (anything json serializable), and the code """
+    key = json.dumps([CACHE_VERSION, cached_digests(inputs, cache_dir),
+                      params, code_digest()])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _copy(src, dst):
+    # copy through a temporary file so that no partial output is left
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    shutil.copyfile(src, f'{dst}.tmp')
+    os.replace(f'{dst}.tmp', dst)
+
+
+def run_stage(compute, inputs, outputs, params=None,
+              cache_dir=STAGE_CACHE_DIR):
+    """ run `compute()`, which reads the `inputs` and writes the `outputs`
+    (file paths), unless the cache has the outputs of a run with the same
+    inputs, `params`, and code. """
+    if cache_dir is None:
+        compute()
+        return
+
+    # the extensions of the outputs pick their formats (see storage.py)
+    formats = [os.path.splitext(path)[1].lower() for path in outputs]
+    key = stage_key(inputs, [params, formats], cache_dir)
+    entry = os.path.join(cache_dir, key)
+    if os.path.isdir(entry):
+        for i, path in enumerate(outputs):
+            _copy(os.path.join(entry, str(i)), path)
+        telemetry.checkpoint(
+            f'outputs restored from the stage cache ({key}).')
+        return
+
+    compute()
+    # the entry is moved in place once complete
+    tmp_entry = f'{entry}.{os.getpid()}.tmp'
+    os.makedirs(tmp_entry, exist_ok=True)
+    for i, path in enumerate(outputs):
+        shutil.copyfile(path, os.path.join(tmp_entry, str(i)))
+    try:
+        os.rename(tmp_entry, entry)
+    except OSError:
+        # stored by a concurrent run in the meantime
+        shutil.rmtree(tmp_entry)
+    logger.info('outputs stored in the stage cache (%s).', key)
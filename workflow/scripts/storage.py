@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+""" storage layer for the derived datasets (single/multi author data,
+multi author data with covariates, and the regression table).
+
+the file format is chosen by the extension of the path, so the Snakefile
+decides how each dataset is stored:
+
+    - '.csv': comma separated text (dtypes are lost).
+    - '.parquet': compressed columnar file (dtypes, incl. categories, kept).
+    - '.feather': uncompressed columnar file (dtypes are kept).
+
+readers take an optional list of columns so that downstream scripts only load
+what they need. csv and parquet files can also be written chunk by chunk
+(`open_table_writer`) and read chunk by chunk (`iter_table`; parquet files are
+read one row group at a time). `table_columns` lists the columns without
+reading the data; both pass reader options on (e.g. sep='\t' for the tab
+separated csv files of the mesh features). other formats can be plugged in
+with `register_format`.
+
+"""
+import os
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PARQUET_COMPRESSION = 'snappy'
+# rows per parquet row group; bounds the memory of reading a file in chunks
+PARQUET_ROW_GROUP_SIZE = 1 << 18
+CHUNKSIZE = 1 << 18
+# schema metadata key listing the categorical columns of chunked parquet files
+CATEGORIES_KEY = b'storage.categories'
+
+
+def _read_csv(path, columns=None, **options):
+    return pd.read_csv(path, usecols=columns, **options)
+
+
+def _write_csv(df, path):
+    df.to_csv(path, index=False)
+
+
+def _iter_csv(path, columns=None, **options):
+    return pd.read_csv(path, usecols=columns, chunksize=CHUNKSIZE, **options)
+
+
+def parquet_categories(path):
+    """ the categorical columns of a parquet file """
+    schema = pq.read_schema(path)
+    pandas_meta = schema.pandas_metadata or {}
+    categories = [col['name'] for col in pandas_meta.get('columns', [])
+                  if col['pandas_type'] == 'categorical']
+    categories += json.loads((schema.metadata or {}).get(CATEGORIES_KEY,
+                                                         b'[]').decode())
+    return categories
+
+
+def _read_parquet(path, columns=None):
+    df = pd.read_parquet(path, columns=columns)
+    # older pyarrow versions return categorical columns as plain strings
+    for col in parquet_categories(path):
+        if col in df and df[col].dtype.name != 'category':
+            df[col] = df[col].astype('category')
+    return df
+
+
+def _write_parquet(df, path):
+    df.to_parquet(path, index=False, compression=PARQUET_COMPRESSION,
+                  row_group_size=PARQUET_ROW_GROUP_SIZE)
+
+
+def _iter_parquet(path, columns=None):
+    parquet_file = pq.ParquetFile(path)
+    for i in range(parquet_file.num_row_groups):
+        yield parquet_file.read_row_group(i, columns=columns).to_pandas()
+
+
+def _columns_csv(path, **options):
+    return list(pd.read_csv(path, nrows=0, **options).columns)
+
+
+def _columns_parquet(path):
+    schema = pq.read_schema(path)
+    index_columns = (schema.pandas_metadata or {}).get('index_columns', [])
+    return [name for name in schema.names if name not in index_columns]
+
+
+def _read_feather(path, columns=None):
+    return pd.read_feather(path, columns=columns)
+
+
+def _write_feather(df, path):
+    # feather cannot store an index
+    df.reset_index(drop=True).to_feather(path)
+
+
+class ChunkWriter(object):
+    """ base class of the chunk writers: `write(df)` appends a chunk and
+    `close()` finishes the file. can be used as a context manager. """
+
+    def write(self, df):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvChunkWriter(ChunkWriter):
+    """ appends chunks to a csv file; the header is written once """
+
+    def __init__(self, path):
+        self.fout = open(path, 'w')
+        self.header = True
+
+    def write(self, df):
+        df.to_csv(self.fout, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        self.fout.close()
+
+
+class ParquetChunkWriter(ChunkWriter):
+    """ appends chunks as row groups of a parquet file.
+
+    the schema is fixed by the first chunk. the levels of categorical columns
+    differ between chunks, so their values are stored and the columns are
+    listed in the schema metadata to be read back as categories.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.schema = None
+        self.writer = None
+
+    def _open(self, df, categories):
+        schema = pa.Table.from_pandas(df, preserve_index=False).schema
+        # columns that are entirely missing in the first chunk
+        fields = [pa.field(field.name, pa.string())
+                  if field.type == pa.null() else field for field in schema]
+        metadata = dict(schema.metadata or {})
+        metadata[CATEGORIES_KEY] = json.dumps(categories).encode()
+        self.schema = pa.schema(fields, metadata=metadata)
+        self.writer = pq.ParquetWriter(self.path, self.schema,
+                                       compression=PARQUET_COMPRESSION)
+
+    def write(self, df):
+        categories = list(df.select_dtypes(include='category').columns)
+        df = df.astype({col: object for col in categories})
+        if self.writer is None:
+            self._open(df, categories)
+        table = pa.Table.from_pandas(df, schema=self.schema,
+                                     preserve_index=False)
+        self.writer.write_table(
+            table.replace_schema_metadata(self.schema.metadata),
+            row_group_size=PARQUET_ROW_GROUP_SIZE)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+FORMATS = {'.csv': (_read_csv, _write_csv),
+           '.parquet': (_read_parquet, _write_parquet),
+           '.feather': (_read_feather, _write_feather)}
+
+CHUNK_WRITERS = {'.csv': CsvChunkWriter,
+                 '.parquet': ParquetChunkWriter}
+
+CHUNK_READERS = {'.csv': _iter_csv,
+                 '.parquet': _iter_parquet}
+
+COLUMN_READERS = {'.csv': _columns_csv,
+                  '.parquet': _columns_parquet}
+
+
+def register_format(ext, reader, writer, chunk_writer=None,
+                    chunk_reader=None, column_reader=None):
+    """ register a reader `reader(path, columns=None)` and a writer
+    `writer(df, path)` for the file extension `ext` (e.g. '.h5').
+    `chunk_writer(path)` should return a `ChunkWriter` if the format can be
+    written chunk by chunk, `chunk_reader(path, columns=None)` an iterator
+    of dataframes if it can be read chunk by chunk, and `column_reader(path)`
+    the column names if they can be read without the data. """
+    FORMATS[ext.lower()] = (reader, writer)
+    if chunk_writer is not None:
+        CHUNK_WRITERS[ext.lower()] = chunk_writer
+    if chunk_reader is not None:
+        CHUNK_READERS[ext.lower()] = chunk_reader
+    if column_reader is not None:
+        COLUMN_READERS[ext.lower()] = column_reader
+
+
+def get_format(path):
+    """ returns the (reader, writer) pair for the path """
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        return FORMATS[ext]
+    except KeyError:
+        raise ValueError(f'unknown table format: {path}')
+
+
+def load_table(path, columns=None):
+    """ load a derived dataset. only `columns` are read if given. """
+    reader, _ = get_format(path)
+    return reader(path, columns=columns)
+
+
+def save_table(df, path):
+    """ save a derived dataset without the index """
+    _, writer = get_format(path)
+    writer(df, path)
+
+
+def open_table_writer(path):
+    """ returns a `ChunkWriter` writing a derived dataset chunk by chunk """
+    ext = os.path.splitext(path)[1].lower()
+    get_format(path)
+    try:
+        return CHUNK_WRITERS[ext](path)
+    except KeyError:
+        raise ValueError(f'{ext} files cannot be written chunk by chunk')
+
+
+def iter_table(path, columns=None, **options):
+    """ iterate over a derived dataset in chunks (dataframes with a default
+    index). formats without a chunk reader are loaded at once. `options` are
+    passed to the reader. """
+    ext = os.path.splitext(path)[1].lower()
+    reader, _ = get_format(path)
+    if ext in CHUNK_READERS:
+        for df in CHUNK_READERS[ext](path, columns=columns, **options):
+            yield df.reset_index(drop=True)
+    else:
+        yield reader(path, columns=columns, **options)
+
+
+def table_columns(path, **options):
+    """ the column names of a derived dataset. formats without a column
+    reader are loaded. `options` are passed to the reader. """
+    ext = os.path.splitext(path)[1].lower()
+    reader, _ = get_format(path)
+    if ext in COLUMN_READERS:
+        return COLUMN_READERS[ext](path, **options)
+    return list(reader(path, **options).columns)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+""" target-mean encoding of categorical covariates.
+
+the rows are coded once by their group (a combination of grouping columns,
+e.g. MAIN_COUNTRY or DISCIPLINE x YEAR) and the mean of each target column
+per group is computed with grouped reductions (bincount) on the codes, then
+gathered back to the rows. no copy of the table is made, and any number of
+targets shares the same group codes.
+
+    - leave_one_out: a row's own value is left out of its group mean.
+    - smoothing: the group mean is shrunk toward the overall mean, as if the
+    group had `smoothing` more rows with the overall mean.
+
+"""
+import numpy as np
+import pandas as pd
+
+
+def group_codes(df, columns):
+    """ returns (codes, n_groups): the group of each row of `df` by the
+    values of `columns`; rows with a missing value get -1 """
+    codes = np.zeros(len(df), dtype=np.int64)
+    for col in columns:
+        col_codes, uniques = pd.factorize(df[col], sort=True)
+        missing = (codes < 0) | (col_codes < 0)
+        codes = codes * max(len(uniques), 1) + col_codes
+        codes[missing] = -1
+    found = codes >= 0
+    uniques, codes[found] = np.unique(codes[found], return_inverse=True)
+    return codes, len(uniques)
+
+
+def target_means(df, columns, targets, leave_one_out=False, smoothing=0):
+    """ the mean of each column of `targets` (name -> array aligned with
+    `df`; NaN values are skipped) within the groups of `columns`, for every
+    row of `df`. returns name -> array; the rows without a group or without
+    other values in their group get NaN. """
+    codes, n_groups = group_codes(df, columns)
+    found = codes >= 0
+    means = {}
+    for name, values in targets.items():
+        values = np.asarray(values, dtype=float)
+        valid = found & ~np.isnan(values)
+        counts = np.bincount(codes[valid], minlength=n_groups)[codes[found]]
+        sums = np.bincount(codes[valid], weights=values[valid],
+                           minlength=n_groups)[codes[found]]
+        if leave_one_out:
+            own = valid[found]
+            counts = counts - own
+            sums = sums - np.where(own, values[found], 0)
+        if smoothing:
+            prior = values[valid].mean()
+            counts = counts + smoothing
+            sums = sums + smoothing * prior
+        means[name] = np.full(len(df), np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means[name][found] = sums / counts
+    return means
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+""" resource telemetry of the workflow scripts.
+
+a script calls `start` once and then `checkpoint` where it used to log a
+progress message ("pid2mesh data loaded."). each checkpoint logs the message
+and records the phase that ends there:
+
+    - wall_s, cpu_s: wall and CPU time since the previous checkpoint.
+    - peak_rss_mb: peak resident memory of the process so far (the phase
+    that raised it is the one with the first larger value).
+    - rows: number of rows processed, if the script reports it.
+
+when the script exits, the report is written next to its output as
+`{output}.telemetry.json` (all phases and totals) and `.telemetry.csv` (one
+row per phase). if the environment variable TELEMETRY_PROFILE is set (e.g.
+`TELEMETRY_PROFILE=1 snakemake ...`), the script also runs under cProfile
+and the statistics are dumped to `{output}.telemetry.prof`.
+
+"""
+import os
+import csv
+import sys
+import json
+import time
+import atexit
+import cProfile
+import logging
+import resource
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = 'TELEMETRY_PROFILE'
+PHASE_COLUMNS = ['phase', 'wall_s', 'cpu_s', 'peak_rss_mb', 'rows']
+
+_session = None
+
+
+def peak_rss_mb():
+    """ peak resident memory of the process (MB) """
+    # ru_maxrss is in kilobytes on linux and in bytes on macos
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+class Session(object):
+    """ the phases recorded by a script """
+
+    def __init__(self, script, report_prefix, profile=False):
+        self.script = script
+        self.report_prefix = report_prefix
+        self.phases = []
+        self.pid = os.getpid()
+        self.started = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.start_wall = self.last_wall = time.time()
+        self.start_cpu = self.last_cpu = time.process_time()
+        self.profiler = cProfile.Profile() if profile else None
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def checkpoint(self, phase, rows=None):
+        wall, cpu = time.time(), time.process_time()
+        self.phases.append({'phase': phase,
+                            'wall_s': round(wall - self.last_wall, 3),
+                            'cpu_s': round(cpu - self.last_cpu, 3),
+                            'peak_rss_mb': round(peak_rss_mb(), 1),
+                            'rows': rows})
+        self.last_wall, self.last_cpu = wall, cpu
+
+    def report(self):
+        return {'script': self.script,
+                'argv': sys.argv,
+                'started': self.started,
+                'wall_s': round(time.time() - self.start_wall, 3),
+                'cpu_s': round(time.process_time() - self.start_cpu, 3),
+                'peak_rss_mb': round(peak_rss_mb(), 1),
+                'phases': self.phases}
+
+    def write(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(f'{self.report_prefix}.prof')
+        with open(f'{self.report_prefix}.json', 'w') as fout:
+            json.dump(self.report(), fout, indent=2)
+        with open(f'{self.report_prefix}.csv', 'w', newline='') as fout:
+            writer = csv.DictWriter(fout, PHASE_COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.phases)
+
+
+def start(script, output_path, profile=None):
+    """ start recording the phases of `script` (its name). the report is
+    written next to `output_path` when the process exits. `profile` defaults
+    to whether TELEMETRY_PROFILE is set. """
+    global _session
+    if profile is None:
+        profile = bool(os.environ.get(PROFILE_ENV))
+    _session = Session(script, f'{output_path}.telemetry', profile)
+    atexit.register(finish)
+
+
+def checkpoint(phase, rows=None):
+    """ log the message `phase` and record the phase ending here. without a
+    session (e.g. the module is imported) only the message is logged. """
+    if rows is None:
+        logging.info(phase)
+    else:
+        logging.info('%s (%d rows)', phase, rows)
+    # forked worker processes do not report; their parent does
+    if _session is not None and _session.pid == os.getpid():
+        _session.checkpoint(phase, rows)
+
+
+def finish():
+    """ write the report of the session (called at exit) """
+    global _session
+    if _session is not None and _session.pid == os.getpid():
+        _session.checkpoint('finished')
+        _session.write()
+        logger.info('telemetry report written: %s.json',
+                    _session.report_prefix)
+    _session = None
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+""" tests of datasets.py on small files written as the workflow writes them.
+
+run from the workflow directory: python -m unittest discover tests
+
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from datasets import DATASETS, open_dataset  # noqa: E402
+from storage import save_table  # noqa: E402
+
+PAPERS = pd.DataFrame({'PID': [1, 2, 3, 4],
+                       'YEAR': [2008, 2008, 2010, 2012],
+                       'GENDER_FIRST': pd.Categorical(['F', 'M', 'F', 'M']),
+                       'N_AUTHORS': [1, 3, 2, 5]})
+MESH_FRACS = pd.DataFrame({'MESH': ['Term000', 'Term001', 'Term002'],
+                           'F_FIRST_MESH': [.25, .5, .75],
+                           'F_LAST_MESH': [.5, .25, .125]})
+PAPER_MESH_FEATURE = pd.DataFrame({'PID': [1, 2, 3],
+                                   'F_FIRST_MESH': [.25, .5, .75],
+                                   'F_LAST_MESH': [.5, .25, .125]})
+COUNTRIES = pd.DataFrame({'COUNTRY': ['France', 'Japan'],
+                          'CONTINENT': ['Western Europe', 'Eastern Asia']})
+
+
+def _tsv(df, path):
+    # as cal_female_frac_per_mesh.py and cal_mesh_female_frac_per_paper.py
+    df.to_csv(path, sep='\t', index=False)
+
+
+def _csv(df, path):
+    # as continent_data_cleaning.py
+    df.to_csv(path, index=False)
+
+
+# dataset -> (table, writer, a column and a predicate on it)
+TABLES = {'single_author': (PAPERS, save_table, ('YEAR', '==', 2008)),
+          'multi_author': (PAPERS, save_table, ('N_AUTHORS', '>', 1)),
+          'multi_author_final': (PAPERS, save_table, ('YEAR', '>=', 2010)),
+          'reg_table': (PAPERS, save_table, ('GENDER_FIRST', '==', 'F')),
+          'country_continent': (COUNTRIES, _csv,
+                                ('COUNTRY', '==', 'Japan')),
+          'female_frac_per_mesh': (MESH_FRACS, _tsv,
+                                   ('F_FIRST_MESH', '>', .3)),
+          'paper_mesh_feature': (PAPER_MESH_FEATURE, _tsv,
+                                 ('F_FIRST_MESH', '>', .3))}
+
+
+class DatasetsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        for name, (df, writer, _) in TABLES.items():
+            entry = DATASETS[name]
+            fname = entry if isinstance(entry, str) else entry[0]
+            writer(df, os.path.join(self.data_dir, fname))
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def test_all_datasets_tested(self):
+        self.assertEqual(sorted(TABLES), sorted(DATASETS))
+
+    def test_load(self):
+        for name, (df, _, (col, op, value)) in TABLES.items():
+            with self.subTest(dataset=name):
+                dataset = open_dataset(name, self.data_dir)
+                self.assertEqual(dataset.columns, list(df.columns))
+                pd.testing.assert_frame_equal(dataset.load(), df,
+                                              check_categorical=False)
+                filtered = dataset.filter((col, op, value)).select(col)
+                expected = df[filtered._mask(df)].reset_index(drop=True)
+                self.assertGreater(len(expected), 0)
+                self.assertEqual(filtered.count(), len(expected))
+                pd.testing.assert_frame_equal(filtered.load(),
+                                              expected[[col]],
+                                              check_categorical=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
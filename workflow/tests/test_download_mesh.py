@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+""" tests of download_mesh.py against local servers.
+
+run from the workflow directory: python -m unittest discover tests
+
+"""
+import gc
+import os
+import sys
+import time
+import socket
+import unittest
+import warnings
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import download_mesh  # noqa: E402
+
+TIMEOUT = 0.2
+
+
+class SilentServerTest(unittest.TestCase):
+    """ a server that accepts the connections (in its backlog) and never
+    answers """
+
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(download_mesh.RETRIES)
+        self.port = self.server.getsockname()[1]
+        self.retry_wait = download_mesh.RETRY_WAIT
+        download_mesh.RETRY_WAIT = 0
+
+    def tearDown(self):
+        download_mesh.RETRY_WAIT = self.retry_wait
+        self.server.close()
+
+    def assert_times_out(self, url):
+        source = download_mesh.open_source(url, TIMEOUT)
+        start = time.time()
+        try:
+            with self.assertRaisesRegex(RuntimeError, 'size unknown'):
+                download_mesh.remote_size(source, 'mtrees2018.bin')
+        finally:
+            source.close()
+        self.assertLess(time.time() - start,
+                        download_mesh.RETRIES * TIMEOUT + 5)
+
+    def test_ftp(self):
+        self.assert_times_out(f'ftp://127.0.0.1:{self.port}')
+
+    def test_http(self):
+        self.assert_times_out(f'http://127.0.0.1:{self.port}')
+
+
+class NoLengthHandler(BaseHTTPRequestHandler):
+    """ answers without a Content-Length (as a chunked response) """
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class NoLengthTest(unittest.TestCase):
+
+    def test_http(self):
+        server = HTTPServer(('127.0.0.1', 0), NoLengthHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            source = download_mesh.open_source(
+                f'http://127.0.0.1:{server.server_port}', TIMEOUT)
+            with self.assertRaisesRegex(ValueError, 'no Content-Length'):
+                download_mesh.remote_size(source, 'mtrees2018.bin')
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+
+class LoginRefusedTest(unittest.TestCase):
+    """ an ftp server that refuses the login """
+
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(download_mesh.RETRIES)
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.start()
+        self.retry_wait = download_mesh.RETRY_WAIT
+        download_mesh.RETRY_WAIT = 0
+
+    def tearDown(self):
+        download_mesh.RETRY_WAIT = self.retry_wait
+        self.thread.join()
+        self.server.close()
+
+    def serve(self):
+        for _ in range(download_mesh.RETRIES):
+            conn, _ = self.server.accept()
+            with conn:
+                conn.settimeout(5)
+                conn.sendall(b'220 ready\r\n')
+                conn.recv(1024)
+                conn.sendall(b'530 login incorrect\r\n')
+
+    def test_connection_closed(self):
+        source = download_mesh.open_source(
+            f'ftp://127.0.0.1:{self.server.getsockname()[1]}', TIMEOUT)
+        with warnings.catch_warnings(record=True) as caught:
+            # an unclosed socket warns when it is collected
+            warnings.simplefilter('always', ResourceWarning)
+            with self.assertRaises(RuntimeError):
+                download_mesh.remote_size(source, 'mtrees2018.bin')
+            gc.collect()
+        self.assertEqual([w for w in caught
+                          if issubclass(w.category, ResourceWarning)], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
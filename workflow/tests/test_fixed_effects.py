@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+""" tests of fixed_effects.py against the dummy variable models fitted by
+statsmodels.
+
+run from the workflow directory: python -m unittest discover tests
+
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+import statsmodels.formula.api as smf
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from fixed_effects import (AbsorbedLogit, absorbed_groups,  # noqa: E402
+                           fit_absorbed_ols, informative_rows)
+
+COVARIATES = ['X1', 'X2']
+OLS_STATS = ['nobs', 'df_model', 'df_resid', 'rsquared', 'rsquared_adj',
+             'fvalue', 'f_pvalue', 'llf', 'aic', 'bic']
+LOGIT_STATS = ['nobs', 'df_model', 'df_resid', 'llf', 'llnull', 'prsquared',
+               'llr_pvalue']
+
+
+def make_frame(seed=0, n=600):
+    """ two covariates, two crossed categorical columns, and a continuous and
+    a binary outcome """
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({'X1': rng.normal(size=n),
+                       'X2': rng.binomial(1, .4, size=n).astype(float),
+                       'VENUE': rng.randint(0, 12, size=n),
+                       'YEAR': rng.randint(0, 4, size=n)})
+    effect = rng.normal(size=12)[df.VENUE] + .3 * df.YEAR
+    df['Y'] = .5 * df.X1 - .8 * df.X2 + effect + rng.normal(size=n)
+    df['B'] = (rng.rand(n) <
+               1 / (1 + np.exp(-(.5 * df.X1 - .8 * df.X2 + effect - 1)))) \
+        .astype(float)
+    return df
+
+
+def exog(df):
+    return df[COVARIATES].assign(Intercept=1.)
+
+
+def dummy_formula(dv, absorb):
+    return f'{dv} ~ {" + ".join(COVARIATES)} + ' + \
+        ' + '.join(f'C({col})' for col in absorb)
+
+
+class AbsorbedOLSTest(unittest.TestCase):
+
+    def assert_dummy_model(self, absorb):
+        df = make_frame()
+        groups = absorbed_groups(df, absorb, np.arange(len(df)))
+        result = fit_absorbed_ols(df.Y, exog(df), groups)
+        dummy = smf.ols(dummy_formula('Y', absorb), df).fit()
+        np.testing.assert_allclose(result.params[COVARIATES],
+                                   dummy.params[COVARIATES], rtol=1e-8)
+        np.testing.assert_allclose(result.bse[COVARIATES],
+                                   dummy.bse[COVARIATES], rtol=1e-8)
+        for stat in OLS_STATS:
+            with self.subTest(stat=stat):
+                self.assertAlmostEqual(getattr(result, stat),
+                                       getattr(dummy, stat), places=8)
+
+    def test_one_column(self):
+        self.assert_dummy_model(['VENUE'])
+
+    def test_two_columns(self):
+        self.assert_dummy_model(['VENUE', 'YEAR'])
+
+
+class AbsorbedLogitTest(unittest.TestCase):
+
+    def assert_dummy_model(self, df, absorb):
+        groups = absorbed_groups(df, absorb, np.arange(len(df)))
+        result = AbsorbedLogit(df.B, exog(df), groups).fit()
+        dummy = smf.logit(dummy_formula('B', absorb), df).fit(disp=False)
+        self.assertTrue(result.mle_retvals['converged'])
+        np.testing.assert_allclose(result.params, dummy.params[COVARIATES],
+                                   rtol=1e-6)
+        np.testing.assert_allclose(result.bse, dummy.bse[COVARIATES],
+                                   rtol=1e-6)
+        for stat in LOGIT_STATS:
+            with self.subTest(stat=stat):
+                self.assertAlmostEqual(getattr(result, stat),
+                                       getattr(dummy, stat), places=6)
+
+    def test_one_column(self):
+        df = make_frame()
+        groups = absorbed_groups(df, ['VENUE'], np.arange(len(df)))
+        self.assertTrue(informative_rows(df.B.values, groups).all())
+        self.assert_dummy_model(df, ['VENUE'])
+
+    def test_two_columns(self):
+        self.assert_dummy_model(make_frame(), ['VENUE', 'YEAR'])
+
+    def test_single_outcome_level(self):
+        """ the rows of a level without positive outcomes are dropped: the
+        fit is that of the other rows """
+        df = make_frame()
+        df.loc[df.VENUE == 3, 'B'] = 0.
+        groups = absorbed_groups(df, ['VENUE'], np.arange(len(df)))
+        result = AbsorbedLogit(df.B, exog(df), groups).fit()
+        self.assertEqual(result.nobs, (df.VENUE != 3).sum())
+        others = df[df.VENUE != 3].reset_index(drop=True)
+        expected = AbsorbedLogit(
+            others.B, exog(others),
+            absorbed_groups(others, ['VENUE'], np.arange(len(others)))).fit()
+        np.testing.assert_allclose(result.params, expected.params)
+        self.assert_dummy_model(others, ['VENUE'])
+
+
+if __name__ == '__main__':
+    unittest.main()
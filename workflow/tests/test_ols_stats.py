@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+""" tests of ols_stats.py against the statsmodels OLS fit of the rows of the
+selected cells.
+
+run from the workflow directory: python -m unittest discover tests
+
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+import patsy
+import statsmodels.api as sm
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from ols_stats import cell_stats, fit_ols, get_cells, sum_cells  # noqa: E402
+
+FIT_STATS = ['nobs', 'df_model', 'df_resid', 'rsquared', 'rsquared_adj',
+             'fvalue', 'f_pvalue', 'llf', 'aic', 'bic', 'condition_number']
+
+
+def make_frame(seed=0, n=800):
+    """ a continuous outcome, a categorical and a continuous covariate, and
+    the cell columns """
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({'GENDER_FL': rng.choice(['AA', 'AF', 'FA', 'FF'], n),
+                       'N_AUTHORS': rng.poisson(4, n) + 2.,
+                       'DISCIPLINE': rng.choice(['br', 'cm', 'he'], n),
+                       'YEAR': rng.choice([2008, 2010, 2012], n)})
+    df['IF'] = (df.GENDER_FL == 'FF') * -.3 + .1 * df.N_AUTHORS + \
+        (df.DISCIPLINE == 'cm') * .5 + rng.gamma(2, size=n)
+    return df
+
+
+def _summary_lines(result):
+    # the summary table without the time of the fit
+    return [line for line in result.summary().as_text().splitlines()
+            if not line.startswith(('Date:', 'Time:'))]
+
+
+class FitOLSTest(unittest.TestCase):
+
+    def setUp(self):
+        self.df = make_frame()
+        y, X = patsy.dmatrices('IF ~ GENDER_FL + N_AUTHORS', self.df,
+                               return_type='dataframe')
+        self.y, self.X = y.IF, X
+        self.cell_ids, cells = get_cells(self.df, ['DISCIPLINE', 'YEAR'])
+        self.stats = cell_stats(X.values, y.IF.values, self.cell_ids, cells)
+
+    def assert_ols(self, cells, keep):
+        """ the model of the rows of the `cells` (ids) on the `keep`
+        columns """
+        selected = np.isin(np.arange(len(self.stats.cells)), cells)
+        sample = np.isin(self.cell_ids, cells)
+        endog = self.y[sample]
+        exog = self.X.loc[sample, self.X.columns[keep]]
+        XtX, Xty = sum_cells(self.stats, selected, keep)
+        result = fit_ols(endog, exog, XtX, Xty)
+        expected = sm.OLS(endog, exog).fit()
+        np.testing.assert_allclose(result.params, expected.params,
+                                   rtol=1e-8)
+        np.testing.assert_allclose(result.bse, expected.bse, rtol=1e-8)
+        for stat in FIT_STATS:
+            with self.subTest(stat=stat):
+                self.assertAlmostEqual(getattr(result, stat),
+                                       getattr(expected, stat), places=6)
+        self.assertEqual(_summary_lines(result), _summary_lines(expected))
+
+    def test_all_cells(self):
+        self.assert_ols(np.arange(len(self.stats.cells)),
+                        np.arange(self.X.shape[1]))
+
+    def test_some_cells(self):
+        self.assert_ols(np.flatnonzero(self.stats.cells.DISCIPLINE == 'cm'),
+                        np.arange(self.X.shape[1]))
+
+    def test_some_columns(self):
+        keep = np.flatnonzero(self.X.columns != 'N_AUTHORS')
+        self.assert_ols(np.arange(4), keep)
+
+
+if __name__ == '__main__':
+    unittest.main()
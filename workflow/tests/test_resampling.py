@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+""" tests of the logit fits of resampling.py against the statsmodels Logit.
+
+run from the workflow directory: python -m unittest discover tests
+
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+import statsmodels.api as sm
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from resampling import logit_newton  # noqa: E402
+
+
+def make_design(seed=0, n=500):
+    """ a design matrix (intercept, a continuous covariate, two dummies) and
+    a binary outcome """
+    rng = np.random.RandomState(seed)
+    level = rng.randint(0, 3, n)
+    X = np.column_stack([np.ones(n), rng.normal(size=n),
+                         level == 1, level == 2]).astype(float)
+    eta = X @ np.array([-.5, .8, .4, -.6])
+    y = (rng.rand(n) < 1 / (1 + np.exp(-eta))).astype(float)
+    return X, y
+
+
+class LogitNewtonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.X, self.y = make_design()
+
+    def assert_logit(self, params, converged, X, y):
+        self.assertTrue(converged)
+        expected = sm.Logit(y, X).fit(disp=False)
+        np.testing.assert_allclose(params, expected.params, rtol=1e-7)
+
+    def test_unweighted(self):
+        self.assert_logit(*logit_newton(self.X, self.y), self.X, self.y)
+
+    def test_frequency_weights(self):
+        """ a weight is the number of copies of the row (as in the cluster
+        bootstrap) """
+        weights = np.random.RandomState(1).poisson(1, len(self.y))
+        rows = np.repeat(np.arange(len(self.y)), weights)
+        self.assert_logit(*logit_newton(self.X, self.y, weights=weights),
+                          self.X[rows], self.y[rows])
+
+    def test_replace(self):
+        """ the replaced columns (as in the permutation test) are those of
+        the design matrix with the values """
+        cols = [2, 3]
+        values = self.X[np.random.RandomState(1).permutation(
+            len(self.y))][:, cols]
+        X = self.X.copy()
+        X[:, cols] = values
+        self.assert_logit(*logit_newton(self.X, self.y,
+                                        replace=(cols, values)), X, self.y)
+
+    def test_start(self):
+        expected, _ = logit_newton(self.X, self.y)
+        params, converged = logit_newton(self.X, self.y, start=expected)
+        self.assertTrue(converged)
+        np.testing.assert_allclose(params, expected, rtol=1e-10)
+
+    def test_absent_column(self):
+        """ the coefficient of a dummy that no weighted row has is NaN; the
+        others are those of the model without it """
+        weights = (self.X[:, 3] == 0).astype(float)
+        params, converged = logit_newton(self.X, self.y, weights=weights)
+        self.assertTrue(np.isnan(params[3]))
+        rows = weights > 0
+        self.assert_logit(params[:3], converged, self.X[rows][:, :3],
+                          self.y[rows])
+
+
+if __name__ == '__main__':
+    unittest.main()